@@ -1,8 +1,9 @@
-from flask import Blueprint, render_template, redirect, request
+from flask import Blueprint, render_template, redirect, request, jsonify, flash
+from auth.hashing import ServicioHashOcupadoError
 from auth.seguridad import login_required
-from db import get_db
+from db import get_pool
 from models import UsuarioDB
-import bcrypt
+from utils.estadisticas import obtener_estadisticas_dashboard
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -25,49 +26,16 @@ def dashboard_admin():
     
     """
     
-    # Conexión a la base de datos y cursor para consultas
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    # Total productos activos en inventario
-    cursor.execute("SELECT COUNT(*) AS total FROM productos WHERE activo = 1")
-    total_productos = cursor.fetchone()["total"]
-
-    # Productos con stock bajo (<= stock_minimo)
-    cursor.execute("""
-        SELECT nombre, stock, stock_minimo
-        FROM productos
-        WHERE activo = 1 AND stock <= stock_minimo
-    """)
-    stock_bajo = cursor.fetchall()
-
-    # Últimos movimientos de inventario (5 más recientes) 
-    cursor.execute("""
-    SELECT 
-        m.fecha_movimiento AS fecha,
-        p.nombre AS producto,
-        u.nombre AS usuario,
-        m.tipo
-    FROM movimientos m
-    JOIN productos p ON m.producto_id = p.id
-    JOIN usuarios u ON m.usuario_id = u.id
-    ORDER BY m.fecha_movimiento DESC
-    LIMIT 5
-""")
-    # Obtener los resultados de la consulta 
-    ultimos_movimientos = cursor.fetchall()
-    
-    # Total de usuarios activos en el sistema 
-    cursor.execute("SELECT COUNT(*) AS total FROM usuarios WHERE activo = 1")
-    total_usuarios = cursor.fetchone()["total"]
+    # Estadísticas compartidas (en caché, ver utils/estadisticas.py)
+    estadisticas = obtener_estadisticas_dashboard()
 
     return render_template(
         "dashboard.html",
         rol="admin",
-        total_productos=total_productos,
-        stock_bajo=stock_bajo,
-        ultimos_movimientos=ultimos_movimientos,
-        total_usuarios=total_usuarios
+        total_productos=estadisticas["total_productos"],
+        stock_bajo=estadisticas["stock_bajo"],
+        ultimos_movimientos=estadisticas["ultimos_movimientos"],
+        total_usuarios=estadisticas["total_usuarios"]
     )
 
 
@@ -120,19 +88,28 @@ def crear_usuario():
         password = request.form["password"]
         rol_id = request.form["rol_id"]
 
-        # Hash de la contraseña
-        password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
-
-        # Guardar en DB
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO usuarios (nombre, correo, password, rol_id)
-            VALUES (%s, %s, %s, %s)
-        """, (nombre, correo, password_hash, rol_id))
-        db.commit()
+        # Hash (en el pool de procesos de auth.hashing) e inserción
+        try:
+            UsuarioDB.crear_usuario(nombre, correo, password, rol_id)
+        except ServicioHashOcupadoError:
+            flash("El servidor está ocupado, intenta crear el usuario de nuevo en unos segundos", "error")
+            return render_template("usuarios_crear.html"), 503
 
         return redirect("/usuarios")
 
     # GET: mostrar formulario de creación
     return render_template("usuarios_crear.html")
+
+
+# -------------------------------
+# ESTADO DEL POOL DE CONEXIONES
+# -------------------------------
+@admin_bp.route("/admin/pool")
+@login_required("admin")
+def estado_pool():
+    """
+    Muestra las estadísticas del pool de conexiones del proceso actual.
+    Returns:
+    - JSON con conexiones prestadas/libres y contadores acumulados.
+    """
+    return jsonify(get_pool().estadisticas())
@@ -1,19 +1,51 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+import db
+from config import Config
+from utils import archivo, conciliacion, diagnostico, metricas, stock_diario
 from auth.routes import auth_bp
 from admin.routes import admin_bp
 from operador.routes import operador_bp
 from productos.routes import productos_bp
 
 
-app = Flask(__name__)
-app.secret_key = "clave_super_secreta"
+def create_app(config=None):
+    """
+    Crea y configura la aplicación (patrón factory).
+
+    Args:
+        config (dict or None): Valores que reemplazan a los de config.Config
+            (p. ej. en scripts de benchmark)
+
+    Returns:
+        Flask: Aplicación lista para servirse con wsgi.py o `flask --app app run`
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+
+    # IP real del cliente detrás del proxy (la usa el límite de intentos de login)
+    if app.config["PROXY_SALTOS"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_SALTOS"])
+
+    db.init_app(app)
+    metricas.init_app(app)
+    diagnostico.init_app(app)
+    archivo.init_app(app)
+    stock_diario.init_app(app)
+    conciliacion.init_app(app)
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(operador_bp)
+    app.register_blueprint(productos_bp)
+
+    return app
 
-app.register_blueprint(auth_bp)
-app.register_blueprint(admin_bp)
-app.register_blueprint(operador_bp)
-app.register_blueprint(productos_bp)
 
 if __name__ == "__main__":
+    # Servidor de desarrollo (un solo proceso). En producción: gunicorn (ver procfile)
     import os
     port = int(os.environ.get('PORT', 10000))
-    app.run(host='0.0.0.0', port=port, debug=False)
+    create_app().run(host='0.0.0.0', port=port, debug=False)
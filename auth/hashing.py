@@ -0,0 +1,133 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturoTimeout
+
+import bcrypt
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+
+# Factor de costo de bcrypt para hashes nuevos. Subirlo hace que los usuarios
+# existentes se re-hasheen de forma transparente en su siguiente login.
+BCRYPT_COSTO = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# Procesos dedicados a bcrypt (es CPU puro: hilos no sirven por el GIL)
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Operaciones de hash admitidas a la vez (en cola + ejecutándose); el resto se rechaza
+HASH_MAX_CONCURRENTES = int(os.environ.get("HASH_MAX_CONCURRENT", HASH_WORKERS * 4))
+# Segundos máximos que una petición espera el resultado de un hash
+HASH_TIMEOUT = float(os.environ.get("HASH_TIMEOUT", 5))
+
+
+class ServicioHashOcupadoError(Exception):
+    """Se alcanzó el máximo de operaciones de hash concurrentes."""
+
+
+# ==============================================================================
+# FUNCIONES QUE SE EJECUTAN EN LOS PROCESOS DEL POOL
+# ==============================================================================
+# Deben ser funciones de módulo para poder enviarse a otro proceso.
+
+def _hashpw(contrasena, costo):
+    return bcrypt.hashpw(contrasena, bcrypt.gensalt(rounds=costo))
+
+
+def _checkpw(contrasena, hash_guardado):
+    return bcrypt.checkpw(contrasena, hash_guardado)
+
+
+# ==============================================================================
+# POOL DE PROCESOS CON CONTROL DE ADMISIÓN
+# ==============================================================================
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(HASH_MAX_CONCURRENTES)
+
+
+def _obtener_executor():
+    # Se crea por proceso: tras un fork (p. ej. workers de gunicorn) cada worker
+    # levanta su propio pool en lugar de heredar uno que no le pertenece.
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _ejecutar(funcion, *args):
+    """
+    Ejecuta `funcion` en el pool de procesos y espera el resultado.
+
+    El hilo de la petición solo espera (sin ocupar CPU ni el GIL), así que el
+    resto de peticiones del worker siguen atendiéndose durante el hash. Sin
+    cupo libre se rechaza de inmediato en lugar de retener el hilo.
+
+    El cupo se libera cuando el trabajo termina, no cuando la petición deja de
+    esperar: un hash que ya empezó no se puede cancelar y sigue ocupando un
+    proceso del pool.
+
+    Raises:
+        ServicioHashOcupadoError: Si no hay cupo o el resultado no llega a tiempo
+    """
+    if not _cupos.acquire(blocking=False):
+        raise ServicioHashOcupadoError("Demasiadas verificaciones de contraseña simultáneas")
+    try:
+        futuro = _obtener_executor().submit(funcion, *args)
+    except Exception:
+        _cupos.release()
+        raise
+    futuro.add_done_callback(lambda _: _cupos.release())
+    try:
+        return futuro.result(timeout=HASH_TIMEOUT)
+    except FuturoTimeout:
+        futuro.cancel()
+        raise ServicioHashOcupadoError("La verificación de contraseña tardó demasiado") from None
+
+
+# ==============================================================================
+# API PÚBLICA
+# ==============================================================================
+
+def hash_password(contrasena):
+    """
+    Genera el hash bcrypt de una contraseña con el costo configurado.
+
+    Returns:
+        str: Hash listo para guardarse en usuarios.password
+    """
+    return _ejecutar(_hashpw, contrasena.encode("utf-8"), BCRYPT_COSTO).decode("utf-8")
+
+
+def verificar_password(contrasena, hash_guardado):
+    """
+    Verifica una contraseña contra su hash bcrypt fuera del hilo de la petición.
+
+    Returns:
+        bool: True si la contraseña coincide
+    """
+    if isinstance(hash_guardado, str):
+        hash_guardado = hash_guardado.encode("utf-8")
+    try:
+        return _ejecutar(_checkpw, contrasena.encode("utf-8"), hash_guardado)
+    except ValueError:
+        # Hash con formato inválido en la base de datos
+        return False
+
+
+def necesita_rehash(hash_guardado):
+    """
+    Indica si un hash fue generado con un costo distinto al configurado.
+
+    El costo está en el propio hash ("$2b$12$..."), así que no hace falta bcrypt.
+    """
+    if isinstance(hash_guardado, bytes):
+        hash_guardado = hash_guardado.decode("utf-8", "replace")
+    partes = hash_guardado.split("$")
+    try:
+        return int(partes[2]) != BCRYPT_COSTO
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Intentos fallidos permitidos por cuenta y por IP dentro de la ventana
+MAX_FALLOS_CUENTA = int(os.environ.get("LOGIN_MAX_FALLOS_CUENTA", 5))
+MAX_FALLOS_IP = int(os.environ.get("LOGIN_MAX_FALLOS_IP", 20))
+# Duración de la ventana en segundos
+VENTANA_SEGUNDOS = float(os.environ.get("LOGIN_VENTANA_SEGUNDOS", 300))
+# Claves (cuentas + IPs) recordadas como máximo; se olvidan las más antiguas
+MAX_CLAVES = 10000
+
+
+class LimitadorIntentos:
+    """
+    Limita los intentos de login fallidos por cuenta y por IP (ventana deslizante).
+
+    El chequeo es una búsqueda en memoria, así que una ráfaga de intentos contra
+    una cuenta o desde una IP se rechaza antes de consultar la base de datos o de
+    gastar CPU en bcrypt. Se guarda en memoria del proceso y con un número acotado
+    de claves.
+    """
+
+    def __init__(self, max_cuenta=MAX_FALLOS_CUENTA, max_ip=MAX_FALLOS_IP,
+                 ventana=VENTANA_SEGUNDOS, max_claves=MAX_CLAVES):
+        self.max_cuenta = max_cuenta
+        self.max_ip = max_ip
+        self.ventana = ventana
+        self.max_claves = max_claves
+        self._fallos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recientes(self, clave, ahora):
+        fallos = self._fallos.get(clave)
+        if fallos is None:
+            return 0
+        while fallos and fallos[0] <= ahora - self.ventana:
+            fallos.popleft()
+        if not fallos:
+            del self._fallos[clave]
+            return 0
+        return len(fallos)
+
+    def bloqueado(self, correo, ip):
+        """Indica si la cuenta o la IP superaron los fallos permitidos en la ventana."""
+        ahora = time.monotonic()
+        with self._lock:
+            return (self._recientes(("cuenta", correo.lower()), ahora) >= self.max_cuenta
+                    or self._recientes(("ip", ip), ahora) >= self.max_ip)
+
+    def registrar_fallo(self, correo, ip):
+        ahora = time.monotonic()
+        with self._lock:
+            for clave in (("cuenta", correo.lower()), ("ip", ip)):
+                fallos = self._fallos.get(clave)
+                if fallos is None:
+                    fallos = self._fallos[clave] = deque()
+                fallos.append(ahora)
+                self._fallos.move_to_end(clave)
+            while len(self._fallos) > self.max_claves:
+                self._fallos.popitem(last=False)
+
+    def limpiar(self, correo):
+        """Olvida los fallos de una cuenta tras un login correcto."""
+        with self._lock:
+            self._fallos.pop(("cuenta", correo.lower()), None)
+
+
+limitador_login = LimitadorIntentos()
@@ -1,11 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, session
 from db import get_db
-import bcrypt
+from models import UsuarioDB
+from auth.hashing import verificar_password, necesita_rehash, hash_password, ServicioHashOcupadoError
+from auth.limites import limitador_login
+from auth.sesiones import recordar_usuario
 
 auth_bp = Blueprint("auth", __name__)
 
-cache_usuario = {}
-
 # -------------------------------
 # LOGIN
 # -------------------------------
@@ -14,6 +15,12 @@ def login():
     if request.method == "POST":
         correo = request.form["correo"]
         password = request.form["password"]
+        # Con ProxyFix (app.py), la IP del cliente y no la del proxy
+        ip = request.remote_addr or ""
+
+        # Rechazo barato antes de tocar la base de datos o bcrypt
+        if limitador_login.bloqueado(correo, ip):
+            return "Demasiados intentos fallidos, espera unos minutos", 429
 
         db = get_db()
         cursor = db.cursor(dictionary=True)
@@ -27,17 +34,33 @@ def login():
 
         user = cursor.fetchone()
 
-        if user and bcrypt.checkpw(password.encode(), user["password"].encode()):
+        # bcrypt corre en el pool de procesos; si está saturado se rechaza rápido
+        try:
+            valido = user is not None and verificar_password(password, user["password"])
+        except ServicioHashOcupadoError:
+            return "Servicio ocupado, intenta de nuevo en unos segundos", 503
+
+        if valido:
+            limitador_login.limpiar(correo)
+
+            # Re-hash transparente si cambió el costo configurado de bcrypt
+            if necesita_rehash(user["password"]):
+                try:
+                    UsuarioDB.actualizar_password(user["id"], hash_password(password))
+                except ServicioHashOcupadoError:
+                    pass
+
             session["user_id"] = user["id"]
             session["rol"] = user["rol"]
             
-            cache_usuario[user["id"]] = {"rol": user["rol"], "nombre": user["nombre"]}
+            recordar_usuario(user["id"], user["nombre"], user["rol"], user["activo"])
 
             if user["rol"] == "admin":
                 return redirect("/dashboard")
             else:
                 return redirect("/operador/dashboard")
 
+        limitador_login.registrar_fallo(correo, ip)
         return "Credenciales incorrectas"
 
     return render_template("login.html")
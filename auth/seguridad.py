@@ -1,13 +1,23 @@
 from flask import session, redirect
 from functools import wraps
 
+from auth.sesiones import obtener_usuario_sesion
+
 def login_required(rol=None):
     def decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
             if "user_id" not in session:
                 return redirect("/")
-            if rol and session["rol"] != rol:
+            # Estado actual del usuario (caché con TTL): una sesión de un usuario
+            # desactivado o eliminado deja de valer sin esperar a que expire
+            usuario = obtener_usuario_sesion(session["user_id"])
+            if not usuario["activo"]:
+                session.clear()
+                return redirect("/")
+            if usuario["rol"] != session.get("rol"):
+                session["rol"] = usuario["rol"]
+            if rol and usuario["rol"] != rol:
                 return "Acceso denegado"
             return f(*args, **kwargs)
         return wrapper
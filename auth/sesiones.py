@@ -0,0 +1,50 @@
+import os
+
+from db import get_db
+from utils.cache import crear_cache
+
+# Segundos que se confía en el estado cacheado de un usuario. Las escrituras
+# sobre usuarios lo invalidan al instante (en todos los workers si el backend es
+# "sqlite"); el TTL acota el desfase ante cambios hechos fuera de la aplicación.
+USUARIOS_TTL = float(os.environ.get("USUARIOS_CACHE_TTL", 60))
+# Usuarios recordados como máximo; se descartan los menos usados
+USUARIOS_MAX = int(os.environ.get("USUARIOS_CACHE_MAX", 10000))
+
+_cache = crear_cache("usuarios", ttl=USUARIOS_TTL, max_entradas=USUARIOS_MAX)
+
+
+def _consultar_usuario(usuario_id):
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT u.nombre, u.activo, r.nombre AS rol
+        FROM usuarios u
+        JOIN roles r ON u.rol_id = r.id
+        WHERE u.id = %s
+    """, (usuario_id,))
+    fila = cursor.fetchone()
+    if fila is None:
+        # También se cachea que no existe, para no consultar en cada petición
+        return {"nombre": None, "rol": None, "activo": False}
+    return {"nombre": fila["nombre"], "rol": fila["rol"], "activo": bool(fila["activo"])}
+
+
+def obtener_usuario_sesion(usuario_id):
+    """
+    Estado de un usuario para validar su sesión, desde la caché si está vigente.
+
+    Returns:
+        dict: nombre, rol y activo (False también si el usuario ya no existe).
+        Es un valor compartido: no modificarlo.
+    """
+    return _cache.obtener_o_calcular(usuario_id, lambda: _consultar_usuario(usuario_id))
+
+
+def recordar_usuario(usuario_id, nombre, rol, activo=True):
+    """Guarda en caché el estado ya leído durante el login, ahorrando la primera consulta."""
+    _cache.guardar(usuario_id, {"nombre": nombre, "rol": rol, "activo": bool(activo)})
+
+
+def invalidar_usuario(usuario_id=None):
+    """Descarta el estado cacheado de un usuario (o de todos); llamar tras escribir en usuarios."""
+    _cache.invalidar(usuario_id)
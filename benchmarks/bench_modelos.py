@@ -0,0 +1,113 @@
+"""
+Benchmark de memoria y velocidad de los objetos de fila de models.py.
+
+Compara, para un catálogo sintético (100.000 productos por defecto):
+
+- "dict + __dict__": lo que hacía ProductoDB.obtener_todos antes, un dict por
+  fila (cursor dictionary=True) y Producto(**fila) con __dict__ por instancia
+- "tupla + __slots__": lo que hace ahora, una tupla por fila (cursor normal) y
+  Producto(*fila) con __slots__
+
+No necesita base de datos: los valores de cada fila se generan en memoria y
+ambos caminos construyen sus filas (dict o tupla nuevas, como hace el cursor de
+mysql.connector) y sus objetos dentro de la función medida, así que se mide
+solo el costo en Python.
+
+Uso:
+    python benchmarks/bench_modelos.py [--filas 100000] [--repeticiones 5]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Producto  # noqa: E402
+
+COLUMNAS = ("id", "nombre", "descripcion", "categoria_id", "stock", "stock_minimo",
+            "precio", "imagen", "activo", "creado_en")
+
+
+class ProductoConDict:
+    """Producto tal como estaba antes de __slots__ (mismo __init__)."""
+
+    def __init__(self, id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo=True, creado_en=None):
+        self.id = id
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self.categoria_id = categoria_id
+        self.stock = stock
+        self.stock_minimo = stock_minimo
+        self.precio = precio
+        self.imagen = imagen
+        self.activo = activo
+        self.creado_en = creado_en
+
+
+def generar_valores(n):
+    # Valores ya decodificados de cada fila; las filas del cursor se construyen
+    # al cargar, igual que en cada fetchall()
+    creado = datetime(2024, 1, 1)
+    return [
+        [i, f"Producto {i}", f"Descripción del producto {i}", i % 50 + 1, i % 300, 10,
+         Decimal("19.99"), None, 1, creado]
+        for i in range(1, n + 1)
+    ]
+
+
+def cargar_dict(valores):
+    # Simula cursor(dictionary=True).fetchall() + Producto(**fila)
+    filas = [dict(zip(COLUMNAS, v)) for v in valores]
+    return [ProductoConDict(**fila) for fila in filas]
+
+
+def cargar_slots(valores):
+    # Simula cursor().fetchall() + Producto(*fila)
+    filas = [tuple(v) for v in valores]
+    return [Producto(*fila) for fila in filas]
+
+
+def medir_memoria(funcion, valores):
+    """Devuelve (pico, retenida) en bytes: el pico incluye las filas intermedias del cursor."""
+    tracemalloc.start()
+    objetos = funcion(valores)
+    retenida, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objetos
+    return pico, retenida
+
+
+def medir_tiempo(funcion, valores, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion(valores)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    valores = generar_valores(args.filas)
+    resultados = {}
+    for nombre, funcion in (("dict + __dict__", cargar_dict), ("tupla + __slots__", cargar_slots)):
+        pico, retenida = medir_memoria(funcion, valores)
+        segundos = medir_tiempo(funcion, valores, args.repeticiones)
+        resultados[nombre] = (pico, retenida, segundos)
+        print(f"{nombre:<20} pico: {pico / 2**20:7.1f} MiB   retenida: {retenida / 2**20:7.1f} MiB   "
+              f"tiempo: {segundos * 1000:7.1f} ms ({args.filas / segundos:,.0f} filas/s)")
+
+    (p_antes, r_antes, t_antes), (p_ahora, r_ahora, t_ahora) = resultados.values()
+    print(f"\nPico: {p_ahora / p_antes:.0%}   Retenida: {r_ahora / r_antes:.0%}   "
+          f"Velocidad: {t_antes / t_ahora:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+Benchmark de carga de punta a punta sobre las rutas reales de la aplicación.
+
+Simula sesiones concurrentes (hilos, cada uno con su cookie de sesión) de
+administradores y operadores creados por generar_datos.py contra un servidor
+ya levantado (p. ej. `gunicorn -c gunicorn.conf.py wsgi:app`) y reporta por
+ruta: peticiones, errores, throughput y latencias p50/p95/p99. Los operadores
+además registran movimientos (POST /operador/movimiento).
+
+Todas las sesiones inician sesión antes de empezar a medir; si algún login
+falla el script termina sin medir. Las redirecciones no se siguen: una
+respuesta cuenta como correcta solo si es la esperada para su ruta (la página
+con su texto característico, o la redirección que sigue a un login o a un
+movimiento registrado), así que una sesión perdida (302 a "/") o un "Acceso
+denegado" cuentan como errores.
+
+Con --guardar se escribe el resultado en JSON; con --comparar se contrasta con
+un resultado anterior y el script termina con código 1 si alguna ruta empeoró
+su p95 más que --tolerancia (para usarlo en CI).
+
+Uso:
+    python benchmarks/carga.py --url http://localhost:10000 --sesiones 20 --duracion 60
+    python benchmarks/carga.py --guardar actual.json --comparar base.json
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from comun import DOMINIO_BENCH, PASSWORD_BENCH, cargar_json, guardar_json, percentil
+
+# Rutas que recorre cada tipo de sesión y un texto que solo aparece en la
+# página correcta (el login "/" se mide aparte, al iniciar)
+RUTAS = {
+    "admin": {
+        "/dashboard": "Dashboard Administrador",
+        "/productos/": "📦 Productos",
+    },
+    "operador": {
+        "/operador/dashboard": "Dashboard Operador",
+        "/productos/": "📦 Productos",
+        "/operador/movimiento": "Registrar Movimiento",
+        "/operador/movimientos": "Historial de Movimientos",
+    },
+}
+# Destino de la redirección tras un login correcto
+DESTINO_LOGIN = {"admin": "/dashboard", "operador": "/operador/dashboard"}
+
+
+class Resultados:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {}
+        self.errores = {}
+
+    def registrar(self, ruta, segundos, ok):
+        with self._lock:
+            self.latencias.setdefault(ruta, []).append(segundos)
+            if not ok:
+                self.errores[ruta] = self.errores.get(ruta, 0) + 1
+
+
+class _SinRedirecciones(urllib.request.HTTPRedirectHandler):
+    # Un 302 se devuelve tal cual (como HTTPError) para poder revisar a dónde lleva
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def _nuevo_opener():
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _SinRedirecciones()
+    )
+
+
+def _pedir(opener, url, datos=None, timeout=30):
+    """Devuelve (segundos, estado, ruta de Location, cuerpo); estado None si falló la conexión."""
+    cuerpo = urllib.parse.urlencode(datos).encode() if datos is not None else None
+    inicio = time.perf_counter()
+    try:
+        with opener.open(url, data=cuerpo, timeout=timeout) as respuesta:
+            estado, ubicacion, contenido = respuesta.status, None, respuesta.read()
+    except urllib.error.HTTPError as e:
+        estado, ubicacion, contenido = e.code, e.headers.get("Location"), e.read()
+    except (urllib.error.URLError, OSError):
+        estado, ubicacion, contenido = None, None, b""
+    if ubicacion:
+        ubicacion = urllib.parse.urlsplit(ubicacion).path
+    return time.perf_counter() - inicio, estado, ubicacion, contenido
+
+
+def _pagina_ok(estado, contenido, marca):
+    return estado == 200 and marca.encode("utf-8") in contenido
+
+
+def iniciar_sesion(base, rol, numero, resultados):
+    """Abre la sesión de un usuario bench; devuelve el opener o None si el login falló."""
+    opener = _nuevo_opener()
+    segundos, estado, _, contenido = _pedir(opener, base + "/")
+    resultados.registrar("GET /", segundos, _pagina_ok(estado, contenido, 'name="correo"'))
+    segundos, estado, ubicacion, _ = _pedir(
+        opener, base + "/", {"correo": f"{rol}{numero}@{DOMINIO_BENCH}", "password": PASSWORD_BENCH}
+    )
+    # Con credenciales incorrectas el login responde 200 con un mensaje, no un error HTTP
+    ok = estado == 302 and ubicacion == DESTINO_LOGIN[rol]
+    resultados.registrar("POST / (login)", segundos, ok)
+    return opener if ok else None
+
+
+def buscar_productos(base, opener):
+    """Ids de productos bench que ofrece el buscador del formulario de movimientos."""
+    _, estado, _, contenido = _pedir(opener, base + "/operador/api/productos/sugerencias?q=Producto&limite=20")
+    if estado != 200:
+        return []
+    return [p["id"] for p in json.loads(contenido)["productos"]]
+
+
+def registrar_movimiento(base, opener, rng, productos, resultados):
+    datos = {"producto_id": rng.choice(productos), "tipo": rng.choice(("entrada", "salida")), "cantidad": 1}
+    segundos, estado, ubicacion, contenido = _pedir(opener, base + "/operador/movimiento", datos)
+    # Registrado: redirección al dashboard. Una salida sin stock vuelve al
+    # formulario con el error; es una respuesta válida de la aplicación
+    ok = (estado == 302 and ubicacion == "/operador/dashboard") or \
+         _pagina_ok(estado, contenido, "Stock insuficiente")
+    resultados.registrar("POST /operador/movimiento", segundos, ok)
+
+
+def sesion(base, rol, opener, productos, fin, resultados, pausa, escrituras, semilla):
+    rng = random.Random(semilla)
+    rutas = list(RUTAS[rol].items())
+    while time.monotonic() < fin:
+        if rol == "operador" and productos and rng.random() < escrituras:
+            registrar_movimiento(base, opener, rng, productos, resultados)
+        else:
+            ruta, marca = rng.choice(rutas)
+            segundos, estado, _, contenido = _pedir(opener, base + ruta)
+            resultados.registrar("GET " + ruta, segundos, _pagina_ok(estado, contenido, marca))
+        if pausa:
+            time.sleep(rng.uniform(0, pausa * 2))
+
+
+def resumir(resultados, duracion):
+    resumen = {}
+    for ruta, latencias in sorted(resultados.latencias.items()):
+        ordenadas = sorted(latencias)
+        resumen[ruta] = {
+            "peticiones": len(ordenadas),
+            "errores": resultados.errores.get(ruta, 0),
+            "por_segundo": round(len(ordenadas) / duracion, 2),
+            "p50_ms": round(percentil(ordenadas, 50) * 1000, 1),
+            "p95_ms": round(percentil(ordenadas, 95) * 1000, 1),
+            "p99_ms": round(percentil(ordenadas, 99) * 1000, 1),
+            "max_ms": round(ordenadas[-1] * 1000, 1),
+        }
+    return resumen
+
+
+def imprimir(resumen):
+    print(f"{'Ruta':<32}{'Pet.':>8}{'Err.':>6}{'pet/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for ruta, r in resumen.items():
+        print(f"{ruta:<32}{r['peticiones']:>8}{r['errores']:>6}{r['por_segundo']:>9}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+
+def comparar(resumen, base, tolerancia):
+    """Devuelve las rutas cuyo p95 empeoró más que `tolerancia` (fracción) respecto a `base`."""
+    regresiones = []
+    for ruta, r in resumen.items():
+        anterior = base.get("rutas", {}).get(ruta)
+        if not anterior or not anterior["p95_ms"]:
+            continue
+        cambio = r["p95_ms"] / anterior["p95_ms"] - 1
+        marca = "REGRESIÓN" if cambio > tolerancia else ""
+        print(f"{ruta:<32} p95 {anterior['p95_ms']:>8} -> {r['p95_ms']:>8} ms ({cambio:+.0%}) {marca}")
+        if cambio > tolerancia:
+            regresiones.append(ruta)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:10000")
+    parser.add_argument("--sesiones", type=int, default=20, help="Sesiones simultáneas")
+    parser.add_argument("--admins", type=int, default=5, help="Administradores creados por generar_datos.py")
+    parser.add_argument("--operadores", type=int, default=50, help="Operadores creados por generar_datos.py")
+    parser.add_argument("--proporcion-admin", type=float, default=0.2, help="Fracción de sesiones de administrador")
+    parser.add_argument("--duracion", type=float, default=60, help="Segundos de carga")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Pausa media entre peticiones de una sesión (s)")
+    parser.add_argument("--proporcion-escrituras", type=float, default=0.1,
+                        help="Fracción de peticiones de operador que registran un movimiento")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--guardar", help="Archivo JSON donde guardar el resultado")
+    parser.add_argument("--comparar", help="Resultado JSON anterior contra el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento de p95 tolerado (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    base = args.url.rstrip("/")
+    resultados = Resultados()
+
+    # Login de todas las sesiones antes de medir
+    usuarios = []
+    for i in range(args.sesiones):
+        if i < round(args.sesiones * args.proporcion_admin):
+            usuarios.append(("admin", i % args.admins + 1))
+        else:
+            usuarios.append(("operador", i % args.operadores + 1))
+    openers = [None] * len(usuarios)
+
+    def abrir(i):
+        openers[i] = iniciar_sesion(base, *usuarios[i], resultados)
+
+    hilos = [threading.Thread(target=abrir, args=(i,)) for i in range(len(usuarios))]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    fallidos = [f"{rol}{numero}@{DOMINIO_BENCH}" for (rol, numero), o in zip(usuarios, openers) if o is None]
+    if fallidos:
+        sys.exit(f"No se pudo iniciar sesión con {len(fallidos)} usuarios (p. ej. {fallidos[0]}); "
+                 "¿se ejecutó generar_datos.py contra esta base?")
+
+    productos = []
+    operador = next((o for (rol, _), o in zip(usuarios, openers) if rol == "operador"), None)
+    if operador is not None and args.proporcion_escrituras > 0:
+        productos = buscar_productos(base, operador)
+        if not productos:
+            sys.exit("El buscador no devolvió productos para registrar movimientos")
+
+    fin = time.monotonic() + args.duracion
+    hilos = []
+    for i, ((rol, _), opener) in enumerate(zip(usuarios, openers)):
+        hilo = threading.Thread(target=sesion, args=(base, rol, opener, productos, fin, resultados,
+                                                     args.pausa, args.proporcion_escrituras, args.semilla + i))
+        hilo.start()
+        hilos.append(hilo)
+
+    inicio = time.monotonic()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.monotonic() - inicio
+
+    resumen = resumir(resultados, duracion)
+    total = sum(r["peticiones"] for r in resumen.values())
+    print(f"\n{args.sesiones} sesiones, {duracion:.1f} s, {total} peticiones ({total / duracion:.1f} pet/s)\n")
+    imprimir(resumen)
+
+    if args.guardar:
+        guardar_json(args.guardar, {
+            "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "parametros": vars(args),
+            "rutas": resumen,
+        })
+
+    if args.comparar:
+        print()
+        if comparar(resumen, cargar_json(args.comparar), args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
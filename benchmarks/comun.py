@@ -0,0 +1,48 @@
+"""Utilidades compartidas por los scripts de benchmarks/."""
+import json
+import math
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+import mysql.connector  # noqa: E402
+
+from config import Config  # noqa: E402
+
+# Contraseña de todos los usuarios creados por generar_datos.py
+PASSWORD_BENCH = "bench1234"
+# Correos de los usuarios creados por generar_datos.py: admin1@bench.local, operador1@bench.local...
+DOMINIO_BENCH = "bench.local"
+
+
+def conectar(**opciones):
+    """Conexión directa a MySQL con las credenciales de config.Config (variables DB_*)."""
+    return mysql.connector.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        database=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        **opciones,
+    )
+
+
+def percentil(valores_ordenados, p):
+    """Percentil `p` (0-100) por rango más cercano de una lista ya ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def guardar_json(ruta, datos):
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2, default=str)
+
+
+def cargar_json(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
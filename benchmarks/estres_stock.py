@@ -0,0 +1,279 @@
+"""
+Prueba de estrés de concurrencia sobre el stock.
+
+Lanza varios procesos, cada uno con varios hilos, que registran movimientos
+sobre los mismos SKUs "calientes" o sobre SKUs disjuntos (uno por hilo), por
+dos caminos:
+
+- movimiento: utils.movimientos.registrar_movimiento (UPDATE condicional)
+- edicion: el camino de /productos/editar, que lee el producto y guarda sus
+  datos y el stock contado con guardar_edicion (rechaza la edición si el
+  stock cambió desde la lectura)
+
+Al terminar verifica para cada SKU las invariantes
+    stock final = stock inicial + entradas - salidas   y   stock >= 0
+usando los movimientos registrados durante la prueba, y además
+    stock final = stock inicial + suma de los cambios que los hilos aplicaron
+(cada hilo lleva la cuenta de las operaciones que terminaron bien), que
+detecta actualizaciones perdidas: una edición que fija un stock leído antes de
+un movimiento concurrente deja el historial coherente pero deshace ese
+movimiento. Mide movimientos por segundo, latencias y la espera por bloqueos
+de fila de InnoDB (Innodb_row_lock_time / Innodb_row_lock_waits).
+
+Crea sus propios productos ("Estrés ...") y no toca los demás. Requiere un
+usuario existente para atribuir los movimientos (--usuario-id) y las
+variables DB_* de config.Config.
+
+Uso:
+    python benchmarks/estres_stock.py --procesos 4 --hilos 8 --operaciones 200
+    python benchmarks/estres_stock.py --escenarios calientes:movimiento --guardar r.json --comparar base.json
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import threading
+import time
+
+from comun import cargar_json, conectar, guardar_json, percentil
+
+ESCENARIOS = ("calientes:movimiento", "disjuntos:movimiento", "calientes:edicion", "disjuntos:edicion")
+STOCK_INICIAL = 1000
+
+
+# ==============================================================================
+# PREPARACIÓN Y VERIFICACIÓN (conexión directa)
+# ==============================================================================
+
+def crear_skus(cantidad, etiqueta):
+    conexion = conectar()
+    cursor = conexion.cursor()
+    ids = []
+    for n in range(cantidad):
+        cursor.execute("""
+            INSERT INTO productos (nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en)
+            VALUES (%s, 'Producto de la prueba de estrés', NULL, %s, 0, 0, NULL, 1, NOW())
+        """, (f"Estrés {etiqueta} {n}", STOCK_INICIAL))
+        ids.append(cursor.lastrowid)
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos")
+    ultimo_movimiento = cursor.fetchone()[0]
+    conexion.commit()
+    conexion.close()
+    return ids, ultimo_movimiento
+
+
+def estado_bloqueos():
+    conexion = conectar()
+    cursor = conexion.cursor()
+    cursor.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Innodb_row_lock_time', 'Innodb_row_lock_waits')")
+    estado = {nombre: int(valor) for nombre, valor in cursor.fetchall()}
+    conexion.close()
+    return estado
+
+
+def verificar(ids, ultimo_movimiento, aplicados):
+    """
+    Compara el stock final de cada SKU con el que resulta de sus movimientos y
+    con el de los cambios aplicados por los hilos (`aplicados`: id -> neto).
+    """
+    conexion = conectar()
+    cursor = conexion.cursor()
+    marcas = ", ".join(["%s"] * len(ids))
+    cursor.execute(f"""
+        SELECT p.id, p.stock,
+               COALESCE(SUM(CASE WHEN m.tipo = 'entrada' THEN m.cantidad ELSE -m.cantidad END), 0)
+        FROM productos p
+        LEFT JOIN movimientos m ON m.producto_id = p.id AND m.id > %s
+        WHERE p.id IN ({marcas})
+        GROUP BY p.id, p.stock
+    """, (ultimo_movimiento, *ids))
+    violaciones = []
+    for producto_id, stock, neto in cursor.fetchall():
+        esperado = STOCK_INICIAL + int(neto)
+        pretendido = STOCK_INICIAL + aplicados.get(producto_id, 0)
+        if stock != esperado or stock != pretendido or stock < 0:
+            violaciones.append({"producto_id": producto_id, "stock": stock, "esperado": esperado,
+                                "pretendido": pretendido})
+    # Los SKUs de la prueba se desactivan para no ensuciar listados
+    cursor.execute(f"UPDATE productos SET activo = 0 WHERE id IN ({marcas})", ids)
+    conexion.commit()
+    conexion.close()
+    return violaciones
+
+
+# ==============================================================================
+# OPERACIONES (a través de la aplicación, un contexto por operación)
+# ==============================================================================
+
+# Cada operación devuelve (stock resultante, cambio aplicado al stock)
+
+def op_movimiento(producto_id, usuario_id, tipo, cantidad):
+    from utils.movimientos import registrar_movimiento
+    stock = registrar_movimiento(producto_id, usuario_id, tipo, cantidad)
+    return stock, cantidad if tipo == "entrada" else -cantidad
+
+
+def op_edicion(producto_id, usuario_id, tipo, cantidad):
+    # Igual que /productos/editar: el stock se lee al mostrar el formulario y el
+    # valor enviado se guarda junto con el stock visto (la diferencia queda
+    # como movimiento)
+    from models import ProductoDB
+    from utils.movimientos import guardar_edicion
+    producto = ProductoDB.obtener_por_id(producto_id)
+    visto = producto.stock
+    producto.stock = visto + cantidad if tipo == "entrada" else visto - cantidad
+    if producto.stock < 0:
+        raise Exception("Stock insuficiente")
+    guardar_edicion(producto, usuario_id, visto)
+    return producto.stock, producto.stock - visto
+
+
+OPERACIONES = {"movimiento": op_movimiento, "edicion": op_edicion}
+
+
+def proceso_trabajador(indice, args, skus, camino, cola):
+    from app import create_app
+    from utils.movimientos import StockModificadoError
+
+    app = create_app({"DB_POOL_SIZE": args.hilos})
+    operacion = OPERACIONES[camino]
+    latencias, rechazos, conflictos, errores, negativos = [], [0], [0], [0], [0]
+    aplicados = {}
+    lock = threading.Lock()
+
+    def hilo(numero_hilo):
+        rng = random.Random(args.semilla * 1000 + indice * 100 + numero_hilo)
+        propios = skus[(indice * args.hilos + numero_hilo) % len(skus):][:1] if args.disjuntos else skus
+        for _ in range(args.operaciones):
+            producto_id = rng.choice(propios)
+            tipo = "salida" if rng.random() < args.proporcion_salidas else "entrada"
+            cantidad = rng.randint(1, 5)
+            inicio = time.perf_counter()
+            stock, cambio = 0, 0
+            try:
+                with app.app_context():
+                    stock, cambio = operacion(producto_id, args.usuario_id, tipo, cantidad)
+                resultado = "ok"
+            except StockModificadoError:
+                resultado = "conflicto"
+            except Exception as e:
+                resultado = "rechazo" if "Stock insuficiente" in str(e) else "error"
+            duracion = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracion)
+                if resultado == "rechazo":
+                    rechazos[0] += 1
+                elif resultado == "conflicto":
+                    conflictos[0] += 1
+                elif resultado == "error":
+                    errores[0] += 1
+                if stock < 0:
+                    negativos[0] += 1
+                aplicados[producto_id] = aplicados.get(producto_id, 0) + cambio
+
+    hilos = [threading.Thread(target=hilo, args=(n,)) for n in range(args.hilos)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    cola.put({"latencias": latencias, "rechazos": rechazos[0], "conflictos": conflictos[0], "errores": errores[0],
+              "negativos": negativos[0], "aplicados": aplicados})
+
+
+def ejecutar_escenario(nombre, args):
+    modo, camino = nombre.split(":")
+    args.disjuntos = modo == "disjuntos"
+    cantidad_skus = args.procesos * args.hilos if args.disjuntos else args.skus_calientes
+    skus, ultimo_movimiento = crear_skus(cantidad_skus, nombre)
+
+    bloqueos_antes = estado_bloqueos()
+    cola = multiprocessing.Queue()
+    procesos = [multiprocessing.Process(target=proceso_trabajador, args=(i, args, skus, camino, cola))
+                for i in range(args.procesos)]
+    inicio = time.perf_counter()
+    for p in procesos:
+        p.start()
+    partes = [cola.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+    duracion = time.perf_counter() - inicio
+    bloqueos_despues = estado_bloqueos()
+
+    latencias = sorted(l for parte in partes for l in parte["latencias"])
+    rechazos = sum(p["rechazos"] for p in partes)
+    conflictos = sum(p["conflictos"] for p in partes)
+    errores = sum(p["errores"] for p in partes)
+    exitosos = len(latencias) - rechazos - conflictos - errores
+    aplicados = {}
+    for parte in partes:
+        for producto_id, cambio in parte["aplicados"].items():
+            aplicados[producto_id] = aplicados.get(producto_id, 0) + cambio
+    violaciones = verificar(skus, ultimo_movimiento, aplicados)
+    return {
+        "skus": len(skus),
+        "operaciones": len(latencias),
+        "exitosas": exitosos,
+        "rechazos_stock": rechazos,
+        "conflictos_edicion": conflictos,
+        "errores": errores,
+        "stock_negativo_observado": sum(p["negativos"] for p in partes),
+        "movimientos_por_segundo": round(exitosos / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "espera_bloqueos_ms": bloqueos_despues["Innodb_row_lock_time"] - bloqueos_antes["Innodb_row_lock_time"],
+        "esperas_bloqueos": bloqueos_despues["Innodb_row_lock_waits"] - bloqueos_antes["Innodb_row_lock_waits"],
+        "violaciones": violaciones,
+        "correcto": not violaciones,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--procesos", type=int, default=4)
+    parser.add_argument("--hilos", type=int, default=8, help="Hilos por proceso")
+    parser.add_argument("--operaciones", type=int, default=200, help="Operaciones por hilo")
+    parser.add_argument("--skus-calientes", type=int, default=3)
+    parser.add_argument("--proporcion-salidas", type=float, default=0.5)
+    parser.add_argument("--usuario-id", type=int, default=1, help="Usuario al que se atribuyen los movimientos")
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS),
+                        help="Lista separada por comas de " + ", ".join(ESCENARIOS))
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--guardar", help="Archivo JSON donde guardar el reporte")
+    parser.add_argument("--comparar", help="Reporte JSON anterior contra el que comparar")
+    args = parser.parse_args()
+
+    reporte = {}
+    for nombre in args.escenarios.split(","):
+        if nombre not in ESCENARIOS:
+            parser.error(f"Escenario desconocido: {nombre}")
+        print(f"Ejecutando {nombre}...")
+        reporte[nombre] = r = ejecutar_escenario(nombre, args)
+        estado = "OK" if r["correcto"] else f"{len(r['violaciones'])} SKUs INCONSISTENTES"
+        print(f"  {r['movimientos_por_segundo']} mov/s  p95 {r['p95_ms']} ms  "
+              f"espera por bloqueos {r['espera_bloqueos_ms']} ms ({r['esperas_bloqueos']} esperas)  "
+              f"rechazos {r['rechazos_stock']}  conflictos {r['conflictos_edicion']}  "
+              f"errores {r['errores']}  -> {estado}")
+        for v in r["violaciones"][:5]:
+            print(f"    producto {v['producto_id']}: stock {v['stock']}, según historial {v['esperado']}, "
+                  f"según operaciones aplicadas {v['pretendido']}")
+
+    if args.guardar:
+        guardar_json(args.guardar, {"fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                    "parametros": vars(args), "escenarios": reporte})
+
+    if args.comparar:
+        base = cargar_json(args.comparar).get("escenarios", {})
+        print()
+        for nombre, r in reporte.items():
+            if nombre in base:
+                anterior = base[nombre]
+                print(f"{nombre:<24} mov/s {anterior['movimientos_por_segundo']:>8} -> {r['movimientos_por_segundo']:>8}   "
+                      f"espera bloqueos {anterior['espera_bloqueos_ms']:>7} -> {r['espera_bloqueos_ms']:>7} ms")
+
+    # Código de salida distinto de cero si alguna invariante se rompió
+    sys.exit(0 if all(r["correcto"] for r in reporte.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Generador de datos sintéticos para benchmarks.
+
+Llena categorias, productos, usuarios y movimientos a la escala indicada con
+inserciones masivas (INSERT de varias filas, o LOAD DATA LOCAL INFILE con
+--load-data). Con la misma --semilla y --fecha-base produce exactamente los
+mismos datos (las fechas se cuentan desde --fecha-base, no desde hoy).
+
+Los datos son coherentes con la aplicación:
+- cada producto nace con un movimiento de "entrada" por su stock inicial (como
+  hace /productos/crear)
+- los movimientos van en orden cronológico y una salida nunca deja el stock en
+  negativo
+- productos.stock termina igual a entradas - salidas de sus movimientos
+- el 20% de los productos recibe el 80% de los movimientos (SKUs "calientes")
+
+Usuarios creados (contraseña "bench1234"): admin1..adminN@bench.local y
+operador1..operadorN@bench.local.
+
+Requiere las migraciones aplicadas y las variables DB_* de config.Config.
+
+Uso:
+    python benchmarks/generar_datos.py --productos 100000 --movimientos 10000000
+    python benchmarks/generar_datos.py --productos 1000 --movimientos 50000 --limpiar
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import bcrypt
+
+from comun import DOMINIO_BENCH, PASSWORD_BENCH, conectar
+
+FILAS_POR_INSERT = 5000
+
+
+def _siguiente_id(cursor, tabla):
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabla}")
+    return cursor.fetchone()[0]
+
+
+def _insertar(conexion, sql, filas):
+    """INSERT de varias filas por lotes (mysql.connector reescribe executemany en un solo INSERT)."""
+    cursor = conexion.cursor()
+    for inicio in range(0, len(filas), FILAS_POR_INSERT):
+        cursor.executemany(sql, filas[inicio:inicio + FILAS_POR_INSERT])
+        conexion.commit()
+    cursor.close()
+
+
+# Tablas que se vacían con --limpiar: las derivadas de movimientos y productos
+# (archivo, resúmenes diarios e instantáneas de stock) apuntan a ids que dejan
+# de existir
+TABLAS_LIMPIAR = ("stock_diario", "movimientos_resumen_diario", "movimientos_archivo",
+                  "movimientos", "productos", "categorias")
+
+
+def limpiar(conexion):
+    cursor = conexion.cursor()
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+    for tabla in TABLAS_LIMPIAR:
+        cursor.execute(f"TRUNCATE TABLE {tabla}")
+    cursor.execute("DELETE FROM usuarios WHERE correo LIKE %s", (f"%@{DOMINIO_BENCH}",))
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conexion.commit()
+    cursor.close()
+
+
+def generar_categorias(conexion, cantidad):
+    cursor = conexion.cursor()
+    primero = _siguiente_id(cursor, "categorias")
+    cursor.close()
+    filas = [(primero + i, f"Categoría bench {primero + i}", f"Categoría sintética {primero + i}", 1)
+             for i in range(cantidad)]
+    _insertar(conexion, "INSERT INTO categorias (id, nombre, descripcion, activo) VALUES (%s, %s, %s, %s)", filas)
+    return [f[0] for f in filas]
+
+
+def generar_usuarios(conexion, admins, operadores, costo_bcrypt):
+    cursor = conexion.cursor()
+    cursor.execute("SELECT id, nombre FROM roles")
+    roles = {nombre: id for id, nombre in cursor.fetchall()}
+    primero = _siguiente_id(cursor, "usuarios")
+    cursor.close()
+
+    # Un único hash para todos: bcrypt es deliberadamente lento
+    hash_bench = bcrypt.hashpw(PASSWORD_BENCH.encode(), bcrypt.gensalt(rounds=costo_bcrypt)).decode()
+    filas = []
+    for rol, cantidad in (("admin", admins), ("operador", operadores)):
+        for n in range(1, cantidad + 1):
+            filas.append((primero + len(filas), f"{rol.title()} bench {n}", f"{rol}{n}@{DOMINIO_BENCH}",
+                          hash_bench, roles[rol], 1))
+    _insertar(conexion, """
+        INSERT INTO usuarios (id, nombre, correo, password, rol_id, activo)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, filas)
+    return [f[0] for f in filas[admins:]] or [f[0] for f in filas]
+
+
+def generar_productos(conexion, rng, cantidad, categorias, inicio_fechas):
+    cursor = conexion.cursor()
+    primero = _siguiente_id(cursor, "productos")
+    cursor.close()
+    productos = []
+    for i in range(cantidad):
+        producto_id = primero + i
+        creado_en = inicio_fechas + timedelta(seconds=rng.randrange(86400))
+        productos.append((
+            producto_id,
+            f"Producto {producto_id:07d} {rng.choice(('Sensor', 'Módulo', 'Cable', 'Placa', 'Relé', 'Fusible'))}",
+            f"Descripción sintética del producto {producto_id}",
+            rng.choice(categorias),
+            0,  # el stock final se fija después de generar los movimientos
+            rng.randint(0, 50),
+            round(rng.uniform(100, 100000), 2),
+            None,
+            1,
+            creado_en,
+        ))
+    _insertar(conexion, """
+        INSERT INTO productos (id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, productos)
+    return productos
+
+
+def _filas_movimientos(rng, productos, operadores, total, inicio_fechas, dias, stock):
+    """
+    Produce los movimientos en orden cronológico y actualiza `stock` (dict) a la par.
+
+    Los primeros len(productos) son las entradas iniciales de cada producto.
+    """
+    for producto_id, *_, creado_en in productos:
+        cantidad = rng.randint(0, 500)
+        stock[producto_id] = cantidad
+        yield (producto_id, rng.choice(operadores), "entrada", cantidad, creado_en)
+
+    restantes = max(0, total - len(productos))
+    if not restantes:
+        return
+    ids = [p[0] for p in productos]
+    calientes = ids[:max(1, len(ids) // 5)]
+    inicio = inicio_fechas + timedelta(days=1)
+    paso = (dias - 1) * 86400 / restantes
+    for n in range(restantes):
+        producto_id = rng.choice(calientes) if rng.random() < 0.8 else rng.choice(ids)
+        cantidad = rng.randint(1, 20)
+        tipo = "salida" if rng.random() < 0.5 and stock[producto_id] >= cantidad else "entrada"
+        stock[producto_id] += cantidad if tipo == "entrada" else -cantidad
+        yield (producto_id, rng.choice(operadores), tipo, cantidad, inicio + timedelta(seconds=n * paso))
+
+
+def generar_movimientos(conexion, rng, productos, operadores, total, inicio_fechas, dias, load_data):
+    stock = {}
+    filas = _filas_movimientos(rng, productos, operadores, total, inicio_fechas, dias, stock)
+    cursor = conexion.cursor()
+    insertados = 0
+
+    if load_data:
+        # Un CSV temporal y LOAD DATA: la vía más rápida de MySQL para cargas masivas
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="") as f:
+            escritor = csv.writer(f)
+            for fila in filas:
+                escritor.writerow(fila)
+                insertados += 1
+            ruta = f.name
+        try:
+            cursor.execute(f"""
+                LOAD DATA LOCAL INFILE '{ruta}' INTO TABLE movimientos
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+                LINES TERMINATED BY '\\r\\n'
+                (producto_id, usuario_id, tipo, cantidad, fecha_movimiento)
+            """)
+            conexion.commit()
+        finally:
+            os.remove(ruta)
+    else:
+        sql = """
+            INSERT INTO movimientos (producto_id, usuario_id, tipo, cantidad, fecha_movimiento)
+            VALUES (%s, %s, %s, %s, %s)
+        """
+        lote = []
+        for fila in filas:
+            lote.append(fila)
+            if len(lote) >= FILAS_POR_INSERT:
+                cursor.executemany(sql, lote)
+                conexion.commit()
+                insertados += len(lote)
+                lote.clear()
+                if insertados % 500_000 == 0:
+                    print(f"  {insertados:,} movimientos...")
+        if lote:
+            cursor.executemany(sql, lote)
+            conexion.commit()
+            insertados += len(lote)
+
+    # Stock final = entradas - salidas de cada producto
+    pares = list(stock.items())
+    for inicio in range(0, len(pares), 1000):
+        bloque = pares[inicio:inicio + 1000]
+        cursor.execute(
+            "UPDATE productos SET stock = CASE id {} END WHERE id IN ({})".format(
+                " ".join(["WHEN %s THEN %s"] * len(bloque)), ", ".join(["%s"] * len(bloque))
+            ),
+            [v for par in bloque for v in par] + [p for p, _ in bloque],
+        )
+    conexion.commit()
+    cursor.close()
+    return insertados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--categorias", type=int, default=50)
+    parser.add_argument("--productos", type=int, default=100_000)
+    parser.add_argument("--movimientos", type=int, default=1_000_000,
+                        help="Total de movimientos, incluidas las entradas iniciales de cada producto")
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--operadores", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=365, help="Días de historial que cubren los movimientos")
+    parser.add_argument("--fecha-base", type=lambda v: datetime.strptime(v, "%Y-%m-%d"),
+                        default=datetime(2025, 1, 1),
+                        help="Fin del historial generado, YYYY-MM-DD (fijo para que las corridas sean comparables)")
+    parser.add_argument("--costo-bcrypt", type=int, default=12)
+    parser.add_argument("--limpiar", action="store_true",
+                        help="Vacía productos, categorías, movimientos (con archivo, resúmenes e "
+                             "instantáneas de stock) y borra los usuarios bench antes de generar")
+    parser.add_argument("--load-data", action="store_true",
+                        help="Carga los movimientos con LOAD DATA LOCAL INFILE (requiere local_infile=ON)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    inicio_fechas = args.fecha_base - timedelta(days=args.dias)
+    conexion = conectar(allow_local_infile=args.load_data)
+    cursor = conexion.cursor()
+    # Carga masiva: sin verificación de unicidad/FK fila por fila (los datos ya son coherentes)
+    cursor.execute("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+    cursor.close()
+
+    t0 = time.perf_counter()
+    if args.limpiar:
+        limpiar(conexion)
+        print("Tablas vaciadas")
+
+    categorias = generar_categorias(conexion, args.categorias)
+    print(f"{len(categorias):,} categorías")
+    operadores = generar_usuarios(conexion, args.admins, args.operadores, args.costo_bcrypt)
+    print(f"{args.admins + args.operadores:,} usuarios (contraseña: {PASSWORD_BENCH})")
+    productos = generar_productos(conexion, rng, args.productos, categorias, inicio_fechas)
+    print(f"{len(productos):,} productos")
+    total = generar_movimientos(conexion, rng, productos, operadores, args.movimientos,
+                                inicio_fechas, args.dias, args.load_data)
+    print(f"{total:,} movimientos")
+
+    cursor = conexion.cursor()
+    cursor.execute("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+    for tabla in ("categorias", "productos", "usuarios", "movimientos"):
+        cursor.execute(f"ANALYZE TABLE {tabla}")
+        cursor.fetchall()
+    cursor.close()
+    conexion.close()
+    print(f"Listo en {time.perf_counter() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
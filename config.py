@@ -0,0 +1,53 @@
+import os
+
+# ==============================================================================
+# CONFIGURACIÓN DE LA APLICACIÓN
+# ==============================================================================
+# Todo se toma de variables de entorno para no guardar credenciales en el
+# código. Los valores por defecto sirven para desarrollo local.
+
+
+class Config:
+    SECRET_KEY = os.environ.get("SECRET_KEY", "clave_super_secreta")
+
+    # Conexión a MySQL
+    DB_HOST = os.environ.get("DB_HOST", "localhost")
+    DB_PORT = int(os.environ.get("DB_PORT", 3306))
+    DB_NAME = os.environ.get("DB_NAME", "inventario_pymes")
+    DB_USER = os.environ.get("DB_USER", "root")
+    DB_PASSWORD = os.environ.get("DB_PASSWORD", "")
+
+    # Pool de conexiones (por proceso). Debe ser al menos igual al número de
+    # hilos por worker para que ninguna petición espere una conexión.
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+    # Segundos máximos de espera cuando todas las conexiones están prestadas
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+    # Conexiones con más de esta edad (segundos) se cierran y se reemplazan
+    DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", 3600))
+    # Conexiones ociosas más de estos segundos se verifican con ping antes de prestarse
+    DB_POOL_PING = float(os.environ.get("DB_POOL_PING", 30))
+    # Conexiones que cada worker abre al arrancar (ver gunicorn.conf.py)
+    DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+
+    # Diagnóstico de consultas (utils/diagnostico.py): consultas lentas con
+    # EXPLAIN y detección de N+1. Pensado para activarse al investigar.
+    DIAGNOSTICO_SQL = os.environ.get("DIAGNOSTICO_SQL", "0") == "1"
+    # Milisegundos a partir de los cuales una consulta se registra como lenta
+    SQL_LENTA_MS = float(os.environ.get("SQL_LENTA_MS", 200))
+    # Repeticiones de la misma consulta en una petición que se reportan como N+1
+    N_MAS_1_UMBRAL = int(os.environ.get("N_MAS_1_UMBRAL", 10))
+
+    # Archivo del historial (utils/archivo.py, `flask archivar-movimientos`)
+    # Días de movimientos que permanecen en la tabla caliente
+    ARCHIVO_DIAS = int(os.environ.get("ARCHIVO_DIAS", 180))
+    # Movimientos movidos por transacción
+    ARCHIVO_LOTE = int(os.environ.get("ARCHIVO_LOTE", 5000))
+    # Segundos de espera entre lotes
+    ARCHIVO_PAUSA = float(os.environ.get("ARCHIVO_PAUSA", 0.1))
+
+    # Proxies de confianza delante de la aplicación. Con N > 0,
+    # request.remote_addr se toma de X-Forwarded-For saltando esa cantidad de
+    # proxies; con 0 (por defecto) se usa la dirección de la conexión. Solo
+    # debe ser > 0 si hay de verdad un proxy delante (en Render, 1: ver
+    # procfile): sin él, cualquier cliente podría falsear su IP con la cabecera.
+    PROXY_SALTOS = int(os.environ.get("PROXY_SALTOS", 0))
@@ -1,11 +1,419 @@
+import os
+import threading
+import time
+from collections import deque
+
 import mysql.connector
+from flask import g, has_app_context
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexión libre dentro del tiempo de espera del pool."""
+
+
+class _ConexionPool:
+    """Conexión física junto con los tiempos que el pool necesita para gestionarla."""
+
+    __slots__ = ("conexion", "creada_en", "usada_en", "pid")
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.creada_en = time.monotonic()
+        self.usada_en = self.creada_en
+        # Proceso dueño: tras un fork, las conexiones del padre no cuentan en el pool del hijo
+        self.pid = os.getpid()
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones MySQL seguro para hilos.
+
+    - Reutiliza conexiones en orden LIFO (las más recientes están "calientes")
+    - Verifica con ping las conexiones que llevan tiempo ociosas
+    - Recicla conexiones viejas para evitar cortes por wait_timeout del servidor
+    - Lleva contadores que se consultan con estadisticas()
+    """
+
+    def __init__(self, config, tamano=10, timeout=10, reciclar=3600, ping=30):
+        self.config = dict(config)
+        self.tamano = tamano
+        self.timeout = timeout
+        self.reciclar = reciclar
+        self.ping = ping
+
+        self._libres = deque()
+        self._prestadas = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+
+        self._creadas = 0
+        self._recicladas = 0
+        self._descartadas = 0
+        self._prestamos = 0
+        self._esperas = 0
+        self._tiempo_espera = 0.0
+
+    # --------------------------------------------------------------------------
+    # PRÉSTAMO Y DEVOLUCIÓN
+    # --------------------------------------------------------------------------
+
+    def obtener(self):
+        """
+        Presta una conexión sana del pool.
+
+        Si no hay conexiones libres y no se alcanzó el tamaño máximo abre una nueva;
+        si el pool está lleno espera hasta `timeout` segundos.
+
+        Raises:
+            PoolAgotadoError: Si ninguna conexión se libera a tiempo
+        """
+        self._verificar_proceso()
+        inicio = time.monotonic()
+        with self._cond:
+            while not self._libres and self._prestadas >= self.tamano:
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    raise PoolAgotadoError(
+                        f"Pool agotado: {self.tamano} conexiones en uso tras {self.timeout}s de espera"
+                    )
+                self._esperas += 1
+                self._cond.wait(restante)
+            entrada = self._libres.pop() if self._libres else None
+            self._prestadas += 1
+            self._prestamos += 1
+            self._tiempo_espera += time.monotonic() - inicio
+
+        try:
+            entrada = self._preparar(entrada)
+        except Exception:
+            with self._cond:
+                self._prestadas -= 1
+                self._cond.notify()
+            raise
+        return entrada.conexion
+
+    def liberar(self, conexion):
+        """
+        Devuelve una conexión al pool.
+
+        Descarta cualquier transacción sin confirmar y resultados pendientes para
+        que el siguiente préstamo reciba la conexión limpia.
+
+        Una conexión prestada antes de un fork pertenece al pool del padre: el
+        hijo ya reinició sus contadores, así que se ignora (sin cerrarla, porque
+        comparte el socket con el padre).
+        """
+        self._verificar_proceso()
+        entrada = getattr(conexion, "_entrada_pool", None)
+        if entrada is not None and entrada.pid != self._pid:
+            return
+        sana = entrada is not None
+        if sana:
+            try:
+                if conexion.unread_result:
+                    conexion.consume_results()
+                conexion.rollback()
+            except mysql.connector.Error:
+                sana = False
+
+        with self._cond:
+            self._prestadas -= 1
+            if sana:
+                entrada.usada_en = time.monotonic()
+                self._libres.append(entrada)
+            else:
+                self._descartadas += 1
+            self._cond.notify()
+
+        if not sana:
+            self._cerrar(conexion)
+
+    # --------------------------------------------------------------------------
+    # SALUD Y RECICLAJE
+    # --------------------------------------------------------------------------
+
+    def _preparar(self, entrada):
+        ahora = time.monotonic()
+        if entrada is not None and ahora - entrada.creada_en > self.reciclar:
+            self._cerrar(entrada.conexion)
+            entrada = None
+            with self._cond:
+                self._recicladas += 1
+        elif entrada is not None and ahora - entrada.usada_en > self.ping:
+            try:
+                entrada.conexion.ping(reconnect=False)
+            except mysql.connector.Error:
+                self._cerrar(entrada.conexion)
+                entrada = None
+                with self._cond:
+                    self._descartadas += 1
+
+        if entrada is None:
+            # Cursores con buffer por defecto: varias consultas comparten la conexión
+            # de la petición y un fetchone() no debe dejar resultados pendientes.
+            opciones = {"buffered": True, **self.config}
+            entrada = _ConexionPool(mysql.connector.connect(**opciones))
+            entrada.conexion._entrada_pool = entrada
+            with self._cond:
+                self._creadas += 1
+        return entrada
+
+    def _verificar_proceso(self):
+        # Tras un fork las conexiones heredadas comparten socket con el padre:
+        # el hijo las olvida (sin cerrarlas) y empieza con un pool vacío.
+        if os.getpid() != self._pid:
+            with self._cond:
+                if os.getpid() != self._pid:
+                    self._libres.clear()
+                    self._prestadas = 0
+                    self._pid = os.getpid()
+
+    @staticmethod
+    def _cerrar(conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+
+    def calentar(self, cantidad):
+        """
+        Abre hasta `cantidad` conexiones y las deja libres en el pool.
+
+        Se llama al arrancar cada worker para que las primeras peticiones no
+        paguen el costo de conectarse (TCP + autenticación).
+
+        Returns:
+            int: Conexiones libres tras el calentamiento
+        """
+        cantidad = min(cantidad, self.tamano)
+        prestadas = []
+        try:
+            for _ in range(cantidad):
+                prestadas.append(self.obtener())
+        finally:
+            for conexion in prestadas:
+                self.liberar(conexion)
+        with self._cond:
+            return len(self._libres)
+
+    def cerrar_todas(self):
+        """Cierra todas las conexiones libres (las prestadas se cierran al devolverse)."""
+        with self._cond:
+            libres = list(self._libres)
+            self._libres.clear()
+        for entrada in libres:
+            self._cerrar(entrada.conexion)
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: Tamaño, conexiones prestadas/libres y contadores acumulados
+        """
+        with self._cond:
+            return {
+                "tamano": self.tamano,
+                "prestadas": self._prestadas,
+                "libres": len(self._libres),
+                "creadas": self._creadas,
+                "recicladas": self._recicladas,
+                "descartadas": self._descartadas,
+                "prestamos": self._prestamos,
+                "esperas": self._esperas,
+                "tiempo_espera_total": round(self._tiempo_espera, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_ajustes_pool = None
+
+
+def configurar(config):
+    """
+    Toma credenciales y tamaños del pool de la configuración de la aplicación.
+
+    Args:
+        config (dict): app.config (claves DB_* de config.Config)
+    """
+    global _pool, _ajustes_pool
+    with _pool_lock:
+        _ajustes_pool = {
+            "config": {
+                "host": config["DB_HOST"],
+                "port": config["DB_PORT"],
+                "database": config["DB_NAME"],
+                "user": config["DB_USER"],
+                "password": config["DB_PASSWORD"],
+            },
+            "tamano": config["DB_POOL_SIZE"],
+            "timeout": config["DB_POOL_TIMEOUT"],
+            "reciclar": config["DB_POOL_RECYCLE"],
+            "ping": config["DB_POOL_PING"],
+        }
+        anterior, _pool = _pool, None
+    if anterior is not None:
+        anterior.cerrar_todas()
+
+
+def get_pool():
+    """Devuelve el pool del proceso, creándolo en el primer uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if _ajustes_pool is None:
+                    raise RuntimeError("Falta llamar a db.init_app(app) antes de usar la base de datos")
+                _pool = PoolConexiones(**_ajustes_pool)
+    return _pool
+
+
+# ==============================================================================
+# INSTRUMENTACIÓN DE CONSULTAS
+# ==============================================================================
+# get_db() entrega la conexión envuelta para medir cada consulta: cantidad,
+# tiempo y filas leídas se acumulan en g.estadisticas_db (una suma por
+# contexto), y cada consulta se notifica a los observadores registrados
+# (métricas, registro de consultas lentas). El costo por consulta es un par de
+# lecturas de reloj y sumas.
+
+_observadores = []
+
+
+def registrar_observador(funcion):
+    """
+    Registra `funcion(sql, parametros, duracion, conexion)`, llamada después de
+    cada execute/executemany hecho con get_db(). No debe lanzar excepciones.
+    """
+    if funcion not in _observadores:
+        _observadores.append(funcion)
+
+
+class CursorInstrumentado:
+    """Cursor que mide sus consultas; el resto de atributos se delegan al cursor real."""
+
+    __slots__ = ("_cursor", "_conexion", "_estadisticas")
+
+    def __init__(self, cursor, conexion, estadisticas):
+        self._cursor = cursor
+        self._conexion = conexion
+        self._estadisticas = estadisticas
+
+    def _medir(self, metodo, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, parametros)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self._estadisticas["consultas"] += 1
+            self._estadisticas["tiempo"] += duracion
+            for observador in _observadores:
+                observador(sql, parametros, duracion, self._conexion)
+
+    def execute(self, sql, params=()):
+        return self._medir(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self._medir(self._cursor.executemany, sql, seq_params)
+
+    def fetchone(self):
+        fila = self._cursor.fetchone()
+        if fila is not None:
+            self._estadisticas["filas"] += 1
+        return fila
+
+    def fetchmany(self, size=1):
+        filas = self._cursor.fetchmany(size)
+        self._estadisticas["filas"] += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._cursor.fetchall()
+        self._estadisticas["filas"] += len(filas)
+        return filas
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionInstrumentada:
+    """Conexión del pool cuyos cursores son CursorInstrumentado."""
+
+    __slots__ = ("conexion", "_estadisticas")
+
+    def __init__(self, conexion, estadisticas):
+        self.conexion = conexion
+        self._estadisticas = estadisticas
+
+    def cursor(self, *args, **kwargs):
+        return CursorInstrumentado(self.conexion.cursor(*args, **kwargs), self.conexion, self._estadisticas)
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion, nombre)
+
+
+# ==============================================================================
+# CONEXIÓN POR PETICIÓN
+# ==============================================================================
 
 def get_db():
-    return mysql.connector.connect(
-        # host="localhost",
-        host="dpg-d522h03e5dus73akfcog-a",
-        database="inventario_pymes",
-        user="root",
-        password="LfVEm3H3d4E999WvdEAME1WrTJla5PZS",
-        port=5432
-    )
+    """
+    Devuelve la conexión de la petición (o contexto de aplicación) actual.
+
+    La primera llamada toma una conexión del pool y la guarda en `g`; las siguientes
+    reutilizan la misma. close_db() la devuelve al pool al terminar el contexto.
+    """
+    if not has_app_context():
+        raise RuntimeError("get_db() requiere un contexto de aplicación Flask")
+    if "db" not in g:
+        if "estadisticas_db" not in g:
+            g.estadisticas_db = {"consultas": 0, "tiempo": 0.0, "filas": 0}
+        g.db = ConexionInstrumentada(get_pool().obtener(), g.estadisticas_db)
+    return g.db
+
+
+def close_db(error=None):
+    """Devuelve al pool la conexión prestada al contexto actual, si la hay."""
+    db = g.pop("db", None)
+    if db is not None:
+        get_pool().liberar(db.conexion)
+
+
+def init_app(app):
+    """
+    Configura el pool con app.config y registra la devolución automática de
+    conexiones al terminar cada contexto.
+    """
+    configurar(app.config)
+    app.teardown_appcontext(close_db)
+
+
+def iterar_consulta(sql, parametros=(), tamano_lote=500, dictionary=False):
+    """
+    Ejecuta una consulta y produce sus filas sin cargar el resultado completo.
+
+    Usa un cursor sin buffer sobre la conexión de la petición: el servidor envía
+    las filas a medida que se leen en lotes de `tamano_lote`, así que la memoria
+    no depende del tamaño del resultado. La conexión queda ocupada hasta que el
+    generador se agota o se cierra.
+
+    Yields:
+        tuple or dict: Una fila por iteración
+    """
+    db = get_db()
+    cursor = db.cursor(buffered=False, dictionary=dictionary)
+    try:
+        cursor.execute(sql, parametros)
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        # Si el consumidor se detiene antes (p. ej. el cliente cerró la conexión)
+        # se descartan las filas pendientes para dejar la conexión utilizable.
+        if db.unread_result:
+            db.consume_results()
+        cursor.close()
@@ -0,0 +1,73 @@
+# ==============================================================================
+# CONFIGURACIÓN DE GUNICORN (producción)
+# ==============================================================================
+# Uso: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Varios procesos worker, cada uno con varios hilos: una petición lenta (un
+# reporte, una exportación) ocupa un hilo, no el servidor completo. Cada worker
+# tiene su propio pool de conexiones (db.py), así que DB_POOL_SIZE debe ser al
+# menos igual a GUNICORN_THREADS.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = "0.0.0.0:" + os.environ.get("PORT", "10000")
+
+workers = int(os.environ.get("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+
+# Segundos sin respuesta del worker antes de reiniciarlo
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+# Al recibir SIGTERM los workers dejan de aceptar conexiones y terminan las
+# peticiones en curso durante como máximo estos segundos
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Reinicio periódico de workers (con variación para que no coincidan)
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+# Directorio donde cada worker vuelca sus métricas para que /metrics responda
+# la suma de todos (ver utils/metricas.py). Se hereda por los workers.
+os.environ.setdefault("METRICAS_DIR", os.path.join(tempfile.gettempdir(), "inventario_metricas"))
+
+
+def on_starting(server):
+    # Los contadores empiezan de cero en cada arranque del servidor
+    for ruta in glob.glob(os.path.join(os.environ["METRICAS_DIR"], "metricas_*.json")):
+        os.remove(ruta)
+
+
+def post_worker_init(worker):
+    # La aplicación ya está cargada en este worker (worker.wsgi, la creada por
+    # wsgi.py): abrir las primeras conexiones ahora y no en la primera petición
+    import db
+
+    try:
+        libres = db.get_pool().calentar(worker.wsgi.config["DB_POOL_MIN"])
+        worker.log.info("Pool de conexiones precalentado con %s conexiones", libres)
+    except Exception as e:
+        # La base puede no estar disponible todavía; el pool conectará bajo demanda
+        worker.log.warning("No se pudo precalentar el pool de conexiones: %s", e)
+
+
+def worker_exit(server, worker):
+    # Las peticiones en curso ya terminaron: cerrar las conexiones libres y
+    # dejar volcadas las métricas finales del worker
+    import db
+    from utils import metricas
+
+    db.get_pool().cerrar_todas()
+    metricas.volcar(forzar=True)
+
+
+def child_exit(server, worker):
+    # En el maestro: sumar las métricas del worker terminado al acumulado
+    from utils import metricas
+
+    metricas.consolidar_worker(worker.pid)
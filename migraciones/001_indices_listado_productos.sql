@@ -0,0 +1,11 @@
+-- ==============================================================================
+-- 001 - Índices para el listado paginado de productos
+-- ==============================================================================
+-- El listado usa paginación por cursor (keyset) sobre (nombre, id) o sobre id,
+-- siempre filtrando activo = 1 y opcionalmente por categoría o prefijo del nombre.
+-- InnoDB agrega la clave primaria (id) al final de cada índice secundario, así
+-- que (activo, nombre) ya sirve el orden (nombre, id).
+
+ALTER TABLE productos
+    ADD INDEX idx_productos_activo_nombre (activo, nombre),
+    ADD INDEX idx_productos_activo_categoria_nombre (activo, categoria_id, nombre);
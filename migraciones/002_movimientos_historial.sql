@@ -0,0 +1,18 @@
+-- ==============================================================================
+-- 002 - Columnas e índices del historial de movimientos
+-- ==============================================================================
+-- utils/movimientos.py ya escribe cantidad y proveedor_id, pero el volcado
+-- database.sql no las incluye. Si la base ya tiene estas columnas, omita el
+-- primer ALTER.
+
+ALTER TABLE movimientos
+    ADD COLUMN cantidad int NOT NULL DEFAULT 0 AFTER tipo,
+    ADD COLUMN proveedor_id int DEFAULT NULL AFTER cantidad;
+
+-- El historial pagina por cursor sobre (fecha_movimiento, id) en orden
+-- descendente. Los índices compuestos sirven los filtros por producto y por
+-- usuario sin ordenar en memoria (InnoDB agrega id al final de cada índice).
+ALTER TABLE movimientos
+    ADD INDEX idx_movimientos_fecha (fecha_movimiento),
+    ADD INDEX idx_movimientos_producto_fecha (producto_id, fecha_movimiento),
+    ADD INDEX idx_movimientos_usuario_fecha (usuario_id, fecha_movimiento);
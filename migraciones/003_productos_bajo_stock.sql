@@ -0,0 +1,12 @@
+-- ==============================================================================
+-- 003 - Estado de stock bajo mantenido por la base de datos
+-- ==============================================================================
+-- Ningún índice puede resolver "stock <= stock_minimo" (compara dos columnas),
+-- así que cada consulta de stock bajo recorría toda la tabla productos. La
+-- columna generada almacenada se recalcula sola en cada INSERT/UPDATE de
+-- stock o stock_minimo (movimientos, edición, importación) y el índice
+-- compuesto permite leer solo los productos activos con stock bajo.
+
+ALTER TABLE productos
+    ADD COLUMN bajo_stock tinyint(1) AS (stock <= stock_minimo) STORED,
+    ADD INDEX idx_productos_activo_bajo_stock (activo, bajo_stock);
@@ -0,0 +1,16 @@
+-- ==============================================================================
+-- 004 - Versión del catálogo para la API JSON (ETag / GET condicional)
+-- ==============================================================================
+-- Cada escritura que cambia productos o su stock incrementa la versión
+-- 'catalogo' (ver utils/catalogo.py). La API de productos deriva su ETag de
+-- este número, así que un cliente al día recibe 304 sin que se consulte ni se
+-- serialice el catálogo. Es una tabla aparte para que todos los workers
+-- compartan el mismo contador.
+
+CREATE TABLE IF NOT EXISTS versiones (
+    nombre varchar(50) NOT NULL,
+    valor bigint unsigned NOT NULL DEFAULT 0,
+    PRIMARY KEY (nombre)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+INSERT IGNORE INTO versiones (nombre, valor) VALUES ('catalogo', 1);
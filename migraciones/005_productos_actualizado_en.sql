@@ -0,0 +1,17 @@
+-- ==============================================================================
+-- 005 - Seguimiento de cambios en productos para sincronización incremental
+-- ==============================================================================
+-- actualizado_en lo mantiene la propia base de datos: DEFAULT lo fija al
+-- crear y ON UPDATE lo renueva en cualquier UPDATE que cambie la fila (edición,
+-- eliminación lógica, movimientos de stock, importación), sin depender de que
+-- cada ruta de escritura se acuerde de hacerlo. Precisión de microsegundos
+-- para que los cambios de un mismo segundo no se confundan.
+--
+-- El índice (actualizado_en, id) permite a /productos/api/cambios leer solo
+-- las filas modificadas desde el cursor del cliente, en orden y sin ordenar
+-- en memoria: el costo depende de cuántas filas cambiaron, no del catálogo.
+
+ALTER TABLE productos
+    ADD COLUMN actualizado_en timestamp(6) NOT NULL
+        DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD INDEX idx_productos_actualizado_en (actualizado_en, id);
@@ -0,0 +1,43 @@
+-- ==============================================================================
+-- 006 - Archivo del historial de movimientos y resúmenes diarios
+-- ==============================================================================
+-- movimientos solo crece. utils/archivo.py mueve por lotes los movimientos
+-- anteriores a un horizonte (ARCHIVO_DIAS) a movimientos_archivo, para que la
+-- tabla "caliente" que leen los dashboards y se escribe en cada movimiento se
+-- mantenga pequeña y quepa en el buffer pool. El historial
+-- (Movimiento.listar_pagina / iterar) consulta ambas tablas.
+--
+-- movimientos_archivo conserva el id original (no es AUTO_INCREMENT), así que
+-- el cursor de paginación (fecha_movimiento, id) sigue siendo válido sobre las
+-- dos tablas. No tiene claves foráneas: sus filas no se modifican y los
+-- productos y usuarios solo se desactivan, nunca se borran.
+--
+-- Se usa una tabla aparte y no PARTITION BY sobre movimientos porque MySQL no
+-- admite particiones en tablas con claves foráneas.
+
+CREATE TABLE IF NOT EXISTS movimientos_archivo (
+    id int NOT NULL,
+    producto_id int NOT NULL,
+    usuario_id int NOT NULL,
+    tipo enum('entrada','salida') COLLATE utf8mb4_unicode_ci NOT NULL,
+    cantidad int NOT NULL DEFAULT 0,
+    proveedor_id int DEFAULT NULL,
+    fecha_movimiento timestamp NULL DEFAULT NULL,
+    PRIMARY KEY (id),
+    KEY idx_archivo_fecha (fecha_movimiento),
+    KEY idx_archivo_producto_fecha (producto_id, fecha_movimiento),
+    KEY idx_archivo_usuario_fecha (usuario_id, fecha_movimiento)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Totales por producto y día de los movimientos archivados: los totales
+-- históricos (entradas, salidas) se resuelven sumando estas filas y la tabla
+-- caliente, sin recorrer el archivo.
+CREATE TABLE IF NOT EXISTS movimientos_resumen_diario (
+    producto_id int NOT NULL,
+    dia date NOT NULL,
+    entradas bigint NOT NULL DEFAULT 0,
+    salidas bigint NOT NULL DEFAULT 0,
+    movimientos int NOT NULL DEFAULT 0,
+    PRIMARY KEY (producto_id, dia),
+    KEY idx_resumen_dia (dia)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
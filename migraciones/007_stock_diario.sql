@@ -0,0 +1,25 @@
+-- ==============================================================================
+-- 007 - Instantáneas diarias de stock
+-- ==============================================================================
+-- "¿Cuánto stock había del producto X el 1 de marzo?" ya no exige recorrer
+-- todo el historial de movimientos. utils/stock_diario.py (comando
+-- `flask generar-stock-diario`) escribe, al cierre de cada día, el stock y su
+-- valor (stock * precio vigente) de los productos que tuvieron movimientos ese
+-- día, a partir de su instantánea anterior más el neto del día.
+--
+-- Las filas son dispersas: un producto sin movimientos en un día no tiene fila
+-- ese día y su stock es el de su última instantánea. La primera ejecución
+-- escribe una línea base con todos los productos.
+--
+-- La clave (producto_id, fecha) resuelve "última instantánea <= fecha" con
+-- una sola lectura del índice; idx_stock_diario_fecha da el primer y el último
+-- día generados.
+
+CREATE TABLE IF NOT EXISTS stock_diario (
+    producto_id int NOT NULL,
+    fecha date NOT NULL,
+    stock int NOT NULL,
+    valor decimal(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (producto_id, fecha),
+    KEY idx_stock_diario_fecha (fecha)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,20 @@
+-- ==============================================================================
+-- 008 - Búsqueda de texto completo en productos
+-- ==============================================================================
+-- /productos/api/buscar ordena por relevancia con MATCH ... AGAINST en modo
+-- booleano (ver ProductoDB.buscar). Dos índices FULLTEXT:
+--   - (nombre, descripcion): decide qué productos coinciden
+--   - (nombre): pondera más las coincidencias en el nombre
+--
+-- Las columnas usan utf8mb4_unicode_ci, así que "camara" encuentra "Cámara"
+-- y la búsqueda no distingue mayúsculas. Los términos de menos de
+-- innodb_ft_min_token_size caracteres (3 por defecto) no se indexan; la
+-- aplicación los descarta con el mismo límite (BUSQUEDA_MIN_CARACTERES).
+--
+-- Crear un índice FULLTEXT reconstruye la tabla: ejecutar fuera de horario.
+
+ALTER TABLE productos
+    ADD FULLTEXT INDEX ft_productos_nombre_descripcion (nombre, descripcion);
+
+ALTER TABLE productos
+    ADD FULLTEXT INDEX ft_productos_nombre (nombre);
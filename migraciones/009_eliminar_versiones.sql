@@ -0,0 +1,10 @@
+-- ==============================================================================
+-- 009 - Fin de la tabla de versiones del catálogo
+-- ==============================================================================
+-- La versión del catálogo (ETag de la API de productos) ya no es un contador
+-- que cada escritura incrementa: se deriva de MAX(productos.actualizado_en)
+-- con el índice de la migración 005 (ver utils/catalogo.py). El contador
+-- obligaba a todos los movimientos de stock a actualizar la misma fila y a
+-- confirmar una segunda transacción.
+
+DROP TABLE IF EXISTS versiones;
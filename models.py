@@ -1,5 +1,18 @@
-from db import get_db
-import bcrypt
+import os
+import threading
+from collections import namedtuple
+from itertools import chain
+from datetime import datetime
+
+from db import get_db, iterar_consulta
+from utils.cache import CacheTTL
+from utils.estadisticas import invalidar_estadisticas
+from utils.catalogo import invalidar_catalogo
+from utils.archivo import archivo_incluye
+from utils.busqueda import consulta_fulltext
+from utils.paginacion import escapar_like
+from auth.hashing import hash_password
+from auth.sesiones import invalidar_usuario
 
 # ==============================================================================
 # SECCIÓN 1: MODELO DE USUARIOS - Patrón de Herencia y Polimorfismo
@@ -22,7 +35,12 @@ class Usuario:
     Principio SOLID aplicado:
         - Open/Closed: Abierta para extensión (subclases Admin/Operador)
         - Liskov: Las subclases pueden sustituir a la clase base
+    
+    Memoria: __slots__ evita un __dict__ por instancia (las subclases declaran
+    __slots__ vacío para conservar la ventaja).
     """
+    __slots__ = ("id", "nombre", "correo", "activo")
+
     def __init__(self, id, nombre, correo, activo=True):
         self.id = id
         self.nombre = nombre
@@ -54,6 +72,8 @@ class Admin(Usuario):
     Representa un usuario con privilegios administrativos completos.
     Hereda de Usuario y sobreescribe métodos específicos.
     """
+    __slots__ = ()
+
     @property
     def rol(self):
         """
@@ -79,6 +99,8 @@ class Operador(Usuario):
     Representa un usuario con permisos limitados a operaciones básicas.
     Hereda de Usuario con funcionalidad específica para operador.
     """
+    __slots__ = ()
+
     @property
     def rol(self):
         """
@@ -121,25 +143,24 @@ class UsuarioDB:
         Returns:
             list[Usuario]: Lista de instancias de Admin u Operador
         
-        SQL Nota: El JOIN con la tabla roles es necesario para obtener el nombre del rol
+        SQL Nota: El JOIN con la tabla roles es necesario para obtener el nombre del rol.
+            Cursor de tuplas: evita construir un dict intermedio por fila.
         """
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor()
 
         cursor.execute("""
             SELECT 
-                u.id, u.nombre, u.correo, r.nombre AS rol, u.activo
+                u.id, u.nombre, u.correo, u.activo, r.nombre AS rol
             FROM usuarios u
             JOIN roles r ON u.rol_id = r.id
         """)
 
         usuarios = []
-        for u in cursor.fetchall():
+        for id, nombre, correo, activo, rol in cursor.fetchall():
             # Factory Pattern implícito: Decide qué tipo de usuario crear
-            if u["rol"] == "admin":
-                usuarios.append(Admin(u["id"], u["nombre"], u["correo"], u["activo"]))
-            else:
-                usuarios.append(Operador(u["id"], u["nombre"], u["correo"], u["activo"]))
+            clase = Admin if rol == "admin" else Operador
+            usuarios.append(clase(id, nombre, correo, activo))
 
         return usuarios
 
@@ -165,6 +186,8 @@ class UsuarioDB:
         """, (usuario_id,))
 
         db.commit()
+        invalidar_usuario(usuario_id)
+        invalidar_estadisticas()
         
     @staticmethod
     def crear_usuario(nombre, correo, contrasena, rol_id):
@@ -178,24 +201,42 @@ class UsuarioDB:
             rol_id (int): ID del rol en la tabla roles
         
         Seguridad:
-            - Usa bcrypt para hashing de contraseñas
+            - Usa bcrypt para hashing de contraseñas (auth.hashing, en un pool
+              de procesos para no bloquear el hilo de la petición)
             - bcrypt.gensalt() genera un salt único
             - Hash incluye salt automáticamente
         
         Nota: Falta validación de correo único y manejo de excepciones
         """
+        # HASHING DE CONTRASEÑA - CRÍTICO PARA SEGURIDAD
+        hashed_password = hash_password(contrasena)
+
         db = get_db()
         cursor = db.cursor()
 
-        # HASHING DE CONTRASEÑA - CRÍTICO PARA SEGURIDAD
-        hashed_password = bcrypt.hashpw(contrasena.encode('utf-8'), bcrypt.gensalt())
-
         cursor.execute("""
-            INSERT INTO usuarios (nombre, correo, contrasena, rol_id, activo)
+            INSERT INTO usuarios (nombre, correo, password, rol_id, activo)
             VALUES (%s, %s, %s, %s, 1)
         """, (nombre, correo, hashed_password, rol_id))
 
         db.commit()
+        # Por si había un "no existe" cacheado para ese id
+        invalidar_usuario(cursor.lastrowid)
+        invalidar_estadisticas()
+
+    @staticmethod
+    def actualizar_password(usuario_id, hashed_password):
+        """
+        Reemplaza el hash de contraseña de un usuario (p. ej. re-hash con otro costo).
+        
+        Args:
+            usuario_id (int): ID del usuario
+            hashed_password (str): Hash bcrypt ya calculado
+        """
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("UPDATE usuarios SET password = %s WHERE id = %s", (hashed_password, usuario_id))
+        db.commit()
     
     
 
@@ -222,7 +263,14 @@ class Producto:
         imagen (str): Ruta o URL de la imagen
         activo (bool): Estado (True=disponible, False=eliminado lógico)
         creado_en (str): Fecha de creación (formato DATETIME de MySQL)
+    
+    Memoria: __slots__ evita un __dict__ por instancia (ver
+    benchmarks/bench_modelos.py). El orden de los parámetros de __init__
+    coincide con ProductoDB._COLUMNAS para construir directo desde una tupla.
     """
+    __slots__ = ("id", "nombre", "descripcion", "categoria_id", "stock", "stock_minimo",
+                 "precio", "imagen", "activo", "creado_en")
+
     def __init__(self, id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo=True, creado_en=None):
         self.id = id
         self.nombre = nombre
@@ -283,24 +331,37 @@ class Producto:
         """, (nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen))
         db.commit()
         producto_id = cursor.lastrowid
+        invalidar_estadisticas()
+        invalidar_catalogo()
         return cls(producto_id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen)
     
-    def actualizar(self):
+    def actualizar(self, confirmar=True):
         """
         Persiste los cambios del producto en la base de datos.
         
         Precondición: El producto debe tener un ID válido (no None)
+
+        Args:
+            confirmar (bool): False deja la transacción abierta para que quien
+                llama la confirme junto con otras escrituras (ver
+                utils.movimientos.guardar_edicion)
         
-        SQL Nota: Actualiza todos los campos excepto 'activo' y 'creado_en'
+        SQL Nota: Actualiza todos los campos excepto 'stock', 'activo' y 'creado_en'.
+            El stock solo cambia con movimientos (utils/movimientos.py), para que
+            productos.stock y el historial no se separen.
         """
         db = get_db()
         cursor = db.cursor()
         cursor.execute("""
             UPDATE productos
-            SET nombre=%s, descripcion=%s, categoria_id=%s, stock=%s, stock_minimo=%s, precio=%s, imagen=%s
+            SET nombre=%s, descripcion=%s, categoria_id=%s, stock_minimo=%s, precio=%s, imagen=%s
             WHERE id=%s
-        """, (self.nombre, self.descripcion, self.categoria_id, self.stock, self.stock_minimo, self.precio, self.imagen, self.id))
+        """, (self.nombre, self.descripcion, self.categoria_id, self.stock_minimo, self.precio, self.imagen, self.id))
+        if not confirmar:
+            return
         db.commit()
+        invalidar_estadisticas()
+        invalidar_catalogo()
 
     def eliminar(self):
         """
@@ -318,6 +379,14 @@ class Producto:
         cursor = db.cursor()
         cursor.execute("UPDATE productos SET activo=0 WHERE id=%s", (self.id,))
         db.commit()
+        invalidar_estadisticas()
+        invalidar_catalogo()
+
+# Fila de la sincronización incremental (ver ProductoDB.cambios_desde)
+CambioProducto = namedtuple(
+    "CambioProducto",
+    ("id", "nombre", "categoria_id", "stock", "stock_minimo", "precio", "activo", "actualizado_en"),
+)
 
 # ==============================================================================
 # SECCIÓN 4: REPOSITORIO DE PRODUCTOS - DUPLICACIÓN PROBLEMÁTICA
@@ -336,6 +405,9 @@ class ProductoDB:
         - Eliminar esta clase y usar solo Producto (Active Record)
     """
 
+    # Columnas en el orden de los parámetros de Producto.__init__
+    _COLUMNAS = "id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en"
+
     @staticmethod
     def obtener_todos():
         """
@@ -343,20 +415,241 @@ class ProductoDB:
         
         Duplicado de: Podría ser método de clase de Producto
         
-        SQL Nota: WHERE activo = 1 filtra productos eliminados lógicamente
+        SQL Nota: WHERE activo = 1 filtra productos eliminados lógicamente.
+            Cursor de tuplas: Producto(*fila) evita un dict intermedio por fila.
         """
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor()
         cursor.execute("""
-            SELECT id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en
+            SELECT {}
             FROM productos
             WHERE activo = 1
-        """)
-        productos = []
-        for p in cursor.fetchall():
-            # Producto(**p) usa unpacking de diccionario para crear instancia
-            productos.append(Producto(**p))
-        return productos
+        """.format(ProductoDB._COLUMNAS))
+        return [Producto(*fila) for fila in cursor.fetchall()]
+
+    # Órdenes permitidos en el listado y la clave (keyset) que usa cada uno
+    ORDENES_LISTADO = {
+        "nombre": ("nombre", "id"),
+        "id": ("id",),
+    }
+
+    @staticmethod
+    def _condiciones_listado(categoria_id=None, solo_stock_bajo=False, prefijo=None, alias=""):
+        """
+        Construye el WHERE del listado de productos activos a partir de los filtros.
+
+        Returns:
+            tuple[list[str], list]: Condiciones SQL y sus parámetros
+        """
+        condiciones = [f"{alias}activo = 1"]
+        parametros = []
+        if categoria_id is not None:
+            condiciones.append(f"{alias}categoria_id = %s")
+            parametros.append(categoria_id)
+        if solo_stock_bajo:
+            # Columna generada indexada (migraciones/003), equivale a stock <= stock_minimo
+            condiciones.append(f"{alias}bajo_stock = 1")
+        if prefijo:
+            condiciones.append(f"{alias}nombre LIKE %s")
+            parametros.append(escapar_like(prefijo) + "%")
+        return condiciones, parametros
+
+    @staticmethod
+    def listar_pagina(limite=50, cursor=None, orden="nombre", categoria_id=None,
+                      solo_stock_bajo=False, prefijo=None):
+        """
+        Obtiene una página del catálogo activo usando paginación por cursor (keyset).
+
+        A diferencia de OFFSET, el costo de cada página no crece con su posición:
+        la consulta continúa justo después de la última fila vista aprovechando el
+        índice (activo, nombre) / la clave primaria.
+
+        Args:
+            limite (int): Máximo de productos por página
+            cursor (list or None): Clave de la última fila de la página anterior
+                (ver utils.paginacion.decodificar_cursor)
+            orden (str): "nombre" (nombre, id) o "id"
+            categoria_id (int or None): Filtra por categoría
+            solo_stock_bajo (bool): Solo productos con stock <= stock_minimo
+            prefijo (str or None): Filtra por nombres que empiezan con este texto
+
+        Returns:
+            tuple[list[Producto], list or None]: Productos de la página y la clave
+            de la última fila si existe una página siguiente (None si no)
+
+        SQL Nota: Solo se leen las columnas que muestra la tabla; la descripción
+        se recorta en el servidor a lo que el listado puede mostrar.
+        """
+        if orden not in ProductoDB.ORDENES_LISTADO:
+            raise ValueError(f"Orden no soportado: {orden}")
+        columnas = ProductoDB.ORDENES_LISTADO[orden]
+
+        condiciones, parametros = ProductoDB._condiciones_listado(categoria_id, solo_stock_bajo, prefijo)
+
+        if cursor is not None:
+            if len(cursor) != len(columnas):
+                raise ValueError("Cursor de paginación inválido")
+            # Comparación de tuplas: (nombre, id) > (%s, %s)
+            condiciones.append(
+                "({}) > ({})".format(", ".join(columnas), ", ".join(["%s"] * len(columnas)))
+            )
+            parametros.extend(cursor)
+
+        db = get_db()
+        cursor_db = db.cursor()
+        cursor_db.execute("""
+            SELECT id, nombre, LEFT(descripcion, 61), categoria_id, stock, stock_minimo, precio
+            FROM productos
+            WHERE {}
+            ORDER BY {}
+            LIMIT %s
+        """.format(" AND ".join(condiciones), ", ".join(columnas)), (*parametros, limite + 1))
+        filas = cursor_db.fetchall()
+
+        productos = [
+            Producto(id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, None)
+            for id, nombre, descripcion, categoria_id, stock, stock_minimo, precio in filas[:limite]
+        ]
+
+        siguiente = None
+        if len(filas) > limite:
+            ultimo = productos[-1]
+            siguiente = [getattr(ultimo, c) for c in columnas]
+        return productos, siguiente
+
+    @staticmethod
+    def iterar(orden="nombre", categoria_id=None, solo_stock_bajo=False, prefijo=None):
+        """
+        Recorre el catálogo activo filtrado completo sin cargarlo en memoria
+        (ver db.iterar_consulta), con los mismos filtros que listar_pagina().
+
+        Yields:
+            tuple: (id, nombre, descripcion, categoria, stock, stock_minimo, precio, imagen)
+            donde categoria es el nombre de la categoría (o None)
+        """
+        if orden not in ProductoDB.ORDENES_LISTADO:
+            raise ValueError(f"Orden no soportado: {orden}")
+        condiciones, parametros = ProductoDB._condiciones_listado(
+            categoria_id, solo_stock_bajo, prefijo, alias="p."
+        )
+        sql = """
+            SELECT p.id, p.nombre, p.descripcion, c.nombre, p.stock, p.stock_minimo, p.precio, p.imagen
+            FROM productos p
+            LEFT JOIN categorias c ON c.id = p.categoria_id
+            WHERE {}
+            ORDER BY {}
+        """.format(
+            " AND ".join(condiciones),
+            ", ".join("p." + c for c in ProductoDB.ORDENES_LISTADO[orden]),
+        )
+        return iterar_consulta(sql, parametros)
+
+    @staticmethod
+    def buscar(texto, limite=20, pagina=1, categoria_id=None):
+        """
+        Busca productos activos por nombre y descripción, ordenados por relevancia.
+
+        Usa los índices FULLTEXT de migraciones/008: la coincidencia no distingue
+        mayúsculas ni tildes y cada término se busca por prefijo (ver
+        utils.busqueda.consulta_fulltext). Las coincidencias en el nombre pesan
+        el doble que las de la descripción.
+
+        Args:
+            texto (str): Texto escrito por el usuario
+            limite (int): Resultados por página
+            pagina (int): Página (desde 1). La relevancia no sirve como cursor
+                estable, así que se pagina con OFFSET; las búsquedas rara vez
+                pasan de las primeras páginas.
+            categoria_id (int or None): Filtra por categoría
+
+        Returns:
+            tuple[list[tuple[Producto, float]], bool]: Productos con su relevancia
+            y si hay una página siguiente
+        """
+        consulta = consulta_fulltext(texto)
+        if consulta is None:
+            return [], False
+
+        condiciones = ["activo = 1", "MATCH(nombre, descripcion) AGAINST (%s IN BOOLEAN MODE)"]
+        parametros = [consulta]
+        if categoria_id is not None:
+            condiciones.append("categoria_id = %s")
+            parametros.append(categoria_id)
+
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("""
+            SELECT id, nombre, LEFT(descripcion, 61), categoria_id, stock, stock_minimo, precio,
+                   MATCH(nombre) AGAINST (%s IN BOOLEAN MODE) * 2
+                   + MATCH(nombre, descripcion) AGAINST (%s IN BOOLEAN MODE) AS relevancia
+            FROM productos
+            WHERE {}
+            ORDER BY relevancia DESC, id
+            LIMIT %s OFFSET %s
+        """.format(" AND ".join(condiciones)),
+            (consulta, consulta, *parametros, limite + 1, (pagina - 1) * limite))
+        filas = cursor.fetchall()
+
+        resultados = [
+            (Producto(id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, None), float(relevancia))
+            for id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, relevancia in filas[:limite]
+        ]
+        return resultados, len(filas) > limite
+
+    # Segundos de margen antes de entregar un cambio a la sincronización. Una
+    # transacción toma actualizado_en al ejecutar su UPDATE pero puede confirmar
+    # después de que otra más reciente ya se entregó; al no entregar lo ocurrido
+    # en los últimos segundos, el cursor del cliente no "salta" esas filas.
+    RETRASO_SINCRONIZACION = int(os.environ.get("SYNC_RETRASO_SEGUNDOS", 5))
+
+    @staticmethod
+    def cambios_desde(cursor=None, limite=500):
+        """
+        Obtiene los productos modificados después de un cursor de sincronización.
+
+        Incluye los productos eliminados lógicamente (activo = 0) para que el
+        cliente los borre. Sin cursor devuelve el catálogo activo completo
+        (sincronización inicial), también por páginas.
+
+        Args:
+            cursor (list or None): [actualizado_en, id] del último cambio recibido
+            limite (int): Máximo de cambios por respuesta
+
+        Returns:
+            tuple[list[CambioProducto], list or None]: Cambios en orden de
+            actualización y el cursor para la siguiente llamada (None si no hubo
+            cambios: el cliente conserva el que tenía)
+
+        SQL Nota: usa el índice (actualizado_en, id) de la migración 005.
+        """
+        condiciones = ["actualizado_en < NOW(6) - INTERVAL %s SECOND"]
+        parametros = [ProductoDB.RETRASO_SINCRONIZACION]
+        if cursor is None:
+            condiciones.append("activo = 1")
+        else:
+            if len(cursor) != 2:
+                raise ValueError("Cursor de sincronización inválido")
+            actualizado_en, ultimo_id = cursor
+            if isinstance(actualizado_en, str):
+                actualizado_en = datetime.fromisoformat(actualizado_en)
+            condiciones.append("(actualizado_en, id) > (%s, %s)")
+            parametros.extend([actualizado_en, int(ultimo_id)])
+
+        db = get_db()
+        cursor_db = db.cursor()
+        cursor_db.execute("""
+            SELECT id, nombre, categoria_id, stock, stock_minimo, precio, activo, actualizado_en
+            FROM productos
+            WHERE {}
+            ORDER BY actualizado_en, id
+            LIMIT %s
+        """.format(" AND ".join(condiciones)), (*parametros, limite))
+        cambios = [CambioProducto._make(fila) for fila in cursor_db.fetchall()]
+
+        siguiente = None
+        if cambios:
+            siguiente = [cambios[-1].actualizado_en, cambios[-1].id]
+        return cambios, siguiente
 
     @staticmethod
     def obtener_por_id(producto_id):
@@ -370,15 +663,15 @@ class ProductoDB:
             Producto or None: Instancia del producto o None si no existe
         """
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor()
         cursor.execute("""
-            SELECT id, nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en
+            SELECT {}
             FROM productos
             WHERE id = %s
-        """, (producto_id,))
+        """.format(ProductoDB._COLUMNAS), (producto_id,))
         data = cursor.fetchone()
         if data:
-            return Producto(**data)
+            return Producto(*data)
         return None
 
 
@@ -387,6 +680,13 @@ class ProductoDB:
 # ==============================================================================
 # Clase para rastrear cambios en el inventario (entradas, salidas, ajustes).
 
+# Fila del historial de movimientos: una tupla con nombre (sin __dict__) que se
+# construye directamente desde un cursor de tuplas; admite m.fecha, m.producto...
+RegistroMovimiento = namedtuple(
+    "RegistroMovimiento", ("id", "fecha", "producto", "usuario", "tipo", "cantidad")
+)
+
+
 class Movimiento:
     """
     Representa un movimiento de inventario (entrada/salida de stock).
@@ -402,12 +702,16 @@ class Movimiento:
         usuario_id (int): FK al usuario que realizó el movimiento
         tipo (str): Tipo de movimiento ('entrada', 'salida', 'ajuste')
         fecha (datetime): Fecha y hora del movimiento (None=usar fecha actual)
+        cantidad (int): Unidades que entran o salen
     """
-    def __init__(self, producto_id, usuario_id, tipo, fecha=None):
+    __slots__ = ("producto_id", "usuario_id", "tipo", "fecha", "cantidad")
+
+    def __init__(self, producto_id, usuario_id, tipo, fecha=None, cantidad=0):
         self.producto_id = producto_id
         self.usuario_id = usuario_id
         self.tipo = tipo
         self.fecha = fecha
+        self.cantidad = cantidad
 
     def registrar(self):
         """
@@ -416,21 +720,161 @@ class Movimiento:
         SQL Nota:
             - NOW() usa la fecha/hora del servidor de BD
             - Esto es más confiable que datetime.now() del servidor app
-        
-        Mejora sugerida: Transacción que actualice producto.stock y registre movimiento
+
+        Solo inserta el movimiento, sin tocar productos.stock. Para mover stock
+        usar utils.movimientos.registrar_movimiento, que actualiza el stock y
+        registra el movimiento en una sola transacción.
         """
         db = get_db()
         cursor = db.cursor()
 
         cursor.execute("""
-            INSERT INTO movimientos (producto_id, usuario_id, tipo, fecha_movimiento)
-            VALUES (%s, %s, %s, NOW())
-        """, (self.producto_id, self.usuario_id, self.tipo))
+            INSERT INTO movimientos (producto_id, usuario_id, tipo, cantidad, fecha_movimiento)
+            VALUES (%s, %s, %s, %s, NOW())
+        """, (self.producto_id, self.usuario_id, self.tipo, self.cantidad))
 
         db.commit()
+        invalidar_estadisticas()
+
+    # Tipos de movimiento que acepta el filtro del historial
+    TIPOS = ("entrada", "salida")
 
     @staticmethod
-    def obtener_todos():
+    def _condiciones_historial(desde=None, hasta=None, producto_id=None, usuario_id=None, tipo=None):
+        """
+        Construye el WHERE del historial a partir de los filtros opcionales.
+
+        Args:
+            desde (date or datetime): Movimientos a partir de esta fecha (inclusive)
+            hasta (date or datetime): Movimientos anteriores a esta fecha (exclusive)
+            producto_id (int): Solo movimientos del producto
+            usuario_id (int): Solo movimientos del usuario
+            tipo (str): 'entrada' o 'salida'
+
+        Returns:
+            tuple[list[str], list]: Condiciones SQL y sus parámetros
+        """
+        condiciones = []
+        parametros = []
+        if desde is not None:
+            condiciones.append("m.fecha_movimiento >= %s")
+            parametros.append(desde)
+        if hasta is not None:
+            condiciones.append("m.fecha_movimiento < %s")
+            parametros.append(hasta)
+        if producto_id is not None:
+            condiciones.append("m.producto_id = %s")
+            parametros.append(producto_id)
+        if usuario_id is not None:
+            condiciones.append("m.usuario_id = %s")
+            parametros.append(usuario_id)
+        if tipo is not None:
+            if tipo not in Movimiento.TIPOS:
+                raise ValueError(f"Tipo de movimiento no válido: {tipo}")
+            condiciones.append("m.tipo = %s")
+            parametros.append(tipo)
+        return condiciones, parametros
+
+    # Columnas del historial (mismo orden que RegistroMovimiento) leídas de
+    # movimientos o de movimientos_archivo; fecha_movimiento se expone como "fecha"
+    _SQL_HISTORIAL = """
+        SELECT
+            m.id,
+            m.fecha_movimiento AS fecha,
+            p.nombre AS producto,
+            u.nombre AS usuario,
+            m.tipo,
+            m.cantidad
+        FROM {tabla} m
+        JOIN productos p ON m.producto_id = p.id
+        JOIN usuarios u ON m.usuario_id = u.id
+    """
+
+    @staticmethod
+    def _sql_historial(tabla, condiciones):
+        sql = Movimiento._SQL_HISTORIAL.format(tabla=tabla)
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        return sql + " ORDER BY m.fecha_movimiento DESC, m.id DESC"
+
+    @staticmethod
+    def listar_pagina(limite=50, cursor=None, **filtros):
+        """
+        Obtiene una página del historial, del más reciente al más antiguo.
+
+        Usa paginación por cursor sobre (fecha_movimiento, id): cada página continúa
+        justo antes de la última fila vista, así que su costo no depende de cuántas
+        páginas se hayan recorrido ni del tamaño total del historial.
+
+        Si el rango puede incluir movimientos archivados, se toma la página de
+        cada tabla (movimientos y movimientos_archivo) y se combinan con UNION ALL;
+        los ids se conservan al archivar, así que el cursor sirve para ambas.
+
+        Args:
+            limite (int): Máximo de movimientos por página
+            cursor (list or None): [fecha, id] de la última fila de la página anterior
+            **filtros: desde, hasta, producto_id, usuario_id, tipo
+                (ver _condiciones_historial)
+
+        Returns:
+            tuple[list[RegistroMovimiento], list or None]: Movimientos de la página y
+            el cursor de la página siguiente (None si es la última)
+        """
+        condiciones, parametros = Movimiento._condiciones_historial(**filtros)
+
+        if cursor is not None:
+            if len(cursor) != 2:
+                raise ValueError("Cursor de paginación inválido")
+            fecha, ultimo_id = cursor
+            if isinstance(fecha, str):
+                fecha = datetime.fromisoformat(fecha)
+            condiciones.append("(m.fecha_movimiento, m.id) < (%s, %s)")
+            parametros.extend([fecha, int(ultimo_id)])
+
+        sql = Movimiento._sql_historial("movimientos", condiciones) + " LIMIT %s"
+        parametros = (*parametros, limite + 1)
+        if archivo_incluye(filtros.get("desde")):
+            sql = "({}) UNION ALL ({}) ORDER BY fecha DESC, id DESC LIMIT %s".format(
+                sql, Movimiento._sql_historial("movimientos_archivo", condiciones) + " LIMIT %s"
+            )
+            parametros = (*parametros, *parametros, limite + 1)
+
+        db = get_db()
+        cursor_db = db.cursor()
+        cursor_db.execute(sql, parametros)
+        filas = cursor_db.fetchall()
+
+        movimientos = [RegistroMovimiento._make(fila) for fila in filas[:limite]]
+
+        siguiente = None
+        if len(filas) > limite:
+            siguiente = [movimientos[-1].fecha, movimientos[-1].id]
+        return movimientos, siguiente
+
+    @staticmethod
+    def iterar(tamano_lote=500, **filtros):
+        """
+        Recorre el historial filtrado completo sin cargarlo en memoria.
+
+        Las filas llegan del servidor por lotes (ver db.iterar_consulta), así que
+        la memoria usada no crece con el tamaño del historial. Después de la tabla
+        caliente se recorre el archivo, que solo tiene movimientos anteriores al
+        horizonte de archivo: el orden global se mantiene sin ordenar la unión.
+
+        Yields:
+            RegistroMovimiento: Un movimiento por iteración
+        """
+        condiciones, parametros = Movimiento._condiciones_historial(**filtros)
+        filas = iterar_consulta(Movimiento._sql_historial("movimientos", condiciones), parametros,
+                                tamano_lote=tamano_lote)
+        if archivo_incluye(filtros.get("desde")):
+            filas = chain(filas, iterar_consulta(Movimiento._sql_historial("movimientos_archivo", condiciones),
+                                                 parametros, tamano_lote=tamano_lote))
+
+        return map(RegistroMovimiento._make, filas)
+
+    @staticmethod
+    def obtener_todos(**filtros):
         """
         Obtiene el historial completo de movimientos con información relacionada.
         
@@ -440,30 +884,23 @@ class Movimiento:
             - ORDER BY fecha DESC: Más reciente primero
         
         Returns:
-            list[dict]: Lista de diccionarios con datos de movimientos
-        
-        Inconsistencia: Retorna diccionarios, no objetos Movimiento
+            Iterator[RegistroMovimiento]: Movimientos con datos relacionados.
+            Se transmite desde el servidor con iterar(); para páginas acotadas
+            usar listar_pagina().
         """
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
+        return Movimiento.iterar(**filtros)
+    
+# ==============================================================================
+# SECCIÓN 6: CATEGORÍAS
+# ==============================================================================
+
+# Segundos máximos que una lista de categorías se sirve desde memoria
+CATEGORIAS_TTL = float(os.environ.get("CATEGORIAS_CACHE_TTL", 300))
 
-        cursor.execute("""
-            SELECT 
-                m.id,
-                p.nombre AS producto,
-                u.nombre AS usuario,
-                m.tipo,
-                m.fecha
-            FROM movimientos m
-            JOIN productos p ON m.producto_id = p.id
-            JOIN usuarios u ON m.usuario_id = u.id
-            ORDER BY m.fecha DESC
-        """)
 
-        return cursor.fetchall()
-    
-# En tu models.py, añade:
 class Categoria:
+    __slots__ = ("id", "nombre", "descripcion", "activa")
+
     def __init__(self, id, nombre, descripcion=None, activa=True):
         self.id = id
         self.nombre = nombre
@@ -472,32 +909,103 @@ class Categoria:
 
 
 class CategoriaDB:
+    """
+    Repository de categorías con caché en memoria del proceso.
+
+    Las categorías casi nunca cambian pero se consultan en cada formulario de
+    producto y en cada importación, así que se leen una vez y se sirven desde
+    memoria. Las entradas de la caché se guardan bajo el número de versión
+    vigente: cada escritura incrementa la versión, con lo que las entradas
+    anteriores dejan de usarse (y salen por el límite de tamaño). El TTL acota
+    cuánto tarda en verse una escritura hecha por otro proceso.
+
+    SQL Nota: La columna de la tabla es 'activo'; se expone como Categoria.activa.
+    """
+
+    _cache = CacheTTL(ttl=CATEGORIAS_TTL, max_entradas=8)
+    _version = 0
+    _lock = threading.Lock()
+
     @staticmethod
-    def obtener_todas(activas_only=True):
-        """Obtiene todas las categorías"""
+    def _consultar(activas_only):
         db = get_db()
-        cursor = db.cursor(dictionary=True)
+        cursor = db.cursor()
         
-        sql = "SELECT id, nombre, descripcion, activa FROM categorias"
+        sql = "SELECT id, nombre, descripcion, activo AS activa FROM categorias"
         if activas_only:
-            sql += " WHERE activa = 1"
+            sql += " WHERE activo = 1"
         
         sql += " ORDER BY nombre ASC"
         
         cursor.execute(sql)
-        return [Categoria(**cat) for cat in cursor.fetchall()]
+        return tuple(Categoria(*fila) for fila in cursor.fetchall())
+
+    @staticmethod
+    def obtener_todas(activas_only=True, refrescar=False):
+        """
+        Obtiene las categorías ordenadas por nombre, desde la caché si es posible.
+
+        Args:
+            activas_only (bool): Solo categorías activas
+            refrescar (bool): Ignora la caché y vuelve a leer de la base de datos
+
+        Returns:
+            list[Categoria]: Lista nueva en cada llamada (los objetos son compartidos
+            y no deben modificarse)
+        """
+        if refrescar:
+            CategoriaDB.invalidar()
+        clave = (CategoriaDB._version, activas_only)
+        return list(CategoriaDB._cache.obtener_o_calcular(
+            clave, lambda: CategoriaDB._consultar(activas_only)
+        ))
     
     @staticmethod
     def obtener_por_id(categoria_id):
-        """Obtiene una categoría por su ID"""
+        """Obtiene una categoría por su ID (desde la caché)"""
+        for categoria in CategoriaDB.obtener_todas(activas_only=False):
+            if categoria.id == categoria_id:
+                return categoria
+        return None
+
+    @staticmethod
+    def obtener_mapa_por_nombre():
+        """
+        Returns:
+            dict: {nombre en minúsculas: id} de las categorías activas, para
+            resolver nombres (p. ej. en la importación de productos)
+        """
+        return {c.nombre.strip().lower(): c.id for c in CategoriaDB.obtener_todas()}
+
+    @staticmethod
+    def crear(nombre, descripcion=None):
+        """Crea una categoría activa e invalida la caché."""
         db = get_db()
-        cursor = db.cursor(dictionary=True)
-        
+        cursor = db.cursor()
+        cursor.execute("""
+            INSERT INTO categorias (nombre, descripcion, activo)
+            VALUES (%s, %s, 1)
+        """, (nombre, descripcion))
+        db.commit()
+        CategoriaDB.invalidar()
+        return Categoria(cursor.lastrowid, nombre, descripcion)
+
+    @staticmethod
+    def cambiar_estado(categoria_id):
+        """Alterna el estado activo/inactivo de una categoría e invalida la caché."""
+        db = get_db()
+        cursor = db.cursor()
         cursor.execute("""
-            SELECT id, nombre, descripcion, activa 
-            FROM categorias 
+            UPDATE categorias
+            SET activo = IF(activo = 1, 0, 1)
             WHERE id = %s
         """, (categoria_id,))
-        
-        data = cursor.fetchone()
-        return Categoria(**data) if data else None
\ No newline at end of file
+        db.commit()
+        CategoriaDB.invalidar()
+
+    @staticmethod
+    def invalidar():
+        """Incrementa la versión: las lecturas siguientes vuelven a la base de datos."""
+        with CategoriaDB._lock:
+            CategoriaDB._version += 1
+        CategoriaDB._cache.invalidar()
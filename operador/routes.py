@@ -1,63 +1,75 @@
-from flask import Blueprint, render_template, request, redirect, session
+from datetime import date, timedelta
+
+import re
+
+from flask import (Blueprint, render_template, request, redirect, session, flash, current_app,
+                   stream_template, stream_with_context, jsonify, Response)
 from auth.seguridad import login_required
-from db import get_db
-from utils.movimientos import registrar_movimiento
+from models import Movimiento, ProductoDB, RegistroMovimiento
+from utils.estadisticas import obtener_estadisticas_dashboard
+from utils.movimientos import registrar_movimiento, registrar_movimientos_lote, LoteInvalidoError, MAX_LINEAS_LOTE
+from utils.exportacion import generar_csv
+from utils.paginacion import codificar_cursor, decodificar_cursor
 
 operador_bp = Blueprint("operador", __name__)
 
 @operador_bp.route("/operador/dashboard")
 @login_required("operador")
 def dashboard_operador():
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    # Total productos
-    cursor.execute("SELECT COUNT(*) AS total FROM productos WHERE activo = 1")
-    total_productos = cursor.fetchone()["total"]
-
-    # Productos con stock bajo
-    cursor.execute("""
-        SELECT nombre, stock, stock_minimo
-        FROM productos
-        WHERE activo = 1 AND stock <= stock_minimo
-    """)
-    stock_bajo = cursor.fetchall()
-
-    # Últimos movimientos
-    cursor.execute("""
-    SELECT 
-        m.fecha_movimiento AS fecha,
-        p.nombre AS producto,
-        u.nombre AS usuario,
-        m.tipo
-    FROM movimientos m
-    JOIN productos p ON m.producto_id = p.id
-    JOIN usuarios u ON m.usuario_id = u.id
-    ORDER BY m.fecha_movimiento DESC
-    LIMIT 5
-""")
-    ultimos_movimientos = cursor.fetchall()
+    estadisticas = obtener_estadisticas_dashboard()
 
     return render_template(
         "dashboard.html",
         rol="operador",
-        total_productos=total_productos,
-        stock_bajo=stock_bajo,
-        ultimos_movimientos=ultimos_movimientos
+        total_productos=estadisticas["total_productos"],
+        stock_bajo=estadisticas["stock_bajo"],
+        ultimos_movimientos=estadisticas["ultimos_movimientos"]
     )
 
 # -------------------------------
 # FORMULARIO MOVIMIENTO
 # -------------------------------
-@operador_bp.route("/operador/movimiento", methods=["GET", "POST"])
+# Sugerencias que devuelve el buscador de productos del formulario
+SUGERENCIAS_POR_DEFECTO = 10
+SUGERENCIAS_MAX = 20
+
+
+@operador_bp.route("/operador/api/productos/sugerencias")
 @login_required("operador")
-def movimiento():
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
+def sugerencias_productos():
+    """
+    Productos activos cuyo nombre empieza con ?q= (o cuyo id es ?q=), para el
+    selector del formulario de movimientos.
+
+    Usa la consulta del listado con prefijo (nombre LIKE 'q%' sobre el índice
+    (activo, nombre)) limitada a pocas filas: el costo no depende del tamaño
+    del catálogo.
 
-    cursor.execute("SELECT id, nombre, stock FROM productos WHERE activo = 1")
-    productos = cursor.fetchall()
+    Returns:
+        JSON: productos (id, nombre, stock) en orden alfabético
+    """
+    texto = request.args.get("q", "").strip()
+    limite = min(request.args.get("limite", SUGERENCIAS_POR_DEFECTO, type=int) or SUGERENCIAS_POR_DEFECTO,
+                 SUGERENCIAS_MAX)
+    if not texto:
+        return jsonify({"productos": []})
 
+    productos, _ = ProductoDB.listar_pagina(limite=limite, prefijo=texto)
+    if texto.isdigit() and all(p.id != int(texto) for p in productos):
+        # Los operadores suelen conocer el id (el mismo que usan en los lotes)
+        por_id = ProductoDB.obtener_por_id(int(texto))
+        if por_id is not None and por_id.activo:
+            productos = [por_id] + productos[:limite - 1]
+
+    return jsonify({"productos": [{"id": p.id, "nombre": p.nombre, "stock": p.stock} for p in productos]})
+
+
+@operador_bp.route("/operador/movimiento", methods=["GET", "POST"])
+@login_required("operador")
+def movimiento():
+    # El producto se elige con el buscador (ver sugerencias_productos); solo se
+    # carga el producto ya elegido cuando el formulario vuelve con un error
+    producto = None
     error = None
 
     if request.method == "POST":
@@ -67,40 +79,185 @@ def movimiento():
             cantidad = int(request.form["cantidad"])
             usuario_id = session["user_id"]
 
-            registrar_movimiento(producto_id, usuario_id, tipo, cantidad)
+            nuevo_stock = registrar_movimiento(producto_id, usuario_id, tipo, cantidad)
+            flash(f"✅ Movimiento registrado. Stock actual: {nuevo_stock}", "success")
             return redirect("/operador/dashboard")
 
         except Exception as e:
             error = str(e)
+            producto_id = request.form.get("producto_id", type=int)
+            if producto_id is not None:
+                producto = ProductoDB.obtener_por_id(producto_id)
 
     return render_template(
         "movimiento_form.html",
-        productos=productos,
+        producto=producto,
         error=error
     )
 
 
+# -------------------------------
+# MOVIMIENTOS POR LOTE
+# -------------------------------
+def leer_lineas_lote(texto):
+    """
+    Convierte el texto del formulario en líneas (producto_id, tipo, cantidad).
+    Acepta una línea por movimiento separada por comas, punto y coma o tabuladores
+    (p. ej. pegada desde una hoja de cálculo). Las líneas vacías se ignoran.
+    """
+    lineas = []
+    for linea in texto.splitlines():
+        if linea.strip():
+            lineas.append(tuple(campo.strip() for campo in re.split(r"[,;\t]", linea)))
+    return lineas
+
+
+@operador_bp.route("/operador/movimiento/lote", methods=["GET", "POST"])
+@login_required("operador")
+def movimiento_lote():
+    errores = []
+    texto = ""
+
+    if request.method == "POST":
+        texto = request.form.get("lineas", "")
+        try:
+            stock_final = registrar_movimientos_lote(leer_lineas_lote(texto), session["user_id"])
+            flash(f"✅ Lote registrado: {len(stock_final)} productos actualizados", "success")
+            return redirect("/operador/dashboard")
+        except LoteInvalidoError as e:
+            errores = e.errores
+        except Exception as e:
+            errores = [str(e)]
+
+    return render_template("movimiento_lote.html", errores=errores, texto=texto)
+
+
+@operador_bp.route("/operador/api/movimientos/lote", methods=["POST"])
+@login_required("operador")
+def api_movimiento_lote():
+    """
+    Registra un lote desde JSON: {"lineas": [{"producto_id", "tipo", "cantidad"}, ...]}.
+    Responde 200 con el stock final por producto o 400 con la lista de errores.
+    """
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict) or not isinstance(datos.get("lineas", []), list):
+        return jsonify({"ok": False, "errores": ['Se espera un objeto JSON con una lista "lineas"']}), 400
+    if len(datos.get("lineas", [])) > MAX_LINEAS_LOTE:
+        return jsonify({"ok": False, "errores": [f"El lote supera el máximo de {MAX_LINEAS_LOTE} líneas"]}), 400
+    lineas = [
+        (l.get("producto_id"), l.get("tipo"), l.get("cantidad")) if isinstance(l, dict) else l
+        for l in datos.get("lineas", [])
+    ]
+    try:
+        stock_final = registrar_movimientos_lote(lineas, session["user_id"])
+    except LoteInvalidoError as e:
+        return jsonify({"ok": False, "errores": e.errores}), 400
+    return jsonify({"ok": True, "stock": {str(k): v for k, v in stock_final.items()}})
+
+
 # -------------------------------
 # HISTORIAL DE MOVIMIENTOS
 # -------------------------------
+# Tamaño de página del historial y máximo aceptado por parámetro
+MOVIMIENTOS_POR_PAGINA = 50
+MOVIMIENTOS_POR_PAGINA_MAX = 500
+
+
+def leer_filtros_historial(args):
+    """
+    Lee los filtros del historial desde los parámetros de la URL.
+
+    Las fechas llegan como YYYY-MM-DD; "hasta" incluye el día completo.
+
+    Raises:
+        ValueError: Si una fecha o el tipo no son válidos
+    """
+    filtros = {}
+    if args.get("desde"):
+        filtros["desde"] = date.fromisoformat(args["desde"])
+    if args.get("hasta"):
+        filtros["hasta"] = date.fromisoformat(args["hasta"]) + timedelta(days=1)
+    producto_id = args.get("producto_id", type=int)
+    if producto_id is not None:
+        filtros["producto_id"] = producto_id
+    usuario_id = args.get("usuario_id", type=int)
+    if usuario_id is not None:
+        filtros["usuario_id"] = usuario_id
+    if args.get("tipo"):
+        if args["tipo"] not in Movimiento.TIPOS:
+            raise ValueError(f"Tipo de movimiento no válido: {args['tipo']}")
+        filtros["tipo"] = args["tipo"]
+    return filtros
+
+
 @operador_bp.route("/operador/movimientos")
 @login_required("operador")
 def movimientos_operador():
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    cursor.execute("""
-        SELECT 
-            m.fecha,
-            p.nombre AS producto,
-            u.nombre AS usuario,
-            m.tipo,
-            m.cantidad
-        FROM movimientos m
-        JOIN productos p ON m.producto_id = p.id
-        JOIN usuarios u ON m.usuario_id = u.id
-        ORDER BY m.fecha DESC
-    """)
-
-    movimientos = cursor.fetchall()
-    return render_template("movimientos.html", movimientos=movimientos)
\ No newline at end of file
+    """
+    Historial de movimientos con filtros.
+
+    Por defecto se muestra por páginas (cursor ?despues=). Con ?modo=stream se
+    transmite el historial filtrado completo mientras se lee de la base de datos,
+    sin cargarlo en memoria.
+    """
+    try:
+        filtros = leer_filtros_historial(request.args)
+    except ValueError as e:
+        flash(f"Filtro no válido: {e}", "error")
+        filtros = {}
+
+    base_args = {k: v for k, v in request.args.items() if k not in ("despues", "modo")}
+
+    if request.args.get("modo") == "stream":
+        return current_app.response_class(stream_template(
+            "movimientos.html",
+            movimientos=Movimiento.iterar(**filtros),
+            filtros=request.args,
+            streaming=True,
+            primera_args=base_args,
+            siguiente_args=None,
+            exportar_args=base_args,
+        ), mimetype="text/html")
+
+    limite = min(request.args.get("limite", MOVIMIENTOS_POR_PAGINA, type=int) or MOVIMIENTOS_POR_PAGINA,
+                 MOVIMIENTOS_POR_PAGINA_MAX)
+    try:
+        cursor = decodificar_cursor(request.args.get("despues"))
+        movimientos, siguiente = Movimiento.listar_pagina(limite=limite, cursor=cursor, **filtros)
+    except ValueError:
+        flash("El enlace de paginación no es válido, se muestra la primera página", "warning")
+        movimientos, siguiente = Movimiento.listar_pagina(limite=limite, **filtros)
+
+    siguiente_args = None
+    if siguiente is not None:
+        siguiente_args = dict(base_args, despues=codificar_cursor(siguiente))
+
+    return render_template(
+        "movimientos.html",
+        movimientos=movimientos,
+        filtros=request.args,
+        streaming=False,
+        primera_args=base_args if "despues" in request.args else None,
+        siguiente_args=siguiente_args,
+        exportar_args=base_args,
+    )
+
+
+# -------------------------------
+# EXPORTAR HISTORIAL A CSV
+# -------------------------------
+@operador_bp.route("/operador/movimientos/export.csv")
+@login_required("operador")
+def exportar_movimientos():
+    """Exporta el historial con los mismos filtros de /operador/movimientos, transmitido por bloques."""
+    try:
+        filtros = leer_filtros_historial(request.args)
+    except ValueError as e:
+        return f"Filtro no válido: {e}", 400
+
+    # Cada RegistroMovimiento ya es una tupla en el orden de sus campos
+    return Response(
+        stream_with_context(generar_csv(RegistroMovimiento._fields, Movimiento.iterar(**filtros))),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=movimientos.csv"},
+    )
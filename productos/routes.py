@@ -1,8 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, session, flash
+from flask import Blueprint, render_template, request, redirect, session, flash, Response, stream_with_context
 from auth.seguridad import login_required
-from models import ProductoDB, Producto, Movimiento
-from db import get_db  # ¡IMPORTANTE!
-from datetime import datetime
+from models import ProductoDB, Producto, Movimiento, CategoriaDB
+from datetime import date, datetime
+import hashlib
+import io
+import json
+import os
+
+from utils.cache import CacheTTL
+from utils.catalogo import version_catalogo
+from utils.exportacion import generar_csv
+from utils.importacion import importar_productos_csv, COLUMNAS_IMPORTACION
+from utils.movimientos import guardar_edicion, StockModificadoError
+from utils.paginacion import codificar_cursor, decodificar_cursor
+from utils.stock_diario import serie_stock
 
 productos_bp = Blueprint("productos", __name__, url_prefix="/productos")
 
@@ -10,27 +21,314 @@ productos_bp = Blueprint("productos", __name__, url_prefix="/productos")
 # FUNCIÓN AUXILIAR: OBTENER CATEGORÍAS
 # -------------------------------
 def obtener_categorias():
-    """Obtiene todas las categorías activas de la base de datos"""
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-    
-    cursor.execute("""
-        SELECT id, nombre, descripcion 
-        FROM categorias 
-        WHERE activo = 1 
-        ORDER BY nombre ASC
-    """)
-    
-    return cursor.fetchall()
+    """Obtiene todas las categorías activas (servidas desde la caché de CategoriaDB)"""
+    return CategoriaDB.obtener_todas()
 
 # -------------------------------
 # LISTAR PRODUCTOS
 # -------------------------------
+# Tamaño de página del listado y máximo aceptado por parámetro
+PRODUCTOS_POR_PAGINA = 50
+PRODUCTOS_POR_PAGINA_MAX = 200
+
+
+def leer_filtros_listado(args):
+    """Lee los filtros del listado de productos desde los parámetros de la URL."""
+    categoria_id = args.get("categoria_id", type=int)
+    prefijo = args.get("q", "").strip() or None
+    return {
+        "categoria_id": categoria_id,
+        "solo_stock_bajo": args.get("stock_bajo") == "1",
+        "prefijo": prefijo,
+    }
+
+
 @productos_bp.route("/")
 @login_required()
 def listar_productos():
-    productos = ProductoDB.obtener_todos()
-    return render_template("productos.html", productos=productos)
+    filtros = leer_filtros_listado(request.args)
+    orden = request.args.get("orden", "nombre")
+    if orden not in ProductoDB.ORDENES_LISTADO:
+        orden = "nombre"
+    limite = min(request.args.get("limite", PRODUCTOS_POR_PAGINA, type=int) or PRODUCTOS_POR_PAGINA,
+                 PRODUCTOS_POR_PAGINA_MAX)
+
+    try:
+        cursor = decodificar_cursor(request.args.get("despues"))
+        productos, siguiente = ProductoDB.listar_pagina(
+            limite=limite, cursor=cursor, orden=orden, **filtros
+        )
+    except ValueError:
+        flash("El enlace de paginación no es válido, se muestra la primera página", "warning")
+        productos, siguiente = ProductoDB.listar_pagina(limite=limite, orden=orden, **filtros)
+
+    # Parámetros de las URLs de navegación (mismos filtros, otro cursor)
+    base_args = {k: v for k, v in request.args.items() if k != "despues"}
+    primera_args = base_args if "despues" in request.args else None
+    siguiente_args = None
+    if siguiente is not None:
+        siguiente_args = dict(base_args, despues=codificar_cursor(siguiente))
+
+    return render_template(
+        "productos.html",
+        productos=productos,
+        categorias=obtener_categorias(),
+        filtros=filtros,
+        orden=orden,
+        primera_args=primera_args,
+        siguiente_args=siguiente_args,
+        exportar_args=base_args,
+    )
+
+# -------------------------------
+# EXPORTAR PRODUCTOS A CSV
+# -------------------------------
+@productos_bp.route("/export.csv")
+@login_required()
+def exportar_productos():
+    """
+    Exporta el catálogo con los mismos filtros del listado.
+
+    Las filas se transmiten desde la base de datos a medida que se escriben: la
+    respuesta empieza de inmediato y la memoria no crece con el catálogo. Las
+    columnas coinciden con las de la importación.
+    """
+    filtros = leer_filtros_listado(request.args)
+    orden = request.args.get("orden", "nombre")
+    if orden not in ProductoDB.ORDENES_LISTADO:
+        orden = "nombre"
+
+    encabezados = ("id",) + COLUMNAS_IMPORTACION
+    filas = ProductoDB.iterar(orden=orden, **filtros)
+    return Response(
+        stream_with_context(generar_csv(encabezados, filas)),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment; filename=productos.csv"},
+    )
+
+# -------------------------------
+# API JSON DEL CATÁLOGO (ETag / GET CONDICIONAL)
+# -------------------------------
+# El ETag se deriva de la versión del catálogo (utils/catalogo.py) y de la URL
+# pedida, así que se conoce antes de consultar nada: un cliente al día recibe
+# 304 sin tocar la base de datos. Los cuerpos ya serializados se guardan por
+# ETag, de modo que varios clientes que piden lo mismo comparten una consulta.
+# La versión se lee antes que los datos: en el peor caso un cuerpo nuevo queda
+# con el ETag anterior y el cliente lo vuelve a pedir en su siguiente consulta.
+API_RESPUESTAS_TTL = float(os.environ.get("API_CACHE_TTL", 600))
+
+_respuestas_api = CacheTTL(ttl=API_RESPUESTAS_TTL, max_entradas=256)
+
+
+def producto_a_json(producto):
+    """Campos de un producto que expone la API."""
+    return {
+        "id": producto.id,
+        "nombre": producto.nombre,
+        "categoria_id": producto.categoria_id,
+        "stock": producto.stock,
+        "stock_minimo": producto.stock_minimo,
+        "precio": float(producto.precio) if producto.precio is not None else None,
+    }
+
+
+def responder_json_condicional(construir):
+    """
+    Responde `construir()` como JSON con ETag, o 304 si el cliente ya lo tiene.
+
+    Args:
+        construir (callable): Devuelve el objeto a serializar, o None para 404.
+            Solo se llama si la respuesta no está en caché.
+    """
+    version = version_catalogo()
+    etag = "v{}-{}".format(version, hashlib.sha1(request.full_path.encode("utf-8")).hexdigest()[:16])
+
+    if request.if_none_match.contains(etag):
+        respuesta = Response(status=304)
+    else:
+        def serializar():
+            datos = construir()
+            if datos is None:
+                return None
+            return json.dumps(datos, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+        cuerpo = _respuestas_api.obtener_o_calcular(etag, serializar)
+        if cuerpo is None:
+            respuesta = Response(b'{"error":"Producto no encontrado"}', status=404, mimetype="application/json")
+        else:
+            respuesta = Response(cuerpo, mimetype="application/json")
+
+    respuesta.set_etag(etag)
+    # El cliente puede guardar la respuesta pero debe revalidarla en cada uso
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta
+
+
+def _pagina_api(solo_stock_bajo=False):
+    filtros = leer_filtros_listado(request.args)
+    if solo_stock_bajo:
+        filtros["solo_stock_bajo"] = True
+    orden = request.args.get("orden", "nombre")
+    if orden not in ProductoDB.ORDENES_LISTADO:
+        orden = "nombre"
+    limite = min(request.args.get("limite", PRODUCTOS_POR_PAGINA, type=int) or PRODUCTOS_POR_PAGINA,
+                 PRODUCTOS_POR_PAGINA_MAX)
+    try:
+        cursor = decodificar_cursor(request.args.get("despues"))
+    except ValueError:
+        return {"error": "Cursor de paginación inválido"}, 400
+
+    def construir():
+        productos, siguiente = ProductoDB.listar_pagina(
+            limite=limite, cursor=cursor, orden=orden, **filtros
+        )
+        return {
+            "productos": [producto_a_json(p) for p in productos],
+            "siguiente": codificar_cursor(siguiente) if siguiente is not None else None,
+        }
+
+    return responder_json_condicional(construir)
+
+
+@productos_bp.route("/api")
+@login_required()
+def api_listar_productos():
+    """
+    Página de productos activos en JSON (mismos filtros que el listado).
+
+    Parámetros: q, categoria_id, stock_bajo=1, orden, limite y despues (el valor
+    de "siguiente" de la respuesta anterior).
+    """
+    return _pagina_api()
+
+
+@productos_bp.route("/api/stock-bajo")
+@login_required()
+def api_stock_bajo():
+    """Productos activos con stock menor o igual al mínimo, paginados como /api."""
+    return _pagina_api(solo_stock_bajo=True)
+
+
+# Resultados por página de la búsqueda y páginas máximas que se sirven
+BUSQUEDA_POR_PAGINA = 20
+BUSQUEDA_PAGINAS_MAX = 50
+
+
+@productos_bp.route("/api/buscar")
+@login_required()
+def api_buscar_productos():
+    """
+    Búsqueda de productos activos por nombre y descripción, por relevancia.
+
+    Parámetros: q (texto), categoria_id, limite y pagina (desde 1). Comparte la
+    caché por versión del catálogo de /api: una búsqueda repetida sin cambios
+    en el catálogo no consulta la base de datos.
+
+    Returns:
+        JSON: resultados (producto y relevancia), pagina y si hay siguiente
+    """
+    texto = request.args.get("q", "").strip()
+    categoria_id = request.args.get("categoria_id", type=int)
+    limite = min(request.args.get("limite", BUSQUEDA_POR_PAGINA, type=int) or BUSQUEDA_POR_PAGINA,
+                 PRODUCTOS_POR_PAGINA_MAX)
+    pagina = request.args.get("pagina", 1, type=int) or 1
+    if not 1 <= pagina <= BUSQUEDA_PAGINAS_MAX:
+        return {"error": f"La página debe estar entre 1 y {BUSQUEDA_PAGINAS_MAX}"}, 400
+
+    def construir():
+        resultados, hay_siguiente = ProductoDB.buscar(texto, limite=limite, pagina=pagina,
+                                                      categoria_id=categoria_id)
+        return {
+            "resultados": [dict(producto_a_json(p), relevancia=round(r, 4)) for p, r in resultados],
+            "pagina": pagina,
+            "siguiente": pagina + 1 if hay_siguiente and pagina < BUSQUEDA_PAGINAS_MAX else None,
+        }
+
+    return responder_json_condicional(construir)
+
+
+@productos_bp.route("/api/<int:producto_id>")
+@login_required()
+def api_obtener_producto(producto_id):
+    """Un producto activo en JSON, con descripción e imagen."""
+    def construir():
+        producto = ProductoDB.obtener_por_id(producto_id)
+        if producto is None or not producto.activo:
+            return None
+        return dict(producto_a_json(producto), descripcion=producto.descripcion, imagen=producto.imagen)
+
+    return responder_json_condicional(construir)
+
+# -------------------------------
+# API: SINCRONIZACIÓN INCREMENTAL
+# -------------------------------
+CAMBIOS_POR_PAGINA = 500
+CAMBIOS_POR_PAGINA_MAX = 2000
+
+
+@productos_bp.route("/api/cambios")
+@login_required()
+def api_cambios_productos():
+    """
+    Productos creados, modificados o eliminados desde el cursor `desde`.
+
+    Uso del cliente: primera llamada sin `desde` (catálogo completo); luego
+    guardar "siguiente" y repetir con ?desde=<siguiente> mientras "completo" sea
+    false. En cada sincronización posterior solo viajan las filas que cambiaron.
+
+    Returns:
+        JSON: cambios (productos activos a insertar o actualizar), eliminados
+        (ids a borrar), siguiente (cursor a guardar) y completo (bool)
+    """
+    limite = min(request.args.get("limite", CAMBIOS_POR_PAGINA, type=int) or CAMBIOS_POR_PAGINA,
+                 CAMBIOS_POR_PAGINA_MAX)
+    desde = request.args.get("desde")
+    try:
+        cambios, siguiente = ProductoDB.cambios_desde(cursor=decodificar_cursor(desde), limite=limite)
+    except ValueError:
+        return {"error": "Cursor de sincronización inválido"}, 400
+
+    return {
+        "cambios": [producto_a_json(c) for c in cambios if c.activo],
+        "eliminados": [c.id for c in cambios if not c.activo],
+        "siguiente": codificar_cursor(siguiente) if siguiente is not None else desde,
+        "completo": len(cambios) < limite,
+    }
+
+
+@productos_bp.route("/api/<int:producto_id>/stock")
+@login_required()
+def api_stock_historico(producto_id):
+    """
+    Stock de un producto en una fecha (?fecha=YYYY-MM-DD) o por día en un rango
+    (?desde=YYYY-MM-DD&hasta=YYYY-MM-DD), desde las instantáneas diarias.
+
+    Returns:
+        JSON: producto_id y serie (fecha, stock y valor al cierre de cada día)
+    """
+    try:
+        if request.args.get("fecha"):
+            desde = hasta = date.fromisoformat(request.args["fecha"])
+        else:
+            desde = date.fromisoformat(request.args["desde"])
+            hasta = date.fromisoformat(request.args.get("hasta") or date.today().isoformat())
+        serie = serie_stock(producto_id, desde, hasta)
+    except KeyError:
+        return {"error": "Indicar fecha, o desde y hasta"}, 400
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    return {
+        "producto_id": producto_id,
+        "serie": [
+            {
+                "fecha": dia["fecha"].isoformat(),
+                "stock": dia["stock"],
+                "valor": float(dia["valor"]) if dia["valor"] is not None else None,
+            }
+            for dia in serie
+        ],
+    }
 
 # -------------------------------
 # CREAR PRODUCTO (CON CATEGORÍAS)
@@ -87,7 +385,8 @@ def crear_producto():
                     producto_id=producto.id, 
                     usuario_id=usuario_id, 
                     tipo="entrada", 
-                    fecha=datetime.now()
+                    fecha=datetime.now(),
+                    cantidad=stock
                 )
                 mov.registrar()
             
@@ -109,6 +408,35 @@ def crear_producto():
         categorias=categorias
     )
 
+# -------------------------------
+# IMPORTAR PRODUCTOS DESDE CSV
+# -------------------------------
+@productos_bp.route("/importar", methods=["GET", "POST"])
+@login_required()
+def importar_productos():
+    resultado = None
+
+    if request.method == "POST":
+        archivo = request.files.get("archivo")
+        if not archivo or not archivo.filename:
+            flash("Selecciona un archivo CSV", "error")
+            return redirect("/productos/importar")
+
+        # Se lee directamente del stream del archivo subido, sin cargarlo entero
+        texto = io.TextIOWrapper(archivo.stream, encoding="utf-8-sig", errors="replace", newline="")
+        resultado = importar_productos_csv(texto, usuario_id=session.get("user_id"))
+
+        if resultado["importados"]:
+            flash(f"✅ {resultado['importados']} productos importados", "success")
+        if resultado["total_errores"]:
+            flash(f"{resultado['total_errores']} filas no se importaron", "warning")
+
+    return render_template(
+        "productos_importar.html",
+        resultado=resultado,
+        columnas=COLUMNAS_IMPORTACION
+    )
+
 # -------------------------------
 # EDITAR PRODUCTO (CON CATEGORÍAS)
 # -------------------------------
@@ -122,6 +450,10 @@ def editar_producto(producto_id):
     
     if request.method == "POST":
         try:
+            # Stock que mostraba el formulario (campo oculto), para detectar
+            # movimientos registrados mientras se editaba
+            stock_visto = request.form.get("stock_original", producto.stock, type=int)
+
             # Validar datos del formulario
             producto.nombre = request.form["nombre"].strip()
             producto.descripcion = request.form.get("descripcion", "").strip()
@@ -153,23 +485,17 @@ def editar_producto(producto_id):
                 flash("El precio no puede ser negativo", "error")
                 return redirect(f"/productos/editar/{producto_id}")
             
-            # Guardar cambios
-            producto.actualizar()
-            
-            # Registrar movimiento automático
-            usuario_id = session.get("user_id")
-            if usuario_id:
-                mov = Movimiento(
-                    producto_id=producto.id, 
-                    usuario_id=usuario_id, 
-                    tipo="entrada", 
-                    fecha=datetime.now()
-                )
-                mov.registrar()
+            # Datos y stock en una transacción; la diferencia de stock se
+            # registra como entrada o salida
+            guardar_edicion(producto, session["user_id"], stock_visto)
             
             flash(f"✅ Producto '{producto.nombre}' actualizado exitosamente", "success")
             return redirect("/productos/")
             
+        except StockModificadoError as e:
+            flash(f"No se guardaron los cambios: el stock cambió mientras editabas (ahora es {e.stock_actual}). "
+                  "Revisa el conteo y vuelve a guardar", "warning")
+            return redirect(f"/productos/editar/{producto_id}")
         except ValueError as e:
             flash(f"Error en los datos: {str(e)}", "error")
             return redirect(f"/productos/editar/{producto_id}")
@@ -197,17 +523,7 @@ def eliminar_producto(producto_id):
         return redirect("/productos/")
     
     try:
-        # Verificar si el producto tiene movimientos asociados
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM movimientos 
-            WHERE producto_id = %s
-        """, (producto_id,))
-        
-        movimientos_count = cursor.fetchone()["count"]
-        
-        # Eliminar producto
+        # Eliminar producto (lógico: el historial de movimientos se conserva)
         producto.eliminar()
         
         # Registrar movimiento de eliminación
@@ -0,0 +1,217 @@
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from db import get_db
+from utils.estadisticas import invalidar_estadisticas
+
+# ==============================================================================
+# ARCHIVO DEL HISTORIAL DE MOVIMIENTOS
+# ==============================================================================
+# Los movimientos anteriores al horizonte (ARCHIVO_DIAS) se mueven por lotes de
+# movimientos a movimientos_archivo, y sus cantidades se acumulan por producto
+# y día en movimientos_resumen_diario (ver migraciones/006). Así la tabla
+# caliente, que se escribe en cada movimiento y leen los dashboards, conserva
+# solo los últimos meses y cabe en el buffer pool.
+#
+# Cada lote es una transacción (copiar, resumir, borrar): si el proceso se
+# interrumpe, un movimiento está en una tabla o en la otra, nunca en ambas.
+# Se ejecuta desde cron con `flask --app wsgi archivar-movimientos`.
+
+_COLUMNAS = "id, producto_id, usuario_id, tipo, cantidad, proveedor_id, fecha_movimiento"
+
+
+def _archivar_lote(db, ids):
+    marcas = ", ".join(["%s"] * len(ids))
+    cursor = db.cursor()
+    try:
+        cursor.execute(f"""
+            INSERT INTO movimientos_archivo ({_COLUMNAS})
+            SELECT {_COLUMNAS} FROM movimientos WHERE id IN ({marcas})
+        """, ids)
+        cursor.execute(f"""
+            INSERT INTO movimientos_resumen_diario (producto_id, dia, entradas, salidas, movimientos)
+            SELECT * FROM (
+                SELECT producto_id,
+                       DATE(fecha_movimiento) AS dia_lote,
+                       SUM(IF(tipo = 'entrada', cantidad, 0)) AS entradas_lote,
+                       SUM(IF(tipo = 'salida', cantidad, 0)) AS salidas_lote,
+                       COUNT(*) AS movimientos_lote
+                FROM movimientos
+                WHERE id IN ({marcas})
+                GROUP BY producto_id, DATE(fecha_movimiento)
+            ) AS lote
+            ON DUPLICATE KEY UPDATE
+                entradas = entradas + entradas_lote,
+                salidas = salidas + salidas_lote,
+                movimientos = movimientos + movimientos_lote
+        """, ids)
+        cursor.execute(f"DELETE FROM movimientos WHERE id IN ({marcas})", ids)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def archivar_movimientos(dias, tamano_lote=5000, pausa=0.0):
+    """
+    Mueve al archivo los movimientos anteriores a hace `dias` días.
+
+    El horizonte es la medianoche de ese día, así que cada día queda entero en
+    una de las dos tablas. Los lotes se toman en orden de fecha con el índice
+    idx_movimientos_fecha; entre lote y lote se espera `pausa` segundos para
+    no competir con el tráfico de la aplicación.
+
+    Args:
+        dias (int): Días de historial que permanecen en la tabla caliente
+        tamano_lote (int): Movimientos por transacción
+        pausa (float): Segundos de espera entre lotes
+
+    Returns:
+        int: Movimientos archivados
+    """
+    if dias < 1:
+        raise ValueError("El horizonte de archivo debe ser de al menos un día")
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute("SELECT CURDATE() - INTERVAL %s DAY", (dias,))
+    horizonte = cursor.fetchone()[0]
+
+    total = 0
+    while True:
+        cursor.execute("""
+            SELECT id FROM movimientos
+            WHERE fecha_movimiento < %s
+            ORDER BY fecha_movimiento, id
+            LIMIT %s
+        """, (horizonte, tamano_lote))
+        ids = [fila[0] for fila in cursor.fetchall()]
+        if not ids:
+            break
+        _archivar_lote(db, ids)
+        total += len(ids)
+        if len(ids) < tamano_lote:
+            break
+        if pausa:
+            time.sleep(pausa)
+    cursor.close()
+
+    if total:
+        invalidar_estadisticas()
+    return total
+
+
+def archivo_incluye(desde=None):
+    """
+    Indica si el archivo puede tener movimientos a partir de `desde`.
+
+    Permite al historial omitir movimientos_archivo cuando está vacío o cuando
+    el filtro empieza después del último movimiento archivado (MAX sobre el
+    índice de fecha: no recorre la tabla).
+
+    Args:
+        desde (date or datetime or None): Inicio del rango consultado
+
+    Returns:
+        bool: False si el archivo no puede aportar filas al rango
+    """
+    cursor = get_db().cursor()
+    cursor.execute("SELECT MAX(fecha_movimiento) FROM movimientos_archivo")
+    ultima = cursor.fetchone()[0]
+    cursor.close()
+    if ultima is None:
+        return False
+    if desde is None:
+        return True
+    if not isinstance(desde, datetime):
+        desde = datetime.combine(desde, datetime.min.time())
+    return desde <= ultima
+
+
+def totales_movimientos(producto_ids=None, desde=None, hasta=None):
+    """
+    Entradas y salidas acumuladas por producto, sumando archivo y tabla caliente.
+
+    Los movimientos archivados se leen de movimientos_resumen_diario (una fila
+    por producto y día) en lugar de recorrer movimientos_archivo.
+
+    Args:
+        producto_ids (list[int] or None): Productos a consultar (None = todos)
+        desde (date or None): Primer día incluido
+        hasta (date or None): Primer día excluido
+
+    Returns:
+        dict[int, tuple[int, int]]: producto_id -> (entradas, salidas)
+    """
+    for limite in (desde, hasta):
+        if isinstance(limite, datetime):
+            raise ValueError("Los totales se calculan por días completos: usar date")
+
+    condiciones_resumen, condiciones_calientes, parametros_resumen, parametros_calientes = [], [], [], []
+    if producto_ids is not None:
+        if not producto_ids:
+            return {}
+        marcas = ", ".join(["%s"] * len(producto_ids))
+        condiciones_resumen.append(f"producto_id IN ({marcas})")
+        condiciones_calientes.append(f"producto_id IN ({marcas})")
+        parametros_resumen.extend(producto_ids)
+        parametros_calientes.extend(producto_ids)
+    if desde is not None:
+        condiciones_resumen.append("dia >= %s")
+        condiciones_calientes.append("fecha_movimiento >= %s")
+        parametros_resumen.append(desde)
+        parametros_calientes.append(desde)
+    if hasta is not None:
+        condiciones_resumen.append("dia < %s")
+        condiciones_calientes.append("fecha_movimiento < %s")
+        parametros_resumen.append(hasta)
+        parametros_calientes.append(hasta)
+
+    def donde(condiciones):
+        return " WHERE " + " AND ".join(condiciones) if condiciones else ""
+
+    cursor = get_db().cursor()
+    cursor.execute(f"""
+        SELECT producto_id, SUM(entradas), SUM(salidas)
+        FROM (
+            SELECT producto_id, entradas, salidas
+            FROM movimientos_resumen_diario{donde(condiciones_resumen)}
+            UNION ALL
+            SELECT producto_id,
+                   SUM(IF(tipo = 'entrada', cantidad, 0)),
+                   SUM(IF(tipo = 'salida', cantidad, 0))
+            FROM movimientos{donde(condiciones_calientes)}
+            GROUP BY producto_id
+        ) AS t
+        GROUP BY producto_id
+    """, (*parametros_resumen, *parametros_calientes))
+    totales = {producto_id: (int(entradas), int(salidas)) for producto_id, entradas, salidas in cursor.fetchall()}
+    cursor.close()
+    return totales
+
+
+@click.command("archivar-movimientos")
+@click.option("--dias", type=int, default=None, help="Días que permanecen en la tabla caliente (ARCHIVO_DIAS)")
+@click.option("--lote", type=int, default=None, help="Movimientos por transacción (ARCHIVO_LOTE)")
+@click.option("--pausa", type=float, default=None, help="Segundos entre lotes (ARCHIVO_PAUSA)")
+@with_appcontext
+def _comando_archivar(dias, lote, pausa):
+    """Mueve los movimientos antiguos a movimientos_archivo."""
+    config = current_app.config
+    inicio = time.perf_counter()
+    total = archivar_movimientos(
+        dias if dias is not None else config["ARCHIVO_DIAS"],
+        lote if lote is not None else config["ARCHIVO_LOTE"],
+        pausa if pausa is not None else config["ARCHIVO_PAUSA"],
+    )
+    click.echo(f"{total} movimientos archivados en {time.perf_counter() - inicio:.1f} s")
+
+
+def init_app(app):
+    """Registra el comando `flask archivar-movimientos`."""
+    app.cli.add_command(_comando_archivar)
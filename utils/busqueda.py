@@ -0,0 +1,27 @@
+import re
+
+# Largo mínimo de un término (igual a innodb_ft_min_token_size, ver migraciones/008)
+BUSQUEDA_MIN_CARACTERES = 3
+# Términos máximos que se envían a MATCH ... AGAINST
+BUSQUEDA_MAX_TERMINOS = 8
+
+_TERMINOS = re.compile(r"\w+", re.UNICODE)
+
+
+def consulta_fulltext(texto):
+    """
+    Convierte el texto del usuario en una consulta FULLTEXT en modo booleano.
+
+    Cada término pasa a ser obligatorio y por prefijo ("sens hum" ->
+    "+sens* +hum*"), de modo que la búsqueda funciona mientras se escribe. Se
+    descartan los operadores del modo booleano que escriba el usuario y los
+    términos más cortos que BUSQUEDA_MIN_CARACTERES, que el índice no contiene.
+
+    Returns:
+        str or None: Consulta para AGAINST (... IN BOOLEAN MODE), o None si no
+        queda ningún término buscable
+    """
+    terminos = [t for t in _TERMINOS.findall(texto or "") if len(t) >= BUSQUEDA_MIN_CARACTERES]
+    if not terminos:
+        return None
+    return " ".join(f"+{t}*" for t in terminos[:BUSQUEDA_MAX_TERMINOS])
@@ -0,0 +1,304 @@
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Backend para las cachés creadas con crear_cache(): "memoria" (por proceso) o
+# "sqlite" (archivo local compartido por todos los workers de la máquina)
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memoria")
+CACHE_SQLITE_RUTA = os.environ.get(
+    "CACHE_SQLITE_RUTA", os.path.join(tempfile.gettempdir(), "inventario_cache.sqlite3")
+)
+
+
+class _CacheBase:
+    """
+    Lógica común a los backends: obtener_o_calcular() con un solo cálculo por
+    clave a la vez dentro del proceso.
+
+    Cada backend implementa obtener(), guardar(), invalidar(), estadisticas() y
+    _generacion_actual().
+    """
+
+    def __init__(self):
+        self._lock_calculo = threading.Lock()
+        self._calculando = {}
+
+    def obtener_o_calcular(self, clave, funcion):
+        """
+        Devuelve el valor de la clave, calculándolo con `funcion()` si hace falta.
+
+        Solo un hilo calcula cada clave; los demás esperan su resultado en lugar
+        de repetir la consulta.
+        """
+        valor = self.obtener(clave, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+
+        with self._lock_calculo:
+            lock_clave = self._calculando.setdefault(clave, threading.Lock())
+        with lock_clave:
+            valor = self.obtener(clave, _AUSENTE)
+            if valor is not _AUSENTE:
+                return valor
+            generacion = self._generacion_actual()
+            valor = funcion()
+            self.guardar(clave, valor, generacion)
+        with self._lock_calculo:
+            if self._calculando.get(clave) is lock_clave and not lock_clave.locked():
+                del self._calculando[clave]
+        return valor
+
+
+class CacheTTL(_CacheBase):
+    """
+    Caché en memoria del proceso con expiración (TTL) y tamaño máximo.
+
+    - Las entradas expiran `ttl` segundos después de calcularse
+    - Al superar `max_entradas` se descarta la usada hace más tiempo (LRU)
+    - obtener_o_calcular() evita que varios hilos recalculen la misma clave a la vez
+    - invalidar() descarta entradas y los cálculos que estaban en curso, para que
+      un resultado obtenido antes de una escritura no se guarde después de ella
+    """
+
+    def __init__(self, ttl, max_entradas=128):
+        super().__init__()
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._generacion = 0
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, defecto=None):
+        """Devuelve el valor vigente de la clave o `defecto` si no existe o expiró."""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira = entrada
+                if expira > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+            self.fallos += 1
+            return defecto
+
+    def guardar(self, clave, valor, generacion=None):
+        """
+        Guarda un valor. Si se indica `generacion` y hubo una invalidación desde
+        entonces, el valor se descarta por estar potencialmente desactualizado.
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def _generacion_actual(self):
+        with self._lock:
+            return self._generacion
+
+    def invalidar(self, clave=None):
+        """Descarta una clave, o todas si no se indica ninguna."""
+        with self._lock:
+            self._generacion += 1
+            if clave is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "backend": "memoria",
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+            }
+
+
+class CacheSQLite(_CacheBase):
+    """
+    Caché con expiración y tamaño máximo guardada en un archivo SQLite local.
+
+    Todos los workers de la máquina comparten el mismo archivo, así que una
+    invalidación hecha en un proceso la ven los demás de inmediato. Cada caché
+    ocupa su propio `espacio` dentro del archivo. Los valores se guardan con
+    pickle y las claves como JSON, por lo que deben ser tipos simples.
+
+    - La expiración usa la hora del sistema (compartida entre procesos)
+    - Al superar `max_entradas` se descartan las usadas hace más tiempo. La
+      hora de uso es aproximada: un acierto solo la escribe si tiene más de
+      FRACCION_USO del TTL, así que la mayoría de las lecturas no escriben
+    - La generación de cada espacio también se guarda en el archivo, para que un
+      cálculo empezado antes de una invalidación en otro proceso no se guarde
+    """
+
+    # Fracción del TTL a partir de la cual un acierto actualiza la hora de uso
+    FRACCION_USO = 0.25
+
+    def __init__(self, espacio, ttl, max_entradas=128, ruta=CACHE_SQLITE_RUTA):
+        super().__init__()
+        self.espacio = espacio
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.ruta = ruta
+        self._local = threading.local()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso (no se comparten tras un fork)
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    espacio TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor BLOB NOT NULL,
+                    expira REAL NOT NULL,
+                    usado REAL NOT NULL,
+                    PRIMARY KEY (espacio, clave)
+                )
+            """)
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_cache_usado ON cache (espacio, usado)")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS generaciones (
+                    espacio TEXT PRIMARY KEY,
+                    valor INTEGER NOT NULL
+                )
+            """)
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    @staticmethod
+    def _clave(clave):
+        return json.dumps(clave, default=str)
+
+    def obtener(self, clave, defecto=None):
+        """Devuelve el valor vigente de la clave o `defecto` si no existe o expiró."""
+        conexion = self._conexion()
+        ahora = time.time()
+        fila = conexion.execute(
+            "SELECT valor, expira, usado FROM cache WHERE espacio = ? AND clave = ?",
+            (self.espacio, self._clave(clave)),
+        ).fetchone()
+        if fila is not None and fila[1] > ahora:
+            if ahora - fila[2] > self.ttl * self.FRACCION_USO:
+                conexion.execute(
+                    "UPDATE cache SET usado = ? WHERE espacio = ? AND clave = ?",
+                    (ahora, self.espacio, self._clave(clave)),
+                )
+            self.aciertos += 1
+            return pickle.loads(fila[0])
+        self.fallos += 1
+        return defecto
+
+    def guardar(self, clave, valor, generacion=None):
+        """
+        Guarda un valor. Si se indica `generacion` y hubo una invalidación desde
+        entonces (en cualquier proceso), el valor se descarta.
+        """
+        conexion = self._conexion()
+        ahora = time.time()
+        datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if generacion is not None and generacion != self._leer_generacion(conexion):
+                conexion.execute("ROLLBACK")
+                return
+            conexion.execute(
+                "INSERT OR REPLACE INTO cache (espacio, clave, valor, expira, usado) VALUES (?, ?, ?, ?, ?)",
+                (self.espacio, self._clave(clave), datos, ahora + self.ttl, ahora),
+            )
+            conexion.execute("""
+                DELETE FROM cache WHERE espacio = ? AND clave IN (
+                    SELECT clave FROM cache WHERE espacio = ?
+                    ORDER BY usado DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.espacio, self.espacio, self.max_entradas))
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def _leer_generacion(self, conexion):
+        fila = conexion.execute(
+            "SELECT valor FROM generaciones WHERE espacio = ?", (self.espacio,)
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def _generacion_actual(self):
+        return self._leer_generacion(self._conexion())
+
+    def invalidar(self, clave=None):
+        """Descarta una clave, o todas las del espacio si no se indica ninguna."""
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute("""
+                INSERT INTO generaciones (espacio, valor) VALUES (?, 1)
+                ON CONFLICT (espacio) DO UPDATE SET valor = valor + 1
+            """, (self.espacio,))
+            if clave is None:
+                conexion.execute("DELETE FROM cache WHERE espacio = ?", (self.espacio,))
+            else:
+                conexion.execute(
+                    "DELETE FROM cache WHERE espacio = ? AND clave = ?",
+                    (self.espacio, self._clave(clave)),
+                )
+            conexion.execute("COMMIT")
+        except Exception:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def estadisticas(self):
+        (entradas,) = self._conexion().execute(
+            "SELECT COUNT(*) FROM cache WHERE espacio = ?", (self.espacio,)
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "entradas": entradas,
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
+
+
+def crear_cache(espacio, ttl, max_entradas=128, backend=None):
+    """
+    Crea una caché con el backend configurado en CACHE_BACKEND.
+
+    Args:
+        espacio (str): Nombre de la caché (separa sus claves en el backend compartido)
+        ttl (float): Segundos de vida de cada entrada
+        max_entradas (int): Entradas máximas antes de descartar las menos usadas
+        backend (str or None): "memoria" o "sqlite"; por defecto CACHE_BACKEND
+
+    Returns:
+        CacheTTL or CacheSQLite
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "sqlite":
+        return CacheSQLite(espacio, ttl, max_entradas)
+    if backend == "memoria":
+        return CacheTTL(ttl, max_entradas)
+    raise ValueError(f"Backend de caché desconocido: {backend}")
+
+
+_AUSENTE = object()
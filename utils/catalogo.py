@@ -0,0 +1,65 @@
+import os
+
+from db import get_db
+from utils.cache import CacheTTL
+
+# Segundos que este proceso confía en la versión del catálogo que leyó. Las
+# escrituras de este proceso la descartan al instante; el TTL acota cuánto
+# tarda en verse una escritura hecha por otro worker. Cada worker vuelve a leer
+# la versión de la base (una consulta sobre el índice) a lo sumo una vez por
+# TTL; las peticiones condicionales dentro de ese plazo no consultan la base.
+CATALOGO_VERSION_TTL = float(os.environ.get("CATALOGO_VERSION_TTL", 2))
+# Segundos antes del último cambio que también se resumen en la versión (ver
+# _leer_version); debe cubrir lo que dura la transacción de escritura más larga
+CATALOGO_VENTANA = float(os.environ.get("CATALOGO_VENTANA", 5))
+
+_cache = CacheTTL(ttl=CATALOGO_VERSION_TTL, max_entradas=1)
+
+
+def _leer_version():
+    """
+    La versión es el último productos.actualizado_en, que la base de datos
+    renueva en cualquier cambio de la fila (datos, baja lógica o stock; ver
+    migraciones/005), y ninguna escritura tiene que mantener un contador.
+
+    actualizado_en es la hora del UPDATE, no la del commit: una transacción que
+    se confirma después de otra más reciente no movería el máximo. Por eso la
+    versión incluye también una suma de control de (id, actualizado_en) de las
+    filas cambiadas en los CATALOGO_VENTANA segundos anteriores al máximo: el
+    commit tardío cambia ese conjunto. Ambas partes dependen solo de los datos,
+    así que un catálogo sin cambios tiene siempre la misma versión en todos los
+    workers. Se resuelve con el índice (actualizado_en, id), sin leer las filas.
+    """
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT m.ultima, COALESCE(BIT_XOR(CRC32(CONCAT(p.id, '@', p.actualizado_en))), 0)
+        FROM (SELECT MAX(actualizado_en) AS ultima FROM productos) AS m
+        LEFT JOIN productos p ON p.actualizado_en >= m.ultima - INTERVAL %s MICROSECOND
+        GROUP BY m.ultima
+    """, (int(CATALOGO_VENTANA * 1_000_000),))
+    ultima, control = cursor.fetchone()
+    cursor.close()
+    if ultima is None:
+        return "0"
+    return "{}-{:x}".format(ultima.strftime("%Y%m%d%H%M%S%f"), int(control))
+
+
+def version_catalogo():
+    """
+    Versión vigente del catálogo de productos.
+
+    Returns:
+        str: Cambia cada vez que se crea, edita o elimina un producto o cambia su stock
+    """
+    return _cache.obtener_o_calcular("catalogo", _leer_version)
+
+
+def invalidar_catalogo():
+    """
+    Descarta la versión del catálogo guardada en este proceso; llamar después
+    de cada escritura que lo afecte para que la siguiente lectura ya la vea.
+
+    No escribe en la base de datos: la versión se deriva de los propios
+    productos, así que los demás workers la ven al vencer su TTL.
+    """
+    _cache.invalidar()
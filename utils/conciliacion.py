@@ -0,0 +1,172 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from db import get_db
+from utils.estadisticas import invalidar_estadisticas
+from utils.exportacion import generar_csv
+
+# ==============================================================================
+# CONCILIACIÓN DE STOCK: HISTORIAL VS productos.stock
+# ==============================================================================
+# El stock esperado de cada producto es el neto de su historial (entradas -
+# salidas), tanto de movimientos como de movimientos_resumen_diario para los
+# días archivados. La conciliación lo recalcula con una agregación por rango
+# de ids de producto y compara con productos.stock.
+#
+# Cada rango es una sola consulta de lectura consistente (sin bloqueos): el
+# stock y el historial se leen de la misma foto, así que un movimiento en curso
+# no genera falsas diferencias. Los rangos se reparten entre varios hilos, cada
+# uno con su propia conexión del pool; el trabajo pesado lo hace el servidor.
+#
+# Con --corregir se registra, por cada diferencia, un movimiento de ajuste que
+# lleva el historial al stock actual (productos.stock es el conteo vigente).
+# Se ejecuta con `flask --app wsgi conciliar-stock`.
+
+# Columnas del reporte de diferencias
+COLUMNAS_REPORTE = ("producto_id", "nombre", "stock", "esperado", "diferencia")
+
+
+def _diferencias_rango(id_desde, id_hasta):
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT p.id, p.nombre, p.stock, COALESCE(h.neto, 0) AS esperado
+        FROM productos p
+        LEFT JOIN (
+            SELECT producto_id, SUM(neto) AS neto
+            FROM (
+                SELECT producto_id, entradas - salidas AS neto
+                FROM movimientos_resumen_diario
+                WHERE producto_id BETWEEN %s AND %s
+                UNION ALL
+                SELECT producto_id, IF(tipo = 'entrada', cantidad, -cantidad)
+                FROM movimientos
+                WHERE producto_id BETWEEN %s AND %s
+            ) AS u
+            GROUP BY producto_id
+        ) AS h ON h.producto_id = p.id
+        WHERE p.id BETWEEN %s AND %s
+          AND p.stock <> COALESCE(h.neto, 0)
+        ORDER BY p.id
+    """, (id_desde, id_hasta) * 3)
+    filas = [
+        (producto_id, nombre, stock, int(esperado), stock - int(esperado))
+        for producto_id, nombre, stock, esperado in cursor.fetchall()
+    ]
+    cursor.close()
+    return filas
+
+
+def buscar_diferencias(tamano_rango=5000, hilos=4):
+    """
+    Compara productos.stock con el neto de su historial para todos los productos.
+
+    Args:
+        tamano_rango (int): Ids de producto por consulta
+        hilos (int): Rangos que se procesan en paralelo; menos que DB_POOL_SIZE,
+            porque el contexto que llama ya tiene una conexión prestada
+
+    Returns:
+        list[tuple]: (producto_id, nombre, stock, esperado, diferencia) por cada
+        producto cuyo stock no coincide, ordenadas por producto_id
+    """
+    cursor = get_db().cursor()
+    cursor.execute("SELECT MIN(id), MAX(id) FROM productos")
+    primero, ultimo = cursor.fetchone()
+    cursor.close()
+    if primero is None:
+        return []
+
+    rangos = [(inicio, min(inicio + tamano_rango - 1, ultimo))
+              for inicio in range(primero, ultimo + 1, tamano_rango)]
+    app = current_app._get_current_object()
+
+    def procesar(rango):
+        # Cada hilo necesita su propio contexto: get_db() presta una conexión por contexto
+        with app.app_context():
+            return _diferencias_rango(*rango)
+
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        return [fila for filas in ejecutor.map(procesar, rangos) for fila in filas]
+
+
+def corregir_diferencia(producto_id, usuario_id):
+    """
+    Registra el movimiento que iguala el historial de un producto a su stock.
+
+    Vuelve a calcular la diferencia con la fila del producto bloqueada (SELECT
+    ... FOR UPDATE), así que un movimiento concurrente o una corrección
+    repetida no se cuentan dos veces. El bloqueo dura una sola transacción
+    corta por producto; productos.stock no se modifica.
+
+    Returns:
+        int: Cantidad ajustada (positiva = entrada, negativa = salida, 0 = ya conciliado)
+    """
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute("SELECT stock FROM productos WHERE id = %s FOR UPDATE", (producto_id,))
+        fila = cursor.fetchone()
+        if fila is None:
+            raise Exception("Producto no existe")
+        cursor.execute("""
+            SELECT COALESCE(SUM(neto), 0)
+            FROM (
+                SELECT entradas - salidas AS neto FROM movimientos_resumen_diario WHERE producto_id = %s
+                UNION ALL
+                SELECT IF(tipo = 'entrada', cantidad, -cantidad) FROM movimientos WHERE producto_id = %s
+            ) AS u
+        """, (producto_id, producto_id))
+        diferencia = fila[0] - int(cursor.fetchone()[0])
+        if diferencia:
+            cursor.execute("""
+                INSERT INTO movimientos (producto_id, usuario_id, tipo, cantidad)
+                VALUES (%s, %s, %s, %s)
+            """, (producto_id, usuario_id, "entrada" if diferencia > 0 else "salida", abs(diferencia)))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+    return diferencia
+
+
+@click.command("conciliar-stock")
+@click.option("--rango", type=int, default=5000, show_default=True, help="Ids de producto por consulta")
+@click.option("--hilos", type=int, default=None, help="Rangos en paralelo (por defecto, DB_POOL_SIZE - 1)")
+@click.option("--corregir", is_flag=True, help="Registrar movimientos de ajuste por cada diferencia")
+@click.option("--usuario-id", type=int, default=None, help="Usuario al que se atribuyen los ajustes")
+@click.option("--csv", "ruta_csv", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="Guardar el reporte de diferencias en un CSV")
+@with_appcontext
+def _comando_conciliar(rango, hilos, corregir, usuario_id, ruta_csv):
+    """Compara productos.stock con el historial de movimientos."""
+    if corregir and usuario_id is None:
+        raise click.UsageError("--corregir requiere --usuario-id")
+
+    inicio = time.perf_counter()
+    diferencias = buscar_diferencias(rango, hilos or max(1, current_app.config["DB_POOL_SIZE"] - 1))
+    click.echo(f"{len(diferencias)} productos con diferencias ({time.perf_counter() - inicio:.1f} s)")
+    for producto_id, nombre, stock, esperado, diferencia in diferencias[:50]:
+        click.echo(f"  {producto_id:>8}  {nombre[:40]:<40}  stock {stock:>8}  historial {esperado:>8}  ({diferencia:+})")
+    if len(diferencias) > 50:
+        click.echo(f"  ... y {len(diferencias) - 50} más")
+
+    if ruta_csv:
+        with open(ruta_csv, "w", encoding="utf-8", newline="") as f:
+            for bloque in generar_csv(COLUMNAS_REPORTE, diferencias):
+                f.write(bloque)
+
+    if corregir and diferencias:
+        ajustados = sum(1 for fila in diferencias if corregir_diferencia(fila[0], usuario_id))
+        invalidar_estadisticas()
+        click.echo(f"{ajustados} movimientos de ajuste registrados")
+
+
+def init_app(app):
+    """Registra el comando `flask conciliar-stock`."""
+    app.cli.add_command(_comando_conciliar)
@@ -0,0 +1,138 @@
+import logging
+import re
+
+import mysql.connector
+from flask import g, has_request_context, request
+
+import db
+from utils.cache import CacheTTL
+from utils.metricas import registro
+
+# ==============================================================================
+# DIAGNÓSTICO DE CONSULTAS SQL
+# ==============================================================================
+# Modo opcional (DIAGNOSTICO_SQL=1) que, para cada petición:
+#   - registra las consultas que superan SQL_LENTA_MS junto con sus parámetros
+#     y su plan de ejecución (EXPLAIN)
+#   - avisa cuando la misma forma de consulta se ejecuta más de N_MAS_1_UMBRAL
+#     veces (síntoma de N+1: una consulta por fila dentro de un bucle)
+# Los EXPLAIN se ejecutan al terminar la petición, sobre su misma conexión,
+# para no interferir con cursores que todavía estén leyendo filas.
+
+logger = logging.getLogger("inventario.sql")
+
+# Segundos durante los que no se repite el EXPLAIN de una misma forma de consulta
+EXPLAIN_REPETIR_SEGUNDOS = 300
+# Caracteres máximos de los parámetros en el registro
+MAX_CARACTERES_PARAMETROS = 500
+
+_explicadas = CacheTTL(ttl=EXPLAIN_REPETIR_SEGUNDOS, max_entradas=1000)
+_ajustes = {"lenta": 0.2, "n_mas_1": 10}
+
+_LITERALES = re.compile(r"'(?:[^'\\]|\\.)*'|\b\d+(?:\.\d+)?\b")
+_LISTAS = re.compile(r"\b(IN|VALUES)\s*\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)", re.IGNORECASE)
+_ESPACIOS = re.compile(r"\s+")
+_EXPLICABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+def forma_consulta(sql):
+    """
+    Normaliza una consulta para agrupar las que solo difieren en valores.
+
+    Reemplaza literales por '?', colapsa listas IN (%s, %s, ...) y espacios.
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    forma = _LITERALES.sub("?", sql)
+    forma = _LISTAS.sub(r"\1 (?+)", forma)
+    return _ESPACIOS.sub(" ", forma).strip()
+
+
+def _observar(sql, parametros, duracion, conexion):
+    # Observador de db: corre en cada consulta, así que solo acumula
+    if not has_request_context():
+        return
+    estado = g.get("diagnostico_sql")
+    if estado is None:
+        estado = g.diagnostico_sql = {"formas": {}, "lentas": []}
+    forma = forma_consulta(sql)
+    estado["formas"][forma] = estado["formas"].get(forma, 0) + 1
+    if duracion >= _ajustes["lenta"]:
+        if not isinstance(parametros, (tuple, list, dict)):
+            parametros = None  # Iterador de executemany ya consumido
+        estado["lentas"].append((forma, sql, parametros, duracion))
+
+
+def _resumir(parametros):
+    texto = repr(parametros)
+    if len(texto) > MAX_CARACTERES_PARAMETROS:
+        texto = texto[:MAX_CARACTERES_PARAMETROS] + "..."
+    return texto
+
+
+def _explicar(forma, sql, parametros):
+    """Plan de ejecución de la consulta como texto (o el motivo por el que no se obtuvo)."""
+    if not _EXPLICABLE.match(sql if isinstance(sql, str) else sql.decode("utf-8", "replace")):
+        return "    (EXPLAIN no aplica a este tipo de sentencia)"
+    if _explicadas.obtener(forma) is not None:
+        return f"    (plan ya registrado en los últimos {EXPLAIN_REPETIR_SEGUNDOS}s)"
+    conexion = g.get("db")
+    if conexion is None or conexion.unread_result:
+        return "    (conexión no disponible para EXPLAIN)"
+
+    # executemany: se explica con el primer juego de parámetros
+    if isinstance(parametros, list) and parametros and isinstance(parametros[0], (tuple, list, dict)):
+        parametros = parametros[0]
+    try:
+        # Cursor de la conexión real: el EXPLAIN no se cuenta como consulta de la petición
+        cursor = conexion.conexion.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + sql, parametros or ())
+            filas = cursor.fetchall()
+        finally:
+            cursor.close()
+    except mysql.connector.Error as e:
+        return f"    (EXPLAIN falló: {e})"
+
+    _explicadas.guardar(forma, True)
+    columnas = ("id", "select_type", "table", "type", "possible_keys", "key", "rows", "filtered", "Extra")
+    lineas = ["    " + " | ".join(columnas)]
+    for fila in filas:
+        lineas.append("    " + " | ".join(str(fila.get(c, "")) for c in columnas))
+    return "\n".join(lineas)
+
+
+def _al_terminar(error=None):
+    estado = g.pop("diagnostico_sql", None)
+    if not estado:
+        return
+    endpoint = request.endpoint or "sin_ruta"
+    etiquetas = (("endpoint", endpoint),)
+
+    for forma, sql, parametros, duracion in estado["lentas"]:
+        registro.incrementar("inventario_db_consultas_lentas_total", etiquetas)
+        logger.warning(
+            "Consulta lenta (%.1f ms) en %s %s\n  SQL: %s\n  Parámetros: %s\n  EXPLAIN:\n%s",
+            duracion * 1000, request.method, endpoint, forma, _resumir(parametros),
+            _explicar(forma, sql, parametros),
+        )
+
+    for forma, veces in estado["formas"].items():
+        if veces > _ajustes["n_mas_1"]:
+            registro.incrementar("inventario_db_n_mas_1_total", etiquetas)
+            logger.warning(
+                "Posible N+1 en %s %s: la misma consulta se ejecutó %d veces\n  SQL: %s",
+                request.method, endpoint, veces, forma,
+            )
+
+
+def init_app(app):
+    """Activa el diagnóstico si DIAGNOSTICO_SQL está habilitado en la configuración."""
+    if not app.config.get("DIAGNOSTICO_SQL"):
+        return
+    _ajustes["lenta"] = app.config["SQL_LENTA_MS"] / 1000
+    _ajustes["n_mas_1"] = app.config["N_MAS_1_UMBRAL"]
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
+    db.registrar_observador(_observar)
+    app.teardown_request(_al_terminar)
@@ -0,0 +1,71 @@
+import os
+
+from db import get_db
+from utils.cache import CacheTTL
+
+# Segundos que las estadísticas del dashboard se sirven desde memoria. Las
+# escrituras de este proceso las invalidan al instante; el TTL acota cuánto
+# tarda en verse una escritura hecha por otro proceso.
+DASHBOARD_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", 30))
+
+_cache = CacheTTL(ttl=DASHBOARD_TTL, max_entradas=1)
+
+
+def _calcular_estadisticas():
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+
+    # Ambos totales en una sola consulta
+    cursor.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM productos WHERE activo = 1) AS total_productos,
+            (SELECT COUNT(*) FROM usuarios WHERE activo = 1) AS total_usuarios
+    """)
+    totales = cursor.fetchone()
+
+    # Productos con stock bajo: bajo_stock es una columna generada (stock <= stock_minimo)
+    # con índice (activo, bajo_stock), así que solo se leen las filas que aparecen
+    cursor.execute("""
+        SELECT nombre, stock, stock_minimo
+        FROM productos
+        WHERE activo = 1 AND bajo_stock = 1
+    """)
+    stock_bajo = cursor.fetchall()
+
+    # Últimos movimientos de inventario (5 más recientes)
+    cursor.execute("""
+        SELECT
+            m.fecha_movimiento AS fecha,
+            p.nombre AS producto,
+            u.nombre AS usuario,
+            m.tipo
+        FROM movimientos m
+        JOIN productos p ON m.producto_id = p.id
+        JOIN usuarios u ON m.usuario_id = u.id
+        ORDER BY m.fecha_movimiento DESC
+        LIMIT 5
+    """)
+    ultimos_movimientos = cursor.fetchall()
+
+    return {
+        "total_productos": totales["total_productos"],
+        "total_usuarios": totales["total_usuarios"],
+        "stock_bajo": stock_bajo,
+        "ultimos_movimientos": ultimos_movimientos,
+    }
+
+
+def obtener_estadisticas_dashboard():
+    """
+    Estadísticas compartidas por los dashboards de administrador y operador.
+
+    Returns:
+        dict: total_productos, total_usuarios, stock_bajo (list[dict]) y
+        ultimos_movimientos (list[dict]). Es un valor compartido: no modificarlo.
+    """
+    return _cache.obtener_o_calcular("dashboard", _calcular_estadisticas)
+
+
+def invalidar_estadisticas():
+    """Descarta las estadísticas en caché; llamar después de cada escritura que las afecte."""
+    _cache.invalidar()
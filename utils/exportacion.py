@@ -0,0 +1,38 @@
+import csv
+import io
+
+# Filas que se acumulan antes de enviar un bloque al cliente
+FILAS_POR_BLOQUE = 500
+
+
+def generar_csv(encabezados, filas, filas_por_bloque=FILAS_POR_BLOQUE):
+    """
+    Convierte un iterable de filas en bloques de texto CSV.
+
+    Pensado para un Response de streaming: la primera parte (el encabezado) se
+    envía de inmediato y después un bloque cada `filas_por_bloque` filas, así que
+    la memoria usada no depende del total de filas.
+
+    Yields:
+        str: Fragmentos del CSV
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+
+    escritor.writerow(encabezados)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    pendientes = 0
+    for fila in filas:
+        escritor.writerow(fila)
+        pendientes += 1
+        if pendientes >= filas_por_bloque:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+
+    if pendientes:
+        yield buffer.getvalue()
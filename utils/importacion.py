@@ -0,0 +1,199 @@
+import csv
+
+import mysql.connector
+
+from db import get_db
+from models import CategoriaDB
+from utils.estadisticas import invalidar_estadisticas
+from utils.catalogo import invalidar_catalogo
+
+# Filas por INSERT de varias filas (y por commit)
+TAMANO_LOTE_IMPORTACION = 1000
+# Errores por fila que se conservan para el reporte; el resto solo se cuenta
+MAX_ERRORES_REPORTADOS = 500
+
+COLUMNAS_IMPORTACION = ("nombre", "descripcion", "categoria", "stock", "stock_minimo", "precio", "imagen")
+
+
+def cargar_mapa_categorias():
+    """
+    Returns:
+        dict: {nombre de categoría en minúsculas: id} de las categorías activas
+    """
+    return CategoriaDB.obtener_mapa_por_nombre()
+
+
+def validar_fila_producto(fila, categorias):
+    """
+    Convierte una fila del CSV en los valores a insertar aplicando las mismas
+    reglas que el formulario de creación (nombre obligatorio, stock y precio no
+    negativos).
+
+    Args:
+        fila (dict): Fila leída por csv.DictReader
+        categorias (dict): Mapa de cargar_mapa_categorias()
+
+    Returns:
+        tuple: (nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen)
+
+    Raises:
+        ValueError: Con el motivo por el que la fila no es válida
+    """
+    nombre = (fila.get("nombre") or "").strip()
+    if not nombre:
+        raise ValueError("El nombre del producto es obligatorio")
+    descripcion = (fila.get("descripcion") or "").strip()
+
+    categoria_id = None
+    categoria = (fila.get("categoria") or "").strip()
+    if categoria:
+        categoria_id = categorias.get(categoria.lower())
+        if categoria_id is None:
+            raise ValueError(f"La categoría '{categoria}' no existe")
+
+    try:
+        stock = int(fila.get("stock") or 0)
+        stock_minimo = int(fila.get("stock_minimo") or 0)
+        precio = float(fila.get("precio") or 0)
+    except ValueError:
+        raise ValueError("Stock, stock mínimo y precio deben ser numéricos") from None
+
+    if stock < 0:
+        raise ValueError("El stock no puede ser negativo")
+    if precio < 0:
+        raise ValueError("El precio no puede ser negativo")
+
+    imagen = (fila.get("imagen") or "").strip() or None
+    return (nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen)
+
+
+_SQL_INSERTAR_PRODUCTO = """
+    INSERT INTO productos (nombre, descripcion, categoria_id, stock, stock_minimo, precio, imagen, activo, creado_en)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, 1, NOW())
+"""
+
+_SQL_INSERTAR_MOVIMIENTO = """
+    INSERT INTO movimientos (producto_id, usuario_id, tipo, cantidad)
+    VALUES (%s, %s, 'entrada', %s)
+"""
+
+
+def _paso_ids_lote(db):
+    """
+    Paso entre los ids AUTO_INCREMENT que recibe un INSERT de varias filas.
+
+    Con innodb_autoinc_lock_mode 0 o 1 InnoDB reserva de una vez los ids de
+    una inserción con número de filas conocido, así que las filas del lote
+    reciben lastrowid, lastrowid + paso, ... (paso = auto_increment_increment)
+    aunque otras sesiones inserten a la vez. Con el modo 2 (el predeterminado
+    de MySQL 8) no está garantizado y los ids no se pueden deducir.
+
+    Returns:
+        int or None: El paso, o None si los ids del lote no son predecibles
+    """
+    cursor = db.cursor()
+    cursor.execute("SELECT @@auto_increment_increment, @@innodb_autoinc_lock_mode")
+    incremento, modo = cursor.fetchone()
+    cursor.close()
+    return int(incremento) if int(modo) <= 1 else None
+
+
+def _insertar_lote(db, filas, usuario_id, paso_ids):
+    """
+    Inserta un lote de productos y sus movimientos iniciales en una transacción.
+
+    Los movimientos necesitan los ids de los productos nuevos. Si son
+    predecibles (`paso_ids`, ver _paso_ids_lote) los productos se insertan con
+    un INSERT de varias filas y los ids se deducen de lastrowid; si no, se
+    insertan de a uno para leer el id de cada fila. Los movimientos siempre van
+    en un INSERT de varias filas.
+    """
+    cursor = db.cursor()
+    if paso_ids or not usuario_id:
+        cursor.executemany(_SQL_INSERTAR_PRODUCTO, [valores for _, valores in filas])
+        ids = [cursor.lastrowid + i * (paso_ids or 1) for i in range(len(filas))]
+    else:
+        ids = []
+        for _, valores in filas:
+            cursor.execute(_SQL_INSERTAR_PRODUCTO, valores)
+            ids.append(cursor.lastrowid)
+    if usuario_id:
+        cursor.executemany(_SQL_INSERTAR_MOVIMIENTO, [
+            (producto_id, usuario_id, valores[3]) for producto_id, (_, valores) in zip(ids, filas)
+        ])
+    db.commit()
+
+
+def importar_productos_csv(archivo, usuario_id=None, tamano_lote=TAMANO_LOTE_IMPORTACION):
+    """
+    Importa productos desde un CSV procesándolo fila por fila.
+
+    La memoria usada depende de `tamano_lote`, no del tamaño del archivo: las filas
+    válidas se acumulan hasta completar un lote, que se inserta junto con sus
+    movimientos de "entrada" iniciales en una transacción (ver _insertar_lote).
+    Las filas inválidas se reportan y se omiten sin detener la carga. Si un lote
+    falla en la base de datos se reintenta fila por fila para aislar las culpables.
+
+    Args:
+        archivo (file): Archivo de texto con encabezado; columnas reconocidas en
+            COLUMNAS_IMPORTACION (solo "nombre" es obligatoria). "categoria" es el
+            nombre de la categoría.
+        usuario_id (int or None): Usuario al que se atribuyen los movimientos
+        tamano_lote (int): Filas por lote
+
+    Returns:
+        dict: importados (int), errores (list[tuple[int, str]] con número de línea
+        y motivo, hasta MAX_ERRORES_REPORTADOS) y total_errores (int)
+    """
+    resultado = {"importados": 0, "errores": [], "total_errores": 0}
+
+    def registrar_error(linea, mensaje):
+        resultado["total_errores"] += 1
+        if len(resultado["errores"]) < MAX_ERRORES_REPORTADOS:
+            resultado["errores"].append((linea, mensaje))
+
+    lector = csv.DictReader(archivo)
+    encabezado = [c.strip().lower() for c in (lector.fieldnames or [])]
+    if "nombre" not in encabezado:
+        registrar_error(1, "El archivo debe tener encabezado con al menos la columna 'nombre'")
+        return resultado
+    lector.fieldnames = encabezado
+
+    categorias = cargar_mapa_categorias()
+    db = get_db()
+    paso_ids = _paso_ids_lote(db) if usuario_id else None
+    lote = []
+
+    def guardar_lote():
+        try:
+            _insertar_lote(db, lote, usuario_id, paso_ids)
+            resultado["importados"] += len(lote)
+        except mysql.connector.Error:
+            db.rollback()
+            for linea, valores in lote:
+                try:
+                    _insertar_lote(db, [(linea, valores)], usuario_id, paso_ids)
+                    resultado["importados"] += 1
+                except mysql.connector.Error as e:
+                    db.rollback()
+                    registrar_error(linea, f"Error de base de datos: {e.msg}")
+        lote.clear()
+
+    for fila in lector:
+        # line_num apunta a la última línea física leída (el encabezado es la 1)
+        linea = lector.line_num
+        try:
+            lote.append((linea, validar_fila_producto(fila, categorias)))
+        except ValueError as e:
+            registrar_error(linea, str(e))
+            continue
+        if len(lote) >= tamano_lote:
+            guardar_lote()
+
+    if lote:
+        guardar_lote()
+
+    if resultado["importados"]:
+        invalidar_estadisticas()
+        invalidar_catalogo()
+    return resultado
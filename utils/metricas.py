@@ -0,0 +1,335 @@
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import Response, abort, current_app, g, request
+
+import db
+
+# ==============================================================================
+# CONFIGURACIÓN
+# ==============================================================================
+
+# Límites (segundos) de los buckets del histograma de latencia
+BUCKETS_DURACION = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Límites del histograma de consultas por petición
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+# Con varios workers cada proceso tiene sus propias métricas. Si se indica un
+# directorio compartido, cada worker vuelca las suyas allí y /metrics responde
+# la suma de todos. Cuando un worker termina, el maestro de gunicorn suma su
+# archivo al de los workers finalizados y lo borra (consolidar_worker), así los
+# contadores nunca retroceden y el directorio no crece con cada reciclaje.
+METRICAS_DIR = os.environ.get("METRICAS_DIR")
+# Segundos mínimos entre volcados de un mismo worker
+METRICAS_VOLCADO_SEGUNDOS = float(os.environ.get("METRICAS_VOLCADO_SEGUNDOS", 5))
+# /metrics exige la cabecera "Authorization: Bearer <token>". Sin token
+# configurado solo responde en modo debug (desarrollo local); en producción
+# queda cerrado
+METRICAS_TOKEN = os.environ.get("METRICAS_TOKEN")
+
+_AYUDA = {
+    "inventario_http_peticiones_total": ("counter", "Peticiones HTTP atendidas"),
+    "inventario_http_duracion_segundos": ("histogram", "Latencia de las peticiones HTTP"),
+    "inventario_db_consultas_total": ("counter", "Consultas SQL ejecutadas"),
+    "inventario_db_tiempo_segundos_total": ("counter", "Tiempo total dentro de consultas SQL"),
+    "inventario_db_filas_total": ("counter", "Filas leídas de la base de datos"),
+    "inventario_db_consultas_por_peticion": ("histogram", "Consultas SQL por petición"),
+    "inventario_db_consultas_lentas_total": ("counter", "Consultas sobre SQL_LENTA_MS (modo diagnóstico)"),
+    "inventario_db_n_mas_1_total": ("counter", "Peticiones con una consulta repetida más de N_MAS_1_UMBRAL veces"),
+    "inventario_db_pool_conexiones": ("gauge", "Conexiones del pool de este worker por estado"),
+    "inventario_db_pool_tamano": ("gauge", "Tamaño máximo del pool de este worker"),
+    "inventario_db_pool_esperas_total": ("counter", "Préstamos que tuvieron que esperar una conexión"),
+    "inventario_db_pool_espera_segundos_total": ("counter", "Tiempo total esperando una conexión del pool"),
+}
+
+
+# ==============================================================================
+# REGISTRO DE MÉTRICAS (por proceso)
+# ==============================================================================
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas en memoria, seguros para hilos.
+
+    Las etiquetas son tuplas de pares (nombre, valor) para poder usarse como
+    clave de diccionario sin construir strings en cada petición.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._histogramas = {}
+
+    def incrementar(self, nombre, etiquetas, valor=1):
+        with self._lock:
+            clave = (nombre, etiquetas)
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def observar(self, nombre, etiquetas, valor, buckets):
+        with self._lock:
+            clave = (nombre, etiquetas)
+            datos = self._histogramas.get(clave)
+            if datos is None:
+                # Una cuenta por bucket (no acumulada) + la de +Inf, y la suma
+                datos = self._histogramas[clave] = [buckets, [0] * (len(buckets) + 1), 0.0]
+            cuentas = datos[1]
+            for i, limite in enumerate(buckets):
+                if valor <= limite:
+                    cuentas[i] += 1
+                    break
+            else:
+                cuentas[-1] += 1
+            datos[2] += valor
+
+    def exportar(self):
+        """Copia del estado en un formato serializable a JSON."""
+        with self._lock:
+            return {
+                "contadores": [[n, list(e), v] for (n, e), v in self._contadores.items()],
+                "histogramas": [[n, list(e), list(b), list(c), s]
+                                for (n, e), (b, c, s) in self._histogramas.items()],
+            }
+
+
+registro = RegistroMetricas()
+_ultimo_volcado = 0.0
+_volcado_lock = threading.Lock()
+_archivo = None
+_archivo_pid = None
+
+# Acumulado de los workers terminados; "incluidos" lista los archivos de worker
+# ya sumados que todavía no se borraron
+ARCHIVO_FINALIZADOS = "metricas_finalizados.json"
+
+
+def _archivo_worker():
+    # Nombre único por proceso (pid + instante de arranque): si el sistema
+    # reutiliza un pid, el worker nuevo no pisa los totales del anterior
+    global _archivo, _archivo_pid
+    if _archivo_pid != os.getpid():
+        _archivo = os.path.join(METRICAS_DIR, f"metricas_{os.getpid()}_{time.time_ns()}.json")
+        _archivo_pid = os.getpid()
+    return _archivo
+
+
+def _leer_estado(ruta):
+    try:
+        with open(ruta) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_estado(ruta, estado):
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "w") as f:
+        json.dump(estado, f)
+    os.replace(temporal, ruta)
+
+
+def volcar(forzar=False):
+    """Escribe las métricas del proceso en METRICAS_DIR (como mucho cada METRICAS_VOLCADO_SEGUNDOS)."""
+    global _ultimo_volcado
+    if not METRICAS_DIR:
+        return
+    ahora = time.monotonic()
+    if not forzar and ahora - _ultimo_volcado < METRICAS_VOLCADO_SEGUNDOS:
+        return
+    if not _volcado_lock.acquire(blocking=False):
+        return
+    try:
+        _ultimo_volcado = ahora
+        os.makedirs(METRICAS_DIR, exist_ok=True)
+        _escribir_estado(_archivo_worker(), registro.exportar())
+    except OSError:
+        # Las métricas nunca deben tumbar una petición
+        pass
+    finally:
+        _volcado_lock.release()
+
+
+def _estado_agregado():
+    """Métricas de este proceso, o la suma de todos los workers si hay METRICAS_DIR."""
+    if not METRICAS_DIR:
+        return [registro.exportar()]
+    volcar(forzar=True)
+    # Primero los archivos de worker y después el acumulado: consolidar_worker
+    # escribe el acumulado antes de borrar el archivo, así que un worker recién
+    # consolidado se ve en uno o en otro, nunca en ninguno
+    estados = {}
+    for ruta in glob.glob(os.path.join(METRICAS_DIR, "metricas_*.json")):
+        nombre = os.path.basename(ruta)
+        if nombre != ARCHIVO_FINALIZADOS:
+            estado = _leer_estado(ruta)
+            if estado is not None:
+                estados[nombre] = estado
+    finalizados = _leer_estado(os.path.join(METRICAS_DIR, ARCHIVO_FINALIZADOS))
+    if finalizados is not None:
+        for nombre in finalizados.get("incluidos", []):
+            estados.pop(nombre, None)
+        estados[ARCHIVO_FINALIZADOS] = finalizados
+    return list(estados.values())
+
+
+def _sumar_estados(estados):
+    """Suma contadores e histogramas de varios estados exportados."""
+    contadores = {}
+    histogramas = {}
+    for estado in estados:
+        for nombre, etiquetas, valor in estado["contadores"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            contadores[clave] = contadores.get(clave, 0) + valor
+        for nombre, etiquetas, buckets, cuentas, suma in estado["histogramas"]:
+            clave = (nombre, tuple(map(tuple, etiquetas)))
+            actual = histogramas.get(clave)
+            if actual is None:
+                histogramas[clave] = [buckets, list(cuentas), suma]
+            else:
+                actual[1] = [a + b for a, b in zip(actual[1], cuentas)]
+                actual[2] += suma
+    return contadores, histogramas
+
+
+def consolidar_worker(pid):
+    """
+    Suma las métricas de un worker terminado al acumulado de finalizados y borra su archivo.
+
+    Lo llama el proceso maestro de gunicorn (child_exit), único que escribe el
+    acumulado. Así /metrics lee un archivo por worker vivo más uno, y los
+    totales no bajan cuando un worker se recicla.
+    """
+    if not METRICAS_DIR:
+        return
+    archivos = glob.glob(os.path.join(METRICAS_DIR, f"metricas_{pid}_*.json"))
+    if not archivos:
+        return
+    ruta_finalizados = os.path.join(METRICAS_DIR, ARCHIVO_FINALIZADOS)
+    acumulado = _leer_estado(ruta_finalizados) or {"contadores": [], "histogramas": [], "incluidos": []}
+    estados = [acumulado] + [e for e in map(_leer_estado, archivos) if e is not None]
+    contadores, histogramas = _sumar_estados(estados)
+    # Los archivos ya borrados dejan de listarse
+    incluidos = [n for n in acumulado.get("incluidos", []) if os.path.exists(os.path.join(METRICAS_DIR, n))]
+    _escribir_estado(ruta_finalizados, {
+        "contadores": [[n, list(e), v] for (n, e), v in contadores.items()],
+        "histogramas": [[n, list(e), list(b), list(c), s] for (n, e), (b, c, s) in histogramas.items()],
+        "incluidos": incluidos + [os.path.basename(r) for r in archivos],
+    })
+    for ruta in archivos:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+# ==============================================================================
+# FORMATO DE TEXTO DE PROMETHEUS
+# ==============================================================================
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def generar_texto():
+    """
+    Returns:
+        str: Todas las métricas en formato de exposición de Prometheus 0.0.4
+    """
+    contadores, histogramas = _sumar_estados(_estado_agregado())
+
+    # Pool de conexiones del worker que responde
+    pid = (("pid", os.getpid()),)
+    pool = db.get_pool().estadisticas()
+    gauges = {
+        ("inventario_db_pool_conexiones", pid + (("estado", "prestadas"),)): pool["prestadas"],
+        ("inventario_db_pool_conexiones", pid + (("estado", "libres"),)): pool["libres"],
+        ("inventario_db_pool_tamano", pid): pool["tamano"],
+        ("inventario_db_pool_esperas_total", pid): pool["esperas"],
+        ("inventario_db_pool_espera_segundos_total", pid): pool["tiempo_espera_total"],
+    }
+
+    por_nombre = {}
+    for (nombre, etiquetas), valor in list(contadores.items()) + list(gauges.items()):
+        por_nombre.setdefault(nombre, []).append(f"{nombre}{_etiquetas(etiquetas)} {_numero(valor)}")
+    for (nombre, etiquetas), (buckets, cuentas, suma) in histogramas.items():
+        lineas = por_nombre.setdefault(nombre, [])
+        acumulado = 0
+        for limite, cuenta in zip(list(buckets) + ["+Inf"], cuentas):
+            acumulado += cuenta
+            lineas.append(f"{nombre}_bucket{_etiquetas(etiquetas + (('le', limite),))} {acumulado}")
+        lineas.append(f"{nombre}_sum{_etiquetas(etiquetas)} {_numero(float(suma))}")
+        lineas.append(f"{nombre}_count{_etiquetas(etiquetas)} {acumulado}")
+
+    salida = []
+    for nombre in sorted(por_nombre):
+        tipo, ayuda = _AYUDA.get(nombre, ("untyped", nombre))
+        salida.append(f"# HELP {nombre} {ayuda}")
+        salida.append(f"# TYPE {nombre} {tipo}")
+        salida.extend(por_nombre[nombre])
+    return "\n".join(salida) + "\n"
+
+
+# ==============================================================================
+# INTEGRACIÓN CON FLASK
+# ==============================================================================
+
+def _al_iniciar():
+    g.inicio_metricas = time.perf_counter()
+
+
+def _al_responder(respuesta):
+    g.estado_metricas = respuesta.status_code
+    return respuesta
+
+
+def _al_terminar(error=None):
+    # teardown_request: en respuestas transmitidas corre al terminar el envío,
+    # así que la latencia y las consultas incluyen todo el streaming
+    inicio = g.pop("inicio_metricas", None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+    estado = g.pop("estado_metricas", 500 if error is not None else 200)
+    endpoint = (("endpoint", request.endpoint or "sin_ruta"),)
+    consultas = g.get("estadisticas_db") or {"consultas": 0, "tiempo": 0.0, "filas": 0}
+
+    registro.incrementar("inventario_http_peticiones_total",
+                         endpoint + (("metodo", request.method), ("estado", estado)))
+    registro.observar("inventario_http_duracion_segundos", endpoint, duracion, BUCKETS_DURACION)
+    registro.observar("inventario_db_consultas_por_peticion", endpoint, consultas["consultas"], BUCKETS_CONSULTAS)
+    if consultas["consultas"]:
+        registro.incrementar("inventario_db_consultas_total", endpoint, consultas["consultas"])
+        registro.incrementar("inventario_db_tiempo_segundos_total", endpoint, consultas["tiempo"])
+        registro.incrementar("inventario_db_filas_total", endpoint, consultas["filas"])
+    volcar()
+
+
+def exponer_metricas():
+    if not METRICAS_TOKEN:
+        if not current_app.debug:
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                                 f"Bearer {METRICAS_TOKEN}".encode("utf-8")):
+        abort(401)
+    return Response(generar_texto(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+def init_app(app):
+    """Registra la medición de cada petición y la ruta /metrics."""
+    app.before_request(_al_iniciar)
+    app.after_request(_al_responder)
+    app.teardown_request(_al_terminar)
+    app.add_url_rule("/metrics", "metricas", exponer_metricas)
@@ -1,41 +1,306 @@
 from db import get_db
+from utils.estadisticas import invalidar_estadisticas
+from utils.catalogo import invalidar_catalogo
+
+TIPOS_MOVIMIENTO = ("entrada", "salida")
+
 
 def registrar_movimiento(producto_id, usuario_id, tipo, cantidad, proveedor_id=None):
+    """
+    Registra una entrada o salida y ajusta el stock en una sola transacción.
+
+    El stock se modifica con un UPDATE condicional relativo al valor actual
+    (stock = stock - cantidad ... AND stock >= cantidad): la validación y la
+    escritura ocurren en la misma sentencia bajo el bloqueo de la fila, así que
+    dos operadores concurrentes no pueden pisarse ni dejar stock negativo. Solo se
+    bloquea la fila del producto, nunca la tabla.
+
+    Returns:
+        int: Stock del producto después del movimiento
+
+    Raises:
+        Exception: Si el tipo o la cantidad no son válidos, el producto no existe
+            o no hay stock suficiente para una salida
+    """
+    if tipo not in TIPOS_MOVIMIENTO:
+        raise Exception("Tipo de movimiento no válido")
+    if cantidad <= 0:
+        raise Exception("La cantidad debe ser mayor que cero")
+
     db = get_db()
-    cursor = db.cursor(dictionary=True)
+    cursor = db.cursor()
+
+    try:
+        # LAST_INSERT_ID(expr) devuelve el stock resultante en la respuesta del
+        # propio UPDATE (cursor.lastrowid), sin otra consulta.
+        if tipo == "entrada":
+            cursor.execute("""
+                UPDATE productos
+                SET stock = LAST_INSERT_ID(stock + %s)
+                WHERE id = %s
+            """, (cantidad, producto_id))
+        else:
+            cursor.execute("""
+                UPDATE productos
+                SET stock = LAST_INSERT_ID(stock - %s)
+                WHERE id = %s AND stock >= %s
+            """, (cantidad, producto_id, cantidad))
+
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT 1 FROM productos WHERE id = %s", (producto_id,))
+            if cursor.fetchone() is None:
+                raise Exception("Producto no existe")
+            raise Exception("Stock insuficiente")
+
+        nuevo_stock = cursor.lastrowid or 0
+
+        # Registrar movimiento
+        cursor.execute("""
+            INSERT INTO movimientos
+            (producto_id, usuario_id, tipo, cantidad, proveedor_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (producto_id, usuario_id, tipo, cantidad, proveedor_id))
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidar_estadisticas()
+    invalidar_catalogo()
+    return nuevo_stock
+
+
+class StockModificadoError(Exception):
+    """El stock cambió desde que se leyó para editarlo; `stock_actual` es el vigente."""
 
-    # Obtener stock actual
-    cursor.execute(
-        "SELECT stock FROM productos WHERE id = %s",
-        (producto_id,)
-    )
-    producto = cursor.fetchone()
+    def __init__(self, stock_actual):
+        super().__init__(f"El stock cambió mientras se editaba el producto (ahora es {stock_actual})")
+        self.stock_actual = stock_actual
 
-    if not producto:
+
+def _bloquear_stock(cursor, producto_id):
+    cursor.execute("SELECT stock FROM productos WHERE id = %s FOR UPDATE", (producto_id,))
+    fila = cursor.fetchone()
+    if fila is None:
         raise Exception("Producto no existe")
+    return fila[0]
+
+
+def _fijar_stock(cursor, producto_id, usuario_id, stock_actual, nuevo_stock):
+    # Con la fila ya bloqueada: escribe el stock y registra la diferencia
+    diferencia = nuevo_stock - stock_actual
+    if diferencia:
+        cursor.execute("UPDATE productos SET stock = %s WHERE id = %s", (nuevo_stock, producto_id))
+        cursor.execute("""
+            INSERT INTO movimientos (producto_id, usuario_id, tipo, cantidad)
+            VALUES (%s, %s, %s, %s)
+        """, (producto_id, usuario_id, "entrada" if diferencia > 0 else "salida", abs(diferencia)))
+    return diferencia
+
+
+def ajustar_stock(producto_id, usuario_id, nuevo_stock):
+    """
+    Fija el stock de un producto a un valor contado y registra la diferencia.
+
+    En lugar de sobrescribir el stock sin dejar rastro, la diferencia con el
+    stock actual se registra como una entrada o salida en la misma transacción.
+    La fila del producto se bloquea (SELECT ... FOR UPDATE) solo durante esa
+    transacción. El conteo reemplaza al stock vigente, movimientos recientes
+    incluidos: para ediciones desde un formulario usar guardar_edicion.
+
+    Returns:
+        int: Diferencia aplicada (positiva = entrada, negativa = salida, 0 = sin cambio)
+
+    Raises:
+        Exception: Si el stock es negativo o el producto no existe
+    """
+    if nuevo_stock < 0:
+        raise Exception("El stock no puede ser negativo")
+
+    db = get_db()
+    cursor = db.cursor()
+
+    try:
+        diferencia = _fijar_stock(cursor, producto_id, usuario_id, _bloquear_stock(cursor, producto_id), nuevo_stock)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if diferencia:
+        invalidar_estadisticas()
+        invalidar_catalogo()
+    return diferencia
+
 
-    stock_actual = producto["stock"]
+def guardar_edicion(producto, usuario_id, stock_visto):
+    """
+    Guarda los datos editados de un producto y su stock contado en una sola
+    transacción (Producto.actualizar + ajuste de stock).
+
+    producto.stock es el valor enviado por el formulario y `stock_visto` el
+    stock que el formulario mostraba. Si el usuario no tocó el stock, no se
+    modifica (los movimientos registrados mientras editaba se conservan). Si lo
+    cambió pero entretanto se registró un movimiento, fijar su conteo desharía
+    ese movimiento con un ajuste: no se guarda nada y se lanza
+    StockModificadoError para que revise el valor (control optimista, con la
+    fila bloqueada por SELECT ... FOR UPDATE).
+
+    Returns:
+        int: Diferencia de stock aplicada (0 = sin cambio)
+
+    Raises:
+        StockModificadoError: Si el stock cambió desde `stock_visto`
+        Exception: Si el stock es negativo o el producto no existe
+    """
+    if producto.stock < 0:
+        raise Exception("El stock no puede ser negativo")
+
+    db = get_db()
+    cursor = db.cursor()
+
+    try:
+        stock_actual = _bloquear_stock(cursor, producto.id)
+        diferencia = 0
+        if producto.stock != stock_visto:
+            if stock_actual != stock_visto:
+                raise StockModificadoError(stock_actual)
+            diferencia = _fijar_stock(cursor, producto.id, usuario_id, stock_actual, producto.stock)
+        producto.actualizar(confirmar=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    invalidar_estadisticas()
+    invalidar_catalogo()
+    return diferencia
+
+
+# Máximo de líneas aceptadas en un lote
+MAX_LINEAS_LOTE = 1000
+
+
+class LoteInvalidoError(Exception):
+    """El lote no se aplicó; `errores` lista los problemas encontrados por línea."""
+
+    def __init__(self, errores):
+        super().__init__("; ".join(errores))
+        self.errores = errores
+
+
+def validar_lineas_lote(lineas):
+    """
+    Normaliza y valida el formato de las líneas de un lote.
+
+    Args:
+        lineas (iterable): Tuplas (producto_id, tipo, cantidad)
+
+    Returns:
+        list[tuple[int, str, int]]: Líneas normalizadas
+
+    Raises:
+        LoteInvalidoError: Con un error por cada línea mal formada
+    """
+    lineas = list(lineas)
+    # Antes de validar línea por línea: un lote enorme se rechaza sin recorrerlo
+    if len(lineas) > MAX_LINEAS_LOTE:
+        raise LoteInvalidoError([f"El lote supera el máximo de {MAX_LINEAS_LOTE} líneas"])
+
+    normalizadas = []
+    errores = []
+    for numero, linea in enumerate(lineas, start=1):
+        try:
+            producto_id, tipo, cantidad = linea
+            producto_id = int(producto_id)
+            cantidad = int(cantidad)
+            tipo = str(tipo).strip().lower()
+        except (TypeError, ValueError):
+            errores.append(f"Línea {numero}: formato inválido (se espera producto_id, tipo, cantidad)")
+            continue
+        if tipo not in TIPOS_MOVIMIENTO:
+            errores.append(f"Línea {numero}: tipo '{tipo}' no válido")
+        elif cantidad <= 0:
+            errores.append(f"Línea {numero}: la cantidad debe ser mayor que cero")
+        else:
+            normalizadas.append((producto_id, tipo, cantidad))
+
+    if not normalizadas and not errores:
+        errores.append("El lote está vacío")
+    if errores:
+        raise LoteInvalidoError(errores)
+    return normalizadas
+
+
+def registrar_movimientos_lote(lineas, usuario_id, proveedor_id=None):
+    """
+    Aplica un lote de entradas/salidas (p. ej. una recepción de N líneas) en una
+    sola transacción: o se aplican todas las líneas o ninguna.
+
+    Pasos, con un número fijo de viajes a la base sin importar cuántas líneas haya:
+        1. SELECT ... FOR UPDATE de los productos del lote (en orden de id para
+           evitar interbloqueos), que valida existencia y stock de todas las
+           líneas antes de escribir nada
+        2. Un único UPDATE con CASE que escribe el stock final de cada producto,
+           calculado mientras sus filas están bloqueadas
+        3. Un INSERT de varias filas (executemany) con todos los movimientos
+
+    Las líneas se validan en orden: una salida falla si en ese punto del lote el
+    stock no alcanza, aunque una entrada posterior lo repondría.
+
+    Returns:
+        dict: {producto_id: stock final} de los productos afectados
+
+    Raises:
+        LoteInvalidoError: Con todos los errores encontrados; no se escribe nada
+    """
+    lineas = validar_lineas_lote(lineas)
+    ids = sorted({producto_id for producto_id, _, _ in lineas})
+
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        marcadores = ", ".join(["%s"] * len(ids))
+        cursor.execute(
+            f"SELECT id, stock FROM productos WHERE id IN ({marcadores}) ORDER BY id FOR UPDATE",
+            ids,
+        )
+        stock = {producto_id: valor or 0 for producto_id, valor in cursor.fetchall()}
 
-    # Validar stock negativo
-    if tipo == "salida" and cantidad > stock_actual:
-        raise Exception("Stock insuficiente")
+        errores = []
+        for numero, (producto_id, tipo, cantidad) in enumerate(lineas, start=1):
+            if producto_id not in stock:
+                errores.append(f"Línea {numero}: el producto {producto_id} no existe")
+            elif tipo == "salida" and cantidad > stock[producto_id]:
+                errores.append(
+                    f"Línea {numero}: stock insuficiente para el producto {producto_id} "
+                    f"(disponible {stock[producto_id]}, solicitado {cantidad})"
+                )
+            else:
+                stock[producto_id] += cantidad if tipo == "entrada" else -cantidad
+        if errores:
+            raise LoteInvalidoError(errores)
 
-    # Registrar movimiento
-    cursor.execute("""
-        INSERT INTO movimientos
-        (producto_id, usuario_id, tipo, cantidad, proveedor_id)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (producto_id, usuario_id, tipo, cantidad, proveedor_id))
+        casos = " ".join(["WHEN %s THEN %s"] * len(ids))
+        parametros = [valor for producto_id in ids for valor in (producto_id, stock[producto_id])]
+        cursor.execute(
+            f"UPDATE productos SET stock = CASE id {casos} END WHERE id IN ({marcadores})",
+            (*parametros, *ids),
+        )
 
-    # Actualizar stock
-    if tipo == "entrada":
-        nuevo_stock = stock_actual + cantidad
-    else:
-        nuevo_stock = stock_actual - cantidad
+        cursor.executemany("""
+            INSERT INTO movimientos
+            (producto_id, usuario_id, tipo, cantidad, proveedor_id)
+            VALUES (%s, %s, %s, %s, %s)
+        """, [(producto_id, usuario_id, tipo, cantidad, proveedor_id)
+              for producto_id, tipo, cantidad in lineas])
 
-    cursor.execute(
-        "UPDATE productos SET stock = %s WHERE id = %s",
-        (nuevo_stock, producto_id)
-    )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
-    db.commit()
+    invalidar_estadisticas()
+    invalidar_catalogo()
+    return stock
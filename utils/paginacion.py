@@ -0,0 +1,37 @@
+import base64
+import json
+from datetime import datetime
+
+
+def codificar_cursor(valores):
+    """Convierte la clave de la última fila de una página en un token opaco para la URL."""
+    valores = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    datos = json.dumps(valores, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(datos).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(token):
+    """
+    Recupera la clave codificada por codificar_cursor().
+
+    Returns:
+        list or None: Valores de la clave, o None si el token está vacío
+
+    Raises:
+        ValueError: Si el token no es válido
+    """
+    if not token:
+        return None
+    try:
+        relleno = "=" * (-len(token) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(token + relleno))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor de paginación inválido") from e
+    if not isinstance(valores, list):
+        raise ValueError("Cursor de paginación inválido")
+    return valores
+
+
+def escapar_like(texto):
+    """Escapa los comodines de LIKE para buscar el texto de forma literal."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
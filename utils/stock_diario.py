@@ -0,0 +1,250 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import click
+from flask.cli import with_appcontext
+
+from db import get_db
+
+# ==============================================================================
+# INSTANTÁNEAS DIARIAS DE STOCK
+# ==============================================================================
+# stock_diario guarda el stock de cada producto al cierre de los días en que se
+# movió (ver migraciones/007). El stock de un producto en una fecha es el de
+# su última instantánea <= fecha; solo los días que el comando todavía no
+# procesó (normalmente hoy) se reconstruyen desde los movimientos.
+#
+# El neto de un día combina movimientos (tabla caliente) y
+# movimientos_resumen_diario (días ya archivados, ver utils/archivo.py), así
+# que las instantáneas se pueden generar aunque el archivo vaya por delante.
+# Se ejecuta desde cron después de medianoche con
+# `flask --app wsgi generar-stock-diario`.
+
+# Días máximos de una serie de stock
+SERIE_MAX_DIAS = 731
+
+# Neto (entradas - salidas) por producto de los movimientos en [desde, hasta)
+_SQL_NETO = """
+    SELECT producto_id, SUM(neto) AS neto
+    FROM (
+        SELECT producto_id, entradas - salidas AS neto
+        FROM movimientos_resumen_diario
+        WHERE dia >= %s AND dia < %s
+        UNION ALL
+        SELECT producto_id, IF(tipo = 'entrada', cantidad, -cantidad)
+        FROM movimientos
+        WHERE fecha_movimiento >= %s AND fecha_movimiento < %s
+    ) AS u
+    GROUP BY producto_id
+"""
+
+
+def _limites():
+    """Primer y último día con instantáneas (None, None si nunca se generaron)."""
+    cursor = get_db().cursor()
+    cursor.execute("SELECT MIN(fecha), MAX(fecha) FROM stock_diario")
+    primero, ultimo = cursor.fetchone()
+    cursor.close()
+    return primero, ultimo
+
+
+def _linea_base(db, fecha):
+    # Stock al cierre de `fecha` = stock actual - neto de todo lo posterior
+    siguiente = fecha + timedelta(days=1)
+    cursor = db.cursor()
+    cursor.execute(f"""
+        INSERT INTO stock_diario (producto_id, fecha, stock, valor)
+        SELECT p.id, %s, p.stock - COALESCE(f.neto, 0), (p.stock - COALESCE(f.neto, 0)) * p.precio
+        FROM productos p
+        LEFT JOIN ({_SQL_NETO}) AS f ON f.producto_id = p.id
+    """, (fecha, siguiente, date.max, siguiente, date.max))
+    db.commit()
+    cursor.close()
+
+
+def _instantanea_dia(db, fecha):
+    # Solo los productos que se movieron ese día: instantánea anterior + neto
+    siguiente = fecha + timedelta(days=1)
+    cursor = db.cursor()
+    cursor.execute(f"""
+        INSERT INTO stock_diario (producto_id, fecha, stock, valor)
+        SELECT d.producto_id, %s,
+               COALESCE(ant.stock, 0) + d.neto,
+               (COALESCE(ant.stock, 0) + d.neto) * p.precio
+        FROM ({_SQL_NETO}) AS d
+        JOIN productos p ON p.id = d.producto_id
+        LEFT JOIN stock_diario ant ON ant.producto_id = d.producto_id
+            AND ant.fecha = (
+                SELECT MAX(s.fecha) FROM stock_diario s
+                WHERE s.producto_id = d.producto_id AND s.fecha < %s
+            )
+    """, (fecha, fecha, siguiente, fecha, siguiente, fecha))
+    filas = cursor.rowcount
+    db.commit()
+    cursor.close()
+    return filas
+
+
+def generar_stock_diario(hasta=None, desde=None):
+    """
+    Escribe las instantáneas de los días pendientes hasta `hasta` (inclusive).
+
+    Continúa desde el último día generado, de a un día por transacción. En la
+    primera ejecución escribe una línea base de todos los productos al cierre
+    del día anterior a `desde` (o de `hasta`), reconstruida hacia atrás desde
+    el stock actual.
+
+    Args:
+        hasta (date or None): Último día a generar (None = ayer)
+        desde (date or None): Primer día con historial; solo en la primera ejecución
+
+    Returns:
+        int: Días generados
+    """
+    db = get_db()
+    if hasta is None:
+        cursor = db.cursor()
+        cursor.execute("SELECT CURDATE() - INTERVAL 1 DAY")
+        hasta = cursor.fetchone()[0]
+        cursor.close()
+
+    _, ultimo = _limites()
+    if ultimo is None:
+        ultimo = desde - timedelta(days=1) if desde is not None else hasta
+        _linea_base(db, ultimo)
+    elif desde is not None and desde <= ultimo:
+        raise ValueError(f"Ya hay instantáneas hasta {ultimo}; --desde solo aplica a la primera ejecución")
+
+    dias = 0
+    dia = ultimo + timedelta(days=1)
+    while dia <= hasta:
+        _instantanea_dia(db, dia)
+        dias += 1
+        dia += timedelta(days=1)
+    return dias
+
+
+def serie_stock(producto_id, desde, hasta):
+    """
+    Stock y valor de un producto al cierre de cada día del rango.
+
+    Lee la última instantánea anterior al rango y las del rango (índice
+    (producto_id, fecha)); solo los días posteriores a la última generación se
+    reconstruyen desde sus movimientos, así que el costo no depende del tamaño
+    del historial.
+
+    Args:
+        producto_id (int): Producto consultado
+        desde (date): Primer día (inclusive)
+        hasta (date): Último día (inclusive)
+
+    Returns:
+        list[dict]: fecha, stock y valor por día; stock y valor son None en los
+        días anteriores a la primera instantánea
+
+    Raises:
+        ValueError: Si el rango está invertido o supera SERIE_MAX_DIAS
+    """
+    if hasta < desde:
+        raise ValueError("El rango de fechas está invertido")
+    if (hasta - desde).days + 1 > SERIE_MAX_DIAS:
+        raise ValueError(f"El rango no puede superar {SERIE_MAX_DIAS} días")
+
+    primero, ultimo = _limites()
+    if ultimo is None:
+        return [{"fecha": desde + timedelta(days=n), "stock": None, "valor": None}
+                for n in range((hasta - desde).days + 1)]
+
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT fecha, stock, valor FROM stock_diario
+        WHERE producto_id = %s AND fecha <= %s
+        ORDER BY fecha DESC
+        LIMIT 1
+    """, (producto_id, desde))
+    anterior = cursor.fetchone()
+    cursor.execute("""
+        SELECT fecha, stock, valor FROM stock_diario
+        WHERE producto_id = %s AND fecha > %s AND fecha <= %s
+        ORDER BY fecha
+    """, (producto_id, desde, hasta))
+    instantaneas = {fecha: (stock, valor) for fecha, stock, valor in cursor.fetchall()}
+
+    # Días aún sin instantánea: neto de cada día desde sus movimientos
+    netos, precio = {}, None
+    if hasta > ultimo:
+        inicio = ultimo + timedelta(days=1)
+        fin = hasta + timedelta(days=1)
+        cursor.execute("""
+            SELECT dia, SUM(neto)
+            FROM (
+                SELECT dia, entradas - salidas AS neto
+                FROM movimientos_resumen_diario
+                WHERE producto_id = %s AND dia >= %s AND dia < %s
+                UNION ALL
+                SELECT DATE(fecha_movimiento), IF(tipo = 'entrada', cantidad, -cantidad)
+                FROM movimientos
+                WHERE producto_id = %s AND fecha_movimiento >= %s AND fecha_movimiento < %s
+            ) AS u
+            GROUP BY dia
+        """, (producto_id, inicio, fin, producto_id, inicio, fin))
+        netos = {dia: int(neto) for dia, neto in cursor.fetchall()}
+        cursor.execute("SELECT precio FROM productos WHERE id = %s", (producto_id,))
+        fila = cursor.fetchone()
+        precio = fila[0] if fila else Decimal(0)
+    cursor.close()
+    # Neto de los días sin instantánea anteriores al rango (si empieza después
+    # de la última generación); se suma al stock del primer día
+    pendiente = sum(neto for dia, neto in netos.items() if dia < desde)
+
+    if anterior is not None:
+        stock, valor = anterior[1], anterior[2]
+    elif desde >= primero:
+        stock, valor = 0, Decimal(0)  # Producto creado después de la línea base
+    else:
+        stock, valor = None, None
+
+    serie = []
+    dia = desde
+    while dia <= hasta:
+        if dia in instantaneas:
+            stock, valor = instantaneas[dia]
+        elif dia > ultimo:
+            if stock is None:
+                stock = 0
+            stock += netos.get(dia, 0) + (pendiente if dia == desde else 0)
+            valor = stock * precio
+        elif stock is None and dia >= primero:
+            stock, valor = 0, Decimal(0)
+        serie.append({"fecha": dia, "stock": stock, "valor": valor})
+        dia += timedelta(days=1)
+    return serie
+
+
+def stock_en_fecha(producto_id, fecha):
+    """
+    Stock y valor de un producto al cierre de `fecha`.
+
+    Returns:
+        dict: fecha, stock y valor (None si es anterior a la primera instantánea)
+    """
+    return serie_stock(producto_id, fecha, fecha)[0]
+
+
+@click.command("generar-stock-diario")
+@click.option("--desde", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Primer día con historial (solo en la primera ejecución)")
+@click.option("--hasta", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Último día a generar (por defecto, ayer)")
+@with_appcontext
+def _comando_generar(desde, hasta):
+    """Escribe las instantáneas diarias de stock pendientes."""
+    inicio = time.perf_counter()
+    dias = generar_stock_diario(hasta=hasta.date() if hasta else None, desde=desde.date() if desde else None)
+    click.echo(f"{dias} días generados en {time.perf_counter() - inicio:.1f} s")
+
+
+def init_app(app):
+    """Registra el comando `flask generar-stock-diario`."""
+    app.cli.add_command(_comando_generar)